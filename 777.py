@@ -9,6 +9,8 @@ import pandas as pd
 import streamlit as st
 from pypdf import PdfReader
 
+from constrained_sampler import ConstrainedSampler, TicketRules
+
 
 # =========================
 # 🎨 GOTYCKI $ STYL (czytelniejszy + mocny czarny przycisk)
@@ -194,6 +196,20 @@ def gen_ticket(mode: str, hot: list[int], cold: list[int], mix_hot_count: int) -
     raise ValueError("Nieznany tryb losowania.")
 
 
+def ticket_stages(mode: str, hot: list[int], cold: list[int], mix_hot_count: int) -> list[tuple[list[int], int]]:
+    """
+    Etapy losowania gen_ticket jako [(pula, ile), ...] (dla ConstrainedSampler).
+    """
+    if mode == "hot":
+        return [(hot, 6)]
+    if mode == "cold":
+        return [(cold, 6)]
+    if mode == "mix":
+        return [(hot, mix_hot_count), (cold, 6 - mix_hot_count)]
+
+    raise ValueError("Nieznany tryb losowania.")
+
+
 def gen_tickets_hybrid(
     n_tickets: int,
     hot: list[int],
@@ -221,108 +237,91 @@ def gen_tickets_hybrid(
 # =========================
 # 🧠 TRYB INTELIGENTNY: FILTRY
 # =========================
-def count_adjacent_runs(nums: list[int]) -> int:
-    """
-    Liczy ile jest par sąsiadujących (różnica 1) w posortowanym kuponie.
-    """
-    nums = sorted(nums)
-    runs = 0
-    for i in range(len(nums) - 1):
-        if nums[i + 1] - nums[i] == 1:
-            runs += 1
-    return runs
-
 
-def count_pairs_by_decade(nums: list[int]) -> int:
+def smart_ticket_rules(
+    block_adjacent: bool,
+    block_adjacent_level: str,
+    limit_pairs_enabled: bool,
+    max_pairs_in_decade: int,
+    parity_rule: str,
+) -> TicketRules:
     """
-    Liczy liczbę par w tych samych 'dziesiątkach':
-    1-9, 10-19, 20-29, 30-39, 40-49.
-    Zwraca sumę par (kombinacje 2-elementowe) we wszystkich koszykach.
+    Filtry trybu inteligentnego w postaci dla ConstrainedSampler:
+    - "1-2" => odrzuca kupony z >=2 parami sąsiadującymi, "1-3" => z >=3,
+    - limit par w tych samych dziesiątkach (1-9, 10-19, ..., 40-49),
+    - parzyste/nieparzyste: "3/3" albo "3/2" (interpretowane jako 4/2 lub 2/4).
     """
-    buckets = {}
-    for n in nums:
-        key = n // 10  # 0..4
-        buckets[key] = buckets.get(key, 0) + 1
-
-    pairs = 0
-    for cnt in buckets.values():
-        if cnt >= 2:
-            pairs += (cnt * (cnt - 1)) // 2  # C(cnt,2)
-    return pairs
-
-
-def parity_ratio(nums: list[int]) -> tuple[int, int]:
-    ev = sum(1 for n in nums if n % 2 == 0)
-    od = 6 - ev
-    return ev, od
+    max_adjacent = None
+    if block_adjacent and block_adjacent_level in ("1-2", "1-3"):
+        max_adjacent = 1 if block_adjacent_level == "1-2" else 2
+
+    even = None
+    if parity_rule == "3/3":
+        even = (3,)
+    elif parity_rule == "3/2":
+        even = (2, 4)
+
+    return TicketRules(
+        even_counts=even,
+        max_adjacent_pairs=max_adjacent,
+        max_decade_pairs=int(max_pairs_in_decade) if limit_pairs_enabled else None,
+    )
 
 
-def smart_ok(
-    ticket: list[int],
+def smart_rule_labels(
     block_adjacent: bool,
-    block_adjacent_level: str,   # "1-2" albo "1-3"
+    block_adjacent_level: str,
     limit_pairs_enabled: bool,
     max_pairs_in_decade: int,
-    parity_rule: str,            # "brak", "3/3", "3/2"
-) -> bool:
+    parity_rule: str,
+) -> dict[str, str]:
     """
-    Zwraca True jeśli kupon przechodzi wszystkie włączone reguły.
+    Pole TicketRules -> nazwa filtra do raportu odrzuceń.
     """
-    nums = sorted(ticket)
-
-    # 1) Blokada układów kolejnych liczb
-    # - "1-2" => odrzuca kupony z >=2 parami sąsiadującymi
-    # - "1-3" => odrzuca kupony z >=3 parami sąsiadującymi
-    if block_adjacent:
-        runs = count_adjacent_runs(nums)
-        if block_adjacent_level == "1-2":
-            if runs >= 2:
-                return False
-        elif block_adjacent_level == "1-3":
-            if runs >= 3:
-                return False
-
-    # 2) Limit par w dziesiątkach
-    if limit_pairs_enabled:
-        pairs = count_pairs_by_decade(nums)
-        if pairs > max_pairs_in_decade:
-            return False
-
-    # 3) Parzyste/nieparzyste — wybór tylko jednego wariantu
-    if parity_rule != "brak":
-        ev, od = parity_ratio(nums)
-        if parity_rule == "3/3":
-            if not (ev == 3 and od == 3):
-                return False
-        elif parity_rule == "3/2":
-            # 3/2 interpretujemy jako: 4/2 lub 2/4
-            if not ((ev == 4 and od == 2) or (ev == 2 and od == 4)):
-                return False
-
-    return True
+    return {
+        "max_adjacent_pairs": f"pary sąsiednie {block_adjacent_level}",
+        "max_decade_pairs": "pary w dziesiątkach",
+        "even_counts": f"parzyste/nieparzyste {parity_rule}",
+    }
 
 
 def generate_with_smart_filters(
-    gen_func,
+    pick_mode,
+    hot: list[int],
+    cold: list[int],
+    mix_hot_count: int,
     n_tickets: int,
     max_attempts_per_ticket: int,
     smart_kwargs: dict,
+    rejected: Counter | None = None,
 ) -> list[dict]:
     """
-    gen_func() -> {"Typ": "...", "Kupon": [...]}
-    W trybie inteligentnym: generujemy jak oryginał, ale odrzucamy kupony nieprzechodzące filtrów.
+    pick_mode() -> "hot" / "cold" / "mix" (wybór trybu jak w oryginale).
+    Kupony budowane od razu zgodne z filtrami (ConstrainedSampler): w obrębie trybu rozkład jak przy losowaniu
+    oryginałem i odrzucaniu, ale czas nie zależy od ostrości filtrów. Udziały trybów zostają takie, jak daje
+    pick_mode (odrzucanie przeważało je wg odsetka kuponów przechodzących filtry). Tryb, w którym żaden kupon
+    nie przechodzi filtrów, jest pomijany i liczony w rejected pod nazwą filtrów, które go wykluczają;
+    max_attempts_per_ticket ogranicza tylko takie puste wybory trybu.
     """
+    rules = smart_ticket_rules(**smart_kwargs)
+    labels = smart_rule_labels(**smart_kwargs)
+    samplers: dict[str, ConstrainedSampler] = {}
     out: list[dict] = []
     attempts = 0
+    max_attempts = n_tickets * max_attempts_per_ticket
 
-    while len(out) < n_tickets:
+    while len(out) < n_tickets and attempts < max_attempts:
         attempts += 1
-        if attempts > n_tickets * max_attempts_per_ticket:
-            break
-
-        rec = gen_func()
-        if smart_ok(rec["Kupon"], **smart_kwargs):
-            out.append(rec)
+        chosen = pick_mode()
+        if chosen not in samplers:
+            samplers[chosen] = ConstrainedSampler(ticket_stages(chosen, hot, cold, mix_hot_count), rules)
+        sampler = samplers[chosen]
+        if not sampler.feasible:
+            if rejected is not None:
+                blocking = " + ".join(labels[name] for name in sampler.blocking_rules())
+                rejected[f"tryb {chosen}: {blocking}"] += 1
+            continue
+        out.append({"Typ": chosen, "Kupon": sampler.sample(random)})
 
     return out
 
@@ -462,8 +461,9 @@ with colB:
         )
 
         max_attempts_per_ticket = st.slider(
-            "Limit prób na kupon (gdy filtry odrzucają)",
-            10, 500, 120, 10
+            "Limit wyborów trybu na kupon (gdy filtry wykluczają tryb)",
+            10, 500, 120, 10,
+            help="Kupony powstają od razu zgodne z filtrami; limit dotyczy tylko losowań trybu, w którym żaden kupon nie spełnia filtrów."
         )
 
     st.divider()
@@ -485,34 +485,44 @@ if st.button("🚀 GENERUJ KUPONY"):
         "parity_rule": parity_rule,
     }
 
-    def gen_one_record() -> dict:
-        """
-        Jedna próbka kuponu dokładnie wg oryginału (w zależności od wybranego mode).
-        """
+    def pick_mode() -> str:
         if mode == "Hybryda 70/20/10 (hot/cold/mix)":
-            chosen = random.choices(["hot", "cold", "mix"], weights=[0.70, 0.20, 0.10], k=1)[0]
-            return {"Typ": chosen, "Kupon": gen_ticket(chosen, hot, cold, int(mix_hot_count))}
+            return random.choices(["hot", "cold", "mix"], weights=[0.70, 0.20, 0.10], k=1)[0]
         elif mode == "Tylko 🔥 gorące":
-            return {"Typ": "hot", "Kupon": gen_ticket("hot", hot, cold, int(mix_hot_count))}
+            return "hot"
         elif mode == "Tylko ❄️ zimne":
-            return {"Typ": "cold", "Kupon": gen_ticket("cold", hot, cold, int(mix_hot_count))}
+            return "cold"
         else:
-            return {"Typ": "mix", "Kupon": gen_ticket("mix", hot, cold, int(mix_hot_count))}
+            return "mix"
+
+    def gen_one_record() -> dict:
+        """
+        Jedna próbka kuponu dokładnie wg oryginału (w zależności od wybranego mode).
+        """
+        chosen = pick_mode()
+        return {"Typ": chosen, "Kupon": gen_ticket(chosen, hot, cold, int(mix_hot_count))}
 
     # jeśli smart off -> oryginał 1:1
     if not smart_enabled:
         records = [gen_one_record() for _ in range(int(n_tickets))]
     else:
+        rejected = Counter()
         records = generate_with_smart_filters(
-            gen_func=gen_one_record,
+            pick_mode=pick_mode,
+            hot=hot,
+            cold=cold,
+            mix_hot_count=int(mix_hot_count),
             n_tickets=int(n_tickets),
             max_attempts_per_ticket=int(max_attempts_per_ticket),
             smart_kwargs=smart_kwargs,
+            rejected=rejected,
         )
         if len(records) < int(n_tickets):
+            worst = ", ".join(f"{name}: {count}" for name, count in rejected.most_common() if count)
             st.warning(
-                f"⚠️ Filtry są dość ostre: udało się wygenerować **{len(records)}** / {int(n_tickets)} kuponów. "
-                "Zwiększ limit prób albo poluzuj filtry."
+                f"⚠️ Filtry są zbyt ostre: udało się wygenerować **{len(records)}** / {int(n_tickets)} kuponów. "
+                "W części trybów żaden kupon nie spełnia filtrów — większy limit prób nie pomoże, poluzuj wskazane filtry."
+                + (f" Wykluczające filtry: {worst}." if worst else "")
             )
 
     # Tabela kuponów
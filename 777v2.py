@@ -1,3 +1,4 @@
+import importlib.util
 import io
 import os
 import re
@@ -9,14 +10,15 @@ from typing import List, Dict, Tuple, Optional
 import pandas as pd
 import streamlit as st
 
+from constrained_sampler import ConstrainedSampler, TicketRules
+from draw_store import DrawStore
+from pdf_pages import extract_pages
+
 # =========================================================
 # PDF engines
 # =========================================================
-try:
-    import fitz  # PyMuPDF
-    HAS_PYMUPDF = True
-except Exception:
-    HAS_PYMUPDF = False
+# PyMuPDF używa tylko pdf_pages — tu wystarczy sprawdzić, czy jest zainstalowany
+HAS_PYMUPDF = importlib.util.find_spec("fitz") is not None
 
 try:
     from pypdf import PdfReader
@@ -37,6 +39,8 @@ NUM_MIN = 1
 NUM_MAX = 49
 PICK_COUNT = 6
 DRAWNO_MIN = 1000
+DRAW_STORE_NAMESPACE = "777v2"
+PDF_PAGE_WORKERS = 1  # procesy ekstrakcji stron PDF; 1 = szeregowo, None = liczba CPU (tylko duże archiwa)
 
 HYBRID_HOT_P = 0.70
 HYBRID_COLD_P = 0.20
@@ -184,12 +188,7 @@ def _validate_pdf_bytes(pdf_bytes: bytes) -> None:
 def _read_pdf_pages_text_pymupdf(pdf_bytes: bytes) -> List[str]:
     if not HAS_PYMUPDF:
         raise RuntimeError("PyMuPDF not available")
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    pages = []
-    for page in doc:
-        pages.append(page.get_text("text") or "")
-    doc.close()
-    return pages
+    return extract_pages(pdf_bytes, "text", workers=PDF_PAGE_WORKERS)
 
 def _read_pdf_pages_text_pypdf(pdf_bytes: bytes) -> List[str]:
     if not HAS_PYPDF:
@@ -292,8 +291,7 @@ def _pair_draws_with_drawnos(draws: List[List[int]], drawnos: List[int]) -> List
 
     return records
 
-@st.cache_data(show_spinner=False)
-def load_records_cached(pdf_bytes: bytes) -> List[Dict]:
+def parse_records(pdf_bytes: bytes) -> List[Dict]:
     _validate_pdf_bytes(pdf_bytes)
 
     last_err = None
@@ -333,6 +331,13 @@ def load_records_cached(pdf_bytes: bytes) -> List[Dict]:
     return _pair_draws_with_drawnos(draws, all_drawnos)
 
 
+@st.cache_data(show_spinner=False)
+def load_records_cached(pdf_path: str, pdf_stamp: Tuple[int, int]) -> List[Dict]:
+    # pdf_stamp (rozmiar, mtime) jest tylko kluczem cache — bez hashowania całego PDF przy każdym rerunie;
+    # parser rusza wyłącznie, gdy zmieni się hash zawartości pliku
+    return DrawStore(DRAW_STORE_NAMESPACE).load_or_import_path(pdf_path, parse_records)
+
+
 # =========================================================
 # STATS & GROUPS (cached)
 # =========================================================
@@ -375,6 +380,22 @@ def gen_ticket(mode: str, hot: List[int], cold: List[int], mix_hot_count: int) -
         return sorted(h + c)
     raise ValueError("Nieznany tryb losowania.")
 
+def ticket_stages(mode: str, hot: List[int], cold: List[int], mix_hot_count: int) -> List[Tuple[List[int], int]]:
+    """
+    Etapy losowania gen_ticket jako [(pula, ile), ...] (dla ConstrainedSampler).
+    """
+    if mode == "hot":
+        return [(hot, PICK_COUNT)]
+    if mode == "cold":
+        return [(cold, PICK_COUNT)]
+    if mode == "mix":
+        if mix_hot_count >= PICK_COUNT:
+            return [(hot, PICK_COUNT)]
+        if mix_hot_count <= 0:
+            return [(cold, PICK_COUNT)]
+        return [(hot, mix_hot_count), (cold, PICK_COUNT - mix_hot_count)]
+    raise ValueError("Nieznany tryb losowania.")
+
 
 # =========================================================
 # SMART MODE FILTERS
@@ -382,68 +403,82 @@ def gen_ticket(mode: str, hot: List[int], cold: List[int], mix_hot_count: int) -
 def count_adjacent_pairs(nums_sorted: List[int]) -> int:
     return sum(1 for a, b in zip(nums_sorted, nums_sorted[1:]) if b == a + 1)
 
-def has_run_length(nums_sorted: List[int], run_len: int) -> bool:
-    if run_len <= 1:
-        return True
-    run = 1
-    for a, b in zip(nums_sorted, nums_sorted[1:]):
-        if b == a + 1:
-            run += 1
-            if run >= run_len:
-                return True
-        else:
-            run = 1
-    return False
-
 def even_odd_split(nums: List[int]) -> Tuple[int, int]:
     ev = sum(1 for n in nums if n % 2 == 0)
     od = len(nums) - ev
     return ev, od
 
-def smart_ok(
-    ticket: List[int],
+def smart_ticket_rules(
     block_run_2: bool,
     block_run_3: bool,
     max_adjacent_pairs: Optional[int],
     even_odd_choice: str
-) -> bool:
-    nums = sorted(ticket)
-
-    if block_run_3 and has_run_length(nums, 3):
-        return False
-    if block_run_2 and has_run_length(nums, 2):
-        return False
-
-    pairs = count_adjacent_pairs(nums)
-    if max_adjacent_pairs is not None and pairs > max_adjacent_pairs:
-        return False
-
-    ev, od = even_odd_split(nums)
+) -> TicketRules:
+    """
+    Filtry trybu inteligentnego w postaci dla ConstrainedSampler
+    (blokada ciągu 2 / 3 kolejnych, limit par sąsiednich, wybrany układ parzyste/nieparzyste).
+    """
+    max_run = 1 if block_run_2 else (2 if block_run_3 else None)
+    even = None
     if even_odd_choice != "Dowolnie":
         try:
-            ev_t, od_t = even_odd_choice.split("/")
-            if not (ev == int(ev_t) and od == int(od_t)):
-                return False
+            ev_t, od_t = (int(x) for x in even_odd_choice.split("/"))
+            even = (ev_t,) if ev_t + od_t == PICK_COUNT else ()
         except Exception:
             pass
+    return TicketRules(even_counts=even, max_adjacent_pairs=max_adjacent_pairs, max_run=max_run)
 
-    return True
+def smart_rule_labels(
+    block_run_2: bool,
+    block_run_3: bool,
+    max_adjacent_pairs: Optional[int],
+    even_odd_choice: str
+) -> Dict[str, str]:
+    """
+    Pole TicketRules -> nazwa filtra do raportu odrzuceń.
+    """
+    return {
+        "max_run": "ciąg 2 kolejnych" if block_run_2 else "ciąg 3 kolejnych",
+        "max_adjacent_pairs": f"pary sąsiednie (max {max_adjacent_pairs})",
+        "even_counts": f"parzyste/nieparzyste {even_odd_choice}",
+    }
 
 def generate_with_smart_filters(
-    gen_func,
+    pick_mode,
+    hot: List[int],
+    cold: List[int],
+    mix_hot_count: int,
     n_tickets: int,
     max_attempts_per_ticket: int,
-    smart_kwargs: Dict
+    smart_kwargs: Dict,
+    rejected: Optional[Counter] = None
 ) -> List[Dict]:
+    """
+    pick_mode() -> "hot" / "cold" / "mix" (wybór trybu jak w gen_one_record).
+    Kupony budowane od razu zgodne z filtrami (ConstrainedSampler): w obrębie trybu rozkład jak przy losowaniu
+    gen_ticket i odrzucaniu, ale czas nie zależy od ostrości filtrów. Udziały trybów zostają takie, jak daje
+    pick_mode (odrzucanie przeważało je wg odsetka kuponów przechodzących filtry). Tryb bez żadnego kuponu
+    spełniającego filtry jest pomijany i liczony w rejected pod nazwą filtrów, które go wykluczają;
+    max_attempts_per_ticket ogranicza tylko takie puste wybory trybu.
+    """
+    rules = smart_ticket_rules(**smart_kwargs)
+    labels = smart_rule_labels(**smart_kwargs)
+    samplers: Dict[str, ConstrainedSampler] = {}
     out: List[Dict] = []
     attempts = 0
-    while len(out) < n_tickets:
+    max_attempts = n_tickets * max_attempts_per_ticket
+    while len(out) < n_tickets and attempts < max_attempts:
         attempts += 1
-        if attempts > n_tickets * max_attempts_per_ticket:
-            break
-        rec = gen_func()
-        if smart_ok(rec["Kupon"], **smart_kwargs):
-            out.append(rec)
+        chosen = pick_mode()
+        if chosen not in samplers:
+            samplers[chosen] = ConstrainedSampler(ticket_stages(chosen, hot, cold, mix_hot_count), rules)
+        sampler = samplers[chosen]
+        if not sampler.feasible:
+            if rejected is not None:
+                blocking = " + ".join(labels[name] for name in sampler.blocking_rules())
+                rejected[f"tryb {chosen}: {blocking}"] += 1
+            continue
+        out.append({"Typ": chosen, "Kupon": sampler.sample(random)})
     return out
 
 
@@ -629,7 +664,10 @@ def settings_panel(defaults: Dict) -> Dict:
             index=defaults.get("even_odd_idx", 0)
         )
 
-        max_attempts_per_ticket = st.slider("Limit prób na kupon", 10, 500, defaults.get("max_attempts", 120), 10)
+        max_attempts_per_ticket = st.slider(
+            "Limit wyborów trybu na kupon (gdy filtry wykluczają tryb)", 10, 500, defaults.get("max_attempts", 120), 10,
+            help="Kupony powstają od razu zgodne z filtrami; limit dotyczy tylko losowań trybu, w którym żaden kupon nie spełnia filtrów."
+        )
     else:
         block_run_2 = False
         block_run_3 = False
@@ -694,8 +732,8 @@ def main():
 
     # Load PDF once (cached)
     try:
-        pdf_bytes = pdf_path.read_bytes()
-        result_records_all = load_records_cached(pdf_bytes)
+        pdf_stat = pdf_path.stat()
+        result_records_all = load_records_cached(str(pdf_path), (pdf_stat.st_size, pdf_stat.st_mtime_ns))
     except Exception as e:
         st.error("❌ Aplikacja nie mogła wczytać PDF albo wyciągnąć wyników.")
         st.code(str(e))
@@ -784,20 +822,22 @@ def main():
     else:
         base_mode_kind = "mix"
 
-    def gen_one_record() -> Dict:
+    def pick_mode() -> str:
         if base_mode_kind == "hybrid":
-            chosen = random.choices(["hot", "cold", "mix"], weights=[HYBRID_HOT_P, HYBRID_COLD_P, HYBRID_MIX_P], k=1)[0]
-            return {"Typ": chosen, "Kupon": gen_ticket(chosen, hot, cold, cfg["mix_hot_count"])}
-        if base_mode_kind == "hot":
-            return {"Typ": "hot", "Kupon": gen_ticket("hot", hot, cold, cfg["mix_hot_count"])}
-        if base_mode_kind == "cold":
-            return {"Typ": "cold", "Kupon": gen_ticket("cold", hot, cold, cfg["mix_hot_count"])}
-        return {"Typ": "mix", "Kupon": gen_ticket("mix", hot, cold, cfg["mix_hot_count"])}
+            return random.choices(["hot", "cold", "mix"], weights=[HYBRID_HOT_P, HYBRID_COLD_P, HYBRID_MIX_P], k=1)[0]
+        if base_mode_kind in ("hot", "cold"):
+            return base_mode_kind
+        return "mix"
+
+    def gen_one_record() -> Dict:
+        chosen = pick_mode()
+        return {"Typ": chosen, "Kupon": gen_ticket(chosen, hot, cold, cfg["mix_hot_count"])}
 
     # Generate tickets
     if generate:
         progress = st.progress(0)
         status = st.empty()
+        smart_rejected = Counter()
 
         with st.spinner("Generuję kupony..."):
             if not cfg["smart_enabled"]:
@@ -816,10 +856,14 @@ def main():
                     "even_odd_choice": cfg["even_odd_choice"]
                 }
                 recs = generate_with_smart_filters(
-                    gen_func=gen_one_record,
+                    pick_mode=pick_mode,
+                    hot=hot,
+                    cold=cold,
+                    mix_hot_count=int(cfg["mix_hot_count"]),
                     n_tickets=int(cfg["n_tickets"]),
                     max_attempts_per_ticket=int(cfg["max_attempts_per_ticket"]),
-                    smart_kwargs=smart_kwargs
+                    smart_kwargs=smart_kwargs,
+                    rejected=smart_rejected
                 )
                 progress.progress(100)
                 status.write(f"Postęp: {len(recs)}/{int(cfg['n_tickets'])}")
@@ -828,9 +872,11 @@ def main():
         status.empty()
 
         if cfg["smart_enabled"] and len(recs) < int(cfg["n_tickets"]):
+            worst = ", ".join(f"{name}: {count}" for name, count in smart_rejected.most_common() if count)
             st.warning(
                 f"⚠️ Filtry są ostre: wygenerowano **{len(recs)}** / {int(cfg['n_tickets'])} kuponów. "
-                "Poluzuj filtry albo zwiększ limit prób."
+                "W części trybów żaden kupon nie spełnia filtrów — większy limit prób nie pomoże, poluzuj wskazane filtry."
+                + (f" Wykluczające filtry: {worst}." if worst else "")
             )
 
         st.session_state["last_records"] = recs
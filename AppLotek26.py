@@ -1,14 +1,24 @@
 import random
 import re
-from dataclasses import dataclass
-from itertools import combinations
+import time
+from dataclasses import dataclass, field
 from collections import Counter, defaultdict
 from typing import Dict, List, Optional, Tuple
 
-import fitz  # PyMuPDF
 import pandas as pd
 import streamlit as st
 
+from cooccurrence import CoOccurrence
+from draw_history import DrawHistory, FrequencyIndex
+from draw_store import DrawStore, pdf_sha256
+from pdf_pages import extract_page_modes, extract_pages, iter_page_modes
+from shard_pool import SeedLike, map_shards, merge_ranked, python_seed, shard_processes, warm_pool
+from ticket_codec import SeenSet, ticket_rank, unrank_tickets
+from ticket_filters import ScreenResult, band_counts, even_counts, longest_runs, overlaps, screen, sorted_tickets, spans, sums, valid_rows
+from ticket_masks import mask_overlap, masks_array, select_diverse, ticket_mask
+from ticket_topk import TopK
+from weighted_sampler import weighted_sample
+
 
 # =========================================================
 # KONFIGURACJA
@@ -20,6 +30,14 @@ MIN_N = 1
 MAX_N = 49
 DRAW_LEN = 6
 DEFAULT_PDF_NAME = "https___www.multipasko.pl_mapy.PDF"
+DRAW_STORE_NAMESPACE = "AppLotek26"
+PDF_PAGE_WORKERS = 1  # procesy ekstrakcji stron PDF; 1 = szeregowo, None = liczba CPU (tylko duże archiwa)
+CANDIDATE_WORKERS = None  # procesy turnieju kandydatów; None = liczba CPU (wynik ten sam), 1 = szeregowo
+PDF_PARSE_CONCURRENT = False  # strategie parsera (text/blocks/words) w osobnych procesach
+DEFAULT_DEADLINE_MS = 3000  # limit czasu turnieju kandydatów; 0 = bez limitu
+TOURNAMENT_BATCH = 500  # kandydaci na partię przy limicie czasu — deadline sprawdzany po każdej partii
+TOURNAMENT_TOP_POOL = 2000  # tylu najlepszych kandydatów bierze udział w wyborze zróżnicowanego finalnego zestawu
+TOURNAMENT_MODES = ("hybrid", "weighted", "momentum", "comeback", "hot", "cold", "bystrzacha", "random")
 
 st.set_page_config(
     page_title=APP_TITLE,
@@ -47,6 +65,7 @@ class PrecomputedStats:
     freq_50: Counter
     freq_100: Counter
     freq_250: Counter
+    freq_index: FrequencyIndex
     last_seen: Dict[int, int]
     comeback_scores: Dict[int, float]
     number_scores: Dict[int, float]
@@ -55,16 +74,26 @@ class PrecomputedStats:
     delta_50: Dict[int, Counter]
     delta_100: Dict[int, Counter]
     bystrzacha_ticket: List[int]
-    pair_all: Counter
-    pair_50: Counter
-    triplet_all: Counter
-    triplet_100: Counter
+    cooc_all: CoOccurrence
+    cooc_50: CoOccurrence
+    cooc_100: CoOccurrence
     pair_max_all: int
     triplet_max_all: int
     hot_list: List[int]
     cold_list: List[int]
 
 
+@dataclass
+class TournamentReport:
+    requested: int
+    generated: int
+    evaluated: int  # unikalne kupony po twardych filtrach, ocenione przez score_ticket
+    timed_out: bool
+    elapsed_ms: float
+    # odrzucenia twardych filtrów wg pierwszej niespełnionej reguły
+    rejected: Dict[str, int] = field(default_factory=dict)
+
+
 # =========================================================
 # PODSTAWY
 # =========================================================
@@ -116,7 +145,7 @@ def ticket_sum(ticket: List[int]) -> int:
 
 
 def overlap_size(a: List[int], b: List[int]) -> int:
-    return len(set(a) & set(b))
+    return mask_overlap(ticket_mask(a), ticket_mask(b))
 
 
 # =========================================================
@@ -126,12 +155,33 @@ DRAW_LINE_RE = re.compile(r"^\s*(\d{1,2})\s+(\d{1,2})\s+(\d{1,2})\s+(\d{1,2})\s+
 DRAW_NO_RE = re.compile(r"^\d{4,5}$")
 
 
-def parse_rows_from_text_layer(pdf_bytes: bytes) -> List[List[str]]:
+def rows_from_text_pages(pages: List[str]) -> List[List[str]]:
     rows: List[List[str]] = []
 
-    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-        for page in doc:
-            text = page.get_text("text")
+    for text in pages:
+        if not text:
+            continue
+
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            rows.append(line.split())
+
+    return rows
+
+
+def rows_from_block_pages(pages: List[List[Tuple]]) -> List[List[str]]:
+    rows: List[List[str]] = []
+
+    for blocks in pages:
+        if not blocks:
+            continue
+
+        for block in blocks:
+            if len(block) < 5:
+                continue
+            text = str(block[4]).strip()
             if not text:
                 continue
 
@@ -144,57 +194,50 @@ def parse_rows_from_text_layer(pdf_bytes: bytes) -> List[List[str]]:
     return rows
 
 
-def parse_rows_from_blocks(pdf_bytes: bytes) -> List[List[str]]:
+def rows_from_word_pages(pages: List[List[Tuple]]) -> List[List[str]]:
     rows: List[List[str]] = []
 
-    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-        for page in doc:
-            blocks = page.get_text("blocks")
-            if not blocks:
+    for words in pages:
+        if not words:
+            continue
+
+        grouped: Dict[float, List[Tuple[float, str]]] = {}
+
+        for word in words:
+            x0, y0, x1, y1, text, *_ = word
+            text = str(text).strip()
+            if not text:
                 continue
 
-            for block in blocks:
-                if len(block) < 5:
-                    continue
-                text = str(block[4]).strip()
-                if not text:
-                    continue
+            y_key = round(float(y0), 1)
+            grouped.setdefault(y_key, []).append((float(x0), text))
 
-                for line in text.splitlines():
-                    line = line.strip()
-                    if not line:
-                        continue
-                    rows.append(line.split())
+        for y_key in sorted(grouped.keys()):
+            row = grouped[y_key]
+            row.sort(key=lambda item: item[0])
+            rows.append([token for _, token in row])
 
     return rows
 
 
-def parse_rows_from_words(pdf_bytes: bytes) -> List[List[str]]:
-    rows: List[List[str]] = []
+def parse_rows_from_text_layer(pdf_bytes: bytes) -> List[List[str]]:
+    return rows_from_text_pages(extract_pages(pdf_bytes, "text", workers=PDF_PAGE_WORKERS))
 
-    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-        for page in doc:
-            words = page.get_text("words")
-            if not words:
-                continue
 
-            grouped: Dict[float, List[Tuple[float, str]]] = {}
+def parse_rows_from_blocks(pdf_bytes: bytes) -> List[List[str]]:
+    return rows_from_block_pages(extract_pages(pdf_bytes, "blocks", workers=PDF_PAGE_WORKERS))
 
-            for word in words:
-                x0, y0, x1, y1, text, *_ = word
-                text = str(text).strip()
-                if not text:
-                    continue
 
-                y_key = round(float(y0), 1)
-                grouped.setdefault(y_key, []).append((float(x0), text))
+def parse_rows_from_words(pdf_bytes: bytes) -> List[List[str]]:
+    return rows_from_word_pages(extract_pages(pdf_bytes, "words", workers=PDF_PAGE_WORKERS))
 
-            for y_key in sorted(grouped.keys()):
-                row = grouped[y_key]
-                row.sort(key=lambda item: item[0])
-                rows.append([token for _, token in row])
 
-    return rows
+# strategie w kolejności preferencji: (tryb ekstrakcji fitz, budowa wierszy ze stron)
+PARSE_STRATEGIES = [
+    ("text", rows_from_text_pages),
+    ("blocks", rows_from_block_pages),
+    ("words", rows_from_word_pages),
+]
 
 
 def extract_draws_and_numbers_from_rows(rows: List[List[str]]) -> Tuple[List[List[int]], List[int]]:
@@ -257,20 +300,65 @@ def score_parse_result(draw_rows: List[List[int]], draw_numbers: List[int]) -> i
     return len(draw_rows) * 10 + min(len(draw_rows), len(draw_numbers))
 
 
-def parse_lotto_pdf_bytes(pdf_bytes: bytes) -> List[DrawRecord]:
+def draw_sequence_complete(draw_rows: List[List[int]], draw_numbers: List[int]) -> bool:
+    """
+    Każde losowanie ma numer, a numery maleją kolejno o 1 — wynik nie ma luk.
+    """
+    return (
+        len(draw_rows) > 0
+        and len(draw_rows) == len(draw_numbers)
+        and all(a - b == 1 for a, b in zip(draw_numbers, draw_numbers[1:]))
+    )
+
+
+def draw_pages_complete(page_draw_counts: List[int]) -> bool:
+    """
+    Każda strona ma losowania, a wszystkie poza ostatnią tyle samo — liczba wierszy zgadza się z liczbą stron.
+    Sam brak luk w numerach (draw_sequence_complete) nie wykrywa ucięcia początku ani końca dokumentu.
+    """
+    if not page_draw_counts or min(page_draw_counts) == 0:
+        return False
+    full = page_draw_counts[0]
+    return all(c == full for c in page_draw_counts[:-1]) and page_draw_counts[-1] <= full
+
+
+def parse_lotto_pdf_bytes(pdf_bytes: bytes, concurrent: bool = False) -> List[DrawRecord]:
+    """
+    PDF otwierany raz; tekst/bloki/słowa stron czytane ze wspólnego TextPage.
+    Gdy warstwa tekstowa daje kompletną sekwencję losowań (bez luk w numerach i pokrywającą wszystkie strony),
+    pozostałe strategie są pomijane; w przeciwnym razie wygrywa najlepszy score_parse_result jak dotąd.
+    concurrent=True: strategie ekstrahowane równolegle w osobnych procesach (bez wczesnego wyjścia).
+    """
     candidates = []
+    builders = dict(PARSE_STRATEGIES)
+    modes = [parser_name for parser_name, _ in PARSE_STRATEGIES]
 
-    for parser_name, parser_fn in [
-        ("text", parse_rows_from_text_layer),
-        ("blocks", parse_rows_from_blocks),
-        ("words", parse_rows_from_words),
-    ]:
-        try:
-            rows = parser_fn(pdf_bytes)
-            draw_rows, draw_numbers = extract_draws_and_numbers_from_rows(rows)
-            candidates.append((parser_name, rows, draw_rows, draw_numbers))
-        except Exception:
-            candidates.append((parser_name, [], [], []))
+    try:
+        if concurrent:
+            extracted = extract_page_modes(pdf_bytes, modes, workers=PDF_PAGE_WORKERS).items()
+        else:
+            extracted = iter_page_modes(pdf_bytes, modes)
+
+        for parser_name, pages in extracted:
+            try:
+                rows = builders[parser_name](pages)
+                draw_rows, draw_numbers = extract_draws_and_numbers_from_rows(rows)
+                candidates.append((parser_name, rows, draw_rows, draw_numbers))
+            except Exception:
+                candidates.append((parser_name, [], [], []))
+                continue
+
+            if (
+                not concurrent
+                and parser_name == "text"
+                and draw_sequence_complete(draw_rows, draw_numbers)
+                and draw_pages_complete([
+                    len(extract_draws_and_numbers_from_rows(builders[parser_name]([page]))[0]) for page in pages
+                ])
+            ):
+                break
+    except Exception:
+        pass
 
     best_draw_rows = []
     best_draw_numbers = []
@@ -310,15 +398,9 @@ def get_draws(records: List[DrawRecord]) -> List[List[int]]:
 # =========================================================
 # ANALIZA
 # =========================================================
-def frequency(draws: List[List[int]]) -> Counter:
-    c = Counter()
-    for d in draws:
-        c.update(d)
-    return c
-
-
-def rolling_frequency(draws: List[List[int]], window: int) -> Counter:
-    return frequency(draws[:window])
+def rolling_frequency(index: FrequencyIndex, window: int) -> Counter:
+    counts = index.counts(window)
+    return Counter({n: int(counts[n]) for n in range(MIN_N, MAX_N + 1) if counts[n]})
 
 
 def last_seen_index(draws: List[List[int]]) -> Dict[int, int]:
@@ -384,22 +466,6 @@ def positional_deltas_window(draws: List[List[int]], window: int) -> Dict[int, C
     return positional_deltas(subset)
 
 
-def strongest_pairs(draws: List[List[int]]) -> Counter:
-    c = Counter()
-    for d in draws:
-        for pair in combinations(sorted(d), 2):
-            c[pair] += 1
-    return c
-
-
-def strongest_triplets(draws: List[List[int]]) -> Counter:
-    c = Counter()
-    for d in draws:
-        for tri in combinations(sorted(d), 3):
-            c[tri] += 1
-    return c
-
-
 def predict_positional_ticket_v2_from_stats(last_draw: List[int], d25: Dict[int, Counter], d50: Dict[int, Counter], d100: Dict[int, Counter]) -> List[int]:
     predicted = []
 
@@ -441,16 +507,23 @@ def predict_positional_ticket_v2_from_stats(last_draw: List[int], d25: Dict[int,
     return sorted(fixed)
 
 
-def build_precomputed_stats(draws: List[List[int]]) -> PrecomputedStats:
+def build_precomputed_stats(draws: List[List[int]], freq_index: Optional[FrequencyIndex] = None) -> PrecomputedStats:
+    """
+    freq_index może obejmować dłuższą historię niż draws (draws to jej najnowszy fragment),
+    wtedy zmiana okna analizy nie wymaga ponownego zliczania częstości.
+    """
     total = len(draws)
     last_draw = draws[0]
 
-    freq_all = frequency(draws)
-    freq_12 = rolling_frequency(draws, min(12, total))
-    freq_25 = rolling_frequency(draws, min(25, total))
-    freq_50 = rolling_frequency(draws, min(50, total))
-    freq_100 = rolling_frequency(draws, min(100, total))
-    freq_250 = rolling_frequency(draws, min(250, total))
+    if freq_index is None:
+        freq_index = FrequencyIndex(DrawHistory.from_draws(draws))
+
+    freq_all = rolling_frequency(freq_index, total)
+    freq_12 = rolling_frequency(freq_index, min(12, total))
+    freq_25 = rolling_frequency(freq_index, min(25, total))
+    freq_50 = rolling_frequency(freq_index, min(50, total))
+    freq_100 = rolling_frequency(freq_index, min(100, total))
+    freq_250 = rolling_frequency(freq_index, min(250, total))
 
     last_seen = last_seen_index(draws)
     gap_history = build_gap_history(draws)
@@ -516,13 +589,12 @@ def build_precomputed_stats(draws: List[List[int]]) -> PrecomputedStats:
     delta_100 = positional_deltas_window(draws, min(100, total))
     bystrzacha_ticket = predict_positional_ticket_v2_from_stats(sorted(last_draw), delta_25, delta_50, delta_100)
 
-    pair_all = strongest_pairs(draws)
-    pair_50 = strongest_pairs(draws[:min(50, total)])
-    triplet_all = strongest_triplets(draws)
-    triplet_100 = strongest_triplets(draws[:min(100, total)])
+    cooc_all = CoOccurrence(draws, max_order=3)
+    cooc_50 = CoOccurrence(draws[:min(50, total)], max_order=2)
+    cooc_100 = CoOccurrence(draws[:min(100, total)], max_order=3)
 
-    pair_max_all = max(pair_all.values()) if pair_all else 1
-    triplet_max_all = max(triplet_all.values()) if triplet_all else 1
+    pair_max_all = cooc_all.max_count(2) or 1
+    triplet_max_all = cooc_all.max_count(3) or 1
 
     hot_list = sorted(
         range(MIN_N, MAX_N + 1),
@@ -545,6 +617,7 @@ def build_precomputed_stats(draws: List[List[int]]) -> PrecomputedStats:
         freq_50=freq_50,
         freq_100=freq_100,
         freq_250=freq_250,
+        freq_index=freq_index,
         last_seen=last_seen,
         comeback_scores=comeback_scores,
         number_scores=number_scores,
@@ -553,10 +626,9 @@ def build_precomputed_stats(draws: List[List[int]]) -> PrecomputedStats:
         delta_50=delta_50,
         delta_100=delta_100,
         bystrzacha_ticket=bystrzacha_ticket,
-        pair_all=pair_all,
-        pair_50=pair_50,
-        triplet_all=triplet_all,
-        triplet_100=triplet_100,
+        cooc_all=cooc_all,
+        cooc_50=cooc_50,
+        cooc_100=cooc_100,
         pair_max_all=pair_max_all,
         triplet_max_all=triplet_max_all,
         hot_list=hot_list,
@@ -669,20 +741,30 @@ def ticket_passes_hard_filters(ticket: List[int], last_draw: List[int]) -> bool:
     return True
 
 
+def hard_filter_screen(tickets, last_draw: List[int]) -> ScreenResult:
+    """
+    ticket_passes_hard_filters dla całej partii (M, 6) naraz: maska + odrzucenia per reguła.
+    """
+    t = sorted_tickets(tickets)
+    odd = DRAW_LEN - even_counts(t)
+    total = sums(t)
+    return screen(len(t), [
+        ("niepoprawny kupon", valid_rows(t)),
+        ("parzystość", (odd >= 2) & (odd <= 4)),
+        ("zakresy niskie/średnie/wysokie", (band_counts(t, (17, 34)) > 0).all(axis=1)),
+        ("ciąg 4+ kolejnych", longest_runs(t) < 4),
+        ("rozpiętość < 18", spans(t) >= 18),
+        ("suma poza 75-200", (total >= 75) & (total <= 200)),
+        ("4+ z ostatniego losowania", overlaps(t, last_draw) < 4),
+    ])
+
+
 # =========================================================
 # FAST ENGINE
 # =========================================================
 def weighted_pick_unique(pool: List[int], weights: Dict[int, float], k: int) -> List[int]:
-    left = pool[:]
-    out = []
-
-    for _ in range(k):
-        w = [max(weights[x], 1e-9) for x in left]
-        pick = random.choices(left, weights=w, k=1)[0]
-        out.append(pick)
-        left.remove(pick)
-
-    return sorted(out)
+    # jedno losowanie kluczy na cały kupon zamiast k przebiegów random.choices
+    return weighted_sample(random, pool, [max(weights[x], 1e-9) for x in pool], k)
 
 
 def build_candidate_ticket(stats: PrecomputedStats, mode: str = "hybrid") -> List[int]:
@@ -778,21 +860,17 @@ def positional_trend_score(ticket: List[int], stats: PrecomputedStats) -> float:
 
 
 def pair_strength_score(ticket: List[int], stats: PrecomputedStats) -> float:
-    vals = []
-    for p in combinations(sorted(ticket), 2):
-        vals.append((stats.pair_all[p] * 0.55) + (stats.pair_50[p] * 0.45))
-    if not vals:
+    if len(ticket) < 2:
         return 0.0
-    return (sum(vals) / len(vals)) / max(1, stats.pair_max_all)
+    vals = stats.cooc_all.combo_counts(ticket, 2) * 0.55 + stats.cooc_50.combo_counts(ticket, 2) * 0.45
+    return float(vals.mean()) / max(1, stats.pair_max_all)
 
 
 def triplet_strength_score(ticket: List[int], stats: PrecomputedStats) -> float:
-    vals = []
-    for t in combinations(sorted(ticket), 3):
-        vals.append((stats.triplet_all[t] * 0.60) + (stats.triplet_100[t] * 0.40))
-    if not vals:
+    if len(ticket) < 3:
         return 0.0
-    return (sum(vals) / len(vals)) / max(1, stats.triplet_max_all)
+    vals = stats.cooc_all.combo_counts(ticket, 3) * 0.60 + stats.cooc_100.combo_counts(ticket, 3) * 0.40
+    return float(vals.mean()) / max(1, stats.triplet_max_all)
 
 
 def score_ticket(ticket: List[int], stats: PrecomputedStats) -> Dict[str, float]:
@@ -864,36 +942,16 @@ def diversity_select(
     if not ranked_candidates:
         return []
 
-    selected = []
-    profiles_count = Counter()
-
-    for candidate in ranked_candidates:
-        ticket, metrics, mode, profile = candidate
-
-        if not selected:
-            selected.append(candidate)
-            profiles_count[profile] += 1
-            if len(selected) >= desired_count:
-                break
-            continue
-
-        too_similar = False
-        for chosen_ticket, _, _, _ in selected:
-            if overlap_size(ticket, chosen_ticket) >= 4:
-                too_similar = True
-                break
-
-        if too_similar:
-            continue
-
-        if profiles_count[profile] >= max(2, desired_count // 3):
-            continue
-
-        selected.append(candidate)
-        profiles_count[profile] += 1
-
-        if len(selected) >= desired_count:
-            break
+    # najlepszy wynik przy części wspólnej z każdym wybranym najwyżej 3 i limicie kuponów na profil
+    chosen = select_diverse(
+        masks_array([c[0] for c in ranked_candidates]),
+        [c[1]["final_score"] for c in ranked_candidates],
+        desired_count,
+        max_common=3,
+        groups=[c[3] for c in ranked_candidates],
+        group_limit=max(2, desired_count // 3)
+    )
+    selected = [ranked_candidates[i] for i in chosen]
 
     if len(selected) < desired_count:
         selected_keys = {tuple(x[0]) for x in selected}
@@ -911,13 +969,23 @@ def generate_tournament_candidates(
     stats: PrecomputedStats,
     n_candidates: int,
     modes: List[str],
-    use_bystrzacha_blend: bool
-) -> List[Tuple[List[int], Dict[str, float], str, str]]:
-    raw_candidates = []
-    seen = set()
+    use_bystrzacha_blend: bool,
+    top: TopK,
+    seen: Optional[SeenSet] = None,
+    rejected: Optional[Counter] = None
+) -> Tuple[int, int]:
+    """
+    Jedna partia turnieju: ocenieni kandydaci trafiają do rankingu top (wynik, ranga, indeks trybu
+    w TOURNAMENT_MODES) — metryki reszty nie są trzymane. Zwraca (zbudowani, ocenieni); zbudowanych
+    może być więcej niż n_candidates, bo każdy tryb dostaje co najmniej jednego kandydata.
+    """
+    # seen współdzielony między partiami turnieju — bez powtórek kuponów w kolejnych partiach
+    built: List[Tuple[List[int], str]] = []
+    if seen is None:
+        seen = SeenSet()
 
     if not modes:
-        modes = ["hybrid", "weighted", "momentum", "comeback", "hot", "cold", "bystrzacha", "random"]
+        modes = list(TOURNAMENT_MODES)
 
     per_mode = max(1, n_candidates // len(modes))
 
@@ -954,22 +1022,95 @@ def generate_tournament_candidates(
             if x not in ticket:
                 ticket.append(x)
         ticket = sorted(ticket[:DRAW_LEN])
+        built.append((ticket, mode))
+
+    # twarde filtry na całej partii naraz, przed deduplikacją i scoringiem
+    passed = hard_filter_screen([t for t, _ in built], stats.last_draw)
+    if rejected is not None:
+        rejected.update(passed.rejected)
 
-        if not ticket_passes_hard_filters(ticket, stats.last_draw):
+    evaluated = 0
+    for (ticket, mode), ok in zip(built, passed.mask.tolist()):
+        if not ok:
             continue
 
-        key = tuple(ticket)
-        if key in seen:
+        rank = ticket_rank(ticket)
+        if not seen.add(rank):
             continue
-        seen.add(key)
 
+        top.push(score_ticket(ticket, stats)["final_score"], rank, TOURNAMENT_MODES.index(mode))
+        evaluated += 1
+
+    return len(built), evaluated
+
+
+def tournament_ranking(stats: PrecomputedStats, top: TopK) -> List[Tuple[List[int], Dict[str, float], str, str]]:
+    """
+    Ranking z TopK → (kupon, metryki, tryb, profil); metryki liczone ponownie tylko dla zwycięzców.
+    """
+    _, ranks, tags = top.result()
+    ranked = []
+    for ticket, tag in zip(unrank_tickets(ranks).astype(int).tolist(), tags.tolist()):
         metrics = score_ticket(ticket, stats)
-        profile = classify_ticket(metrics)
+        ranked.append((ticket, metrics, TOURNAMENT_MODES[tag], classify_ticket(metrics)))
+    return ranked
+
+
+def run_tournament(
+    stats: PrecomputedStats,
+    n_candidates: int,
+    modes: List[str],
+    use_bystrzacha_blend: bool,
+    deadline: Optional[float]
+) -> Tuple[List[Tuple[List[int], Dict[str, float], str, str]], int, int, bool, Dict[str, int]]:
+    """
+    Pętla turnieju na globalnym random: (ranking TOURNAMENT_TOP_POOL najlepszych, wygenerowane, ocenione, przerwano,
+    odrzucenia twardych filtrów).
+    deadline to absolutny czas time.time() (porównywalny między procesami) albo None — wtedy jedna partia.
+    """
+    batch_size = TOURNAMENT_BATCH if deadline is not None else max(1, n_candidates)
+
+    seen = SeenSet()
+    # przy remisie wyżej kandydat dodany wcześniej (wcześniejsza partia), jak przy sortowaniu stabilnym
+    top = TopK(TOURNAMENT_TOP_POOL)
+    generated = evaluated = 0
+    timed_out = False
+    rejected: Counter = Counter()
+
+    while generated < n_candidates:
+        if generated and deadline is not None and time.time() >= deadline:
+            timed_out = True
+            break
 
-        raw_candidates.append((ticket, metrics, mode, profile))
+        size = min(batch_size, n_candidates - generated)
+        built, scored = generate_tournament_candidates(
+            stats=stats,
+            n_candidates=size,
+            modes=modes,
+            use_bystrzacha_blend=use_bystrzacha_blend,
+            top=top,
+            seen=seen,
+            rejected=rejected
+        )
+        generated += built
+        evaluated += scored
 
-    raw_candidates.sort(key=lambda x: x[1]["final_score"], reverse=True)
-    return raw_candidates
+    return tournament_ranking(stats, top), generated, evaluated, timed_out, dict(rejected)
+
+
+def tournament_shard(
+    n_candidates: int,
+    seed: SeedLike,
+    stats: PrecomputedStats,
+    modes: List[str],
+    use_bystrzacha_blend: bool,
+    deadline: Optional[float]
+) -> Tuple[List[Tuple[List[int], Dict[str, float], str, str]], int, int, bool, Dict[str, int]]:
+    """
+    Shard turnieju dla map_shards — proces roboczy ma własny globalny random, więc seedujemy go tutaj.
+    """
+    random.seed(python_seed(seed))
+    return run_tournament(stats, n_candidates, modes, use_bystrzacha_blend, deadline)
 
 
 def build_final_ticket_set(
@@ -977,20 +1118,54 @@ def build_final_ticket_set(
     n_candidates: int = 12000,
     final_count: int = 6,
     modes: Optional[List[str]] = None,
-    use_bystrzacha_blend: bool = True
-) -> List[Tuple[List[int], Dict[str, float], str, str]]:
+    use_bystrzacha_blend: bool = True,
+    deadline_ms: Optional[int] = None,
+    workers: Optional[int] = CANDIDATE_WORKERS
+) -> Tuple[List[Tuple[List[int], Dict[str, float], str, str]], TournamentReport]:
+    """
+    Turniej n_candidates kandydatów i wybór finalnego zestawu.
+    Z deadline_ms kandydaci powstają partiami po TOURNAMENT_BATCH; po każdej partii aktualizowany
+    jest ranking najlepszych, a po upływie limitu wynik budowany jest z tego, co zdążyło powstać
+    (zawsze co najmniej jedna partia). Bez limitu — jedna partia, jak dotąd.
+    Przy workers != 1 budżet dzielony jest na stałą liczbę shardów w osobnych procesach (seed shardów z globalnego
+    random, więc random.seed(...) przed wywołaniem daje powtarzalny wynik niezależnie od liczby CPU).
+    Z deadline_ms zimna pula nie mieści się w limicie — wtedy turniej idzie szeregowo, a pula startuje w tle.
+    """
     if modes is None:
-        modes = ["hybrid", "weighted", "momentum", "comeback", "hot", "cold", "bystrzacha", "random"]
+        modes = list(TOURNAMENT_MODES)
 
-    ranked = generate_tournament_candidates(
-        stats=stats,
-        n_candidates=n_candidates,
-        modes=modes,
-        use_bystrzacha_blend=use_bystrzacha_blend
-    )
+    if workers != 1 and deadline_ms and not warm_pool(shard_processes(workers, n_candidates)):
+        workers = 1
 
-    top_pool = ranked[:100]
-    diverse = diversity_select(top_pool, desired_count=final_count)
+    started = time.perf_counter()
+    deadline = time.time() + deadline_ms / 1000.0 if deadline_ms else None
+
+    if workers == 1:
+        ranked, generated, evaluated, timed_out, rejected = run_tournament(
+            stats, n_candidates, modes, use_bystrzacha_blend, deadline
+        )
+    else:
+        parts = map_shards(
+            tournament_shard,
+            n_candidates,
+            random.getrandbits(63),
+            workers=workers,
+            args=(stats, modes, use_bystrzacha_blend, deadline)
+        )
+        ranked = merge_ranked(
+            [p[0] for p in parts],
+            key=lambda x: x[1]["final_score"],
+            top_k=TOURNAMENT_TOP_POOL,
+            unique_key=lambda x: tuple(x[0])
+        )
+        generated = sum(p[1] for p in parts)
+        evaluated = sum(p[2] for p in parts)
+        timed_out = any(p[3] for p in parts)
+        rejected = Counter()
+        for p in parts:
+            rejected.update(p[4])
+
+    diverse = diversity_select(ranked, desired_count=final_count)
 
     if ranked:
         gold = max(
@@ -1007,7 +1182,15 @@ def build_final_ticket_set(
         if tuple(gold[0]) not in {tuple(x[0]) for x in diverse} and len(diverse) < final_count + 1:
             diverse.append((gold[0], gold[1], gold[2], "złoty strzał"))
 
-    return diverse
+    report = TournamentReport(
+        requested=n_candidates,
+        generated=generated,
+        evaluated=evaluated,
+        timed_out=timed_out,
+        elapsed_ms=(time.perf_counter() - started) * 1000.0,
+        rejected=dict(rejected),
+    )
+    return diverse, report
 
 
 # =========================================================
@@ -1075,14 +1258,14 @@ def bystrzacha_dataframe(stats: PrecomputedStats) -> pd.DataFrame:
 
 def pairs_dataframe(stats: PrecomputedStats, top_n: int = 25) -> pd.DataFrame:
     rows = []
-    for (a, b), count in stats.pair_all.most_common(top_n):
+    for (a, b), count in stats.cooc_all.most_common(2, top_n):
         rows.append({"a": a, "b": b, "count": count})
     return pd.DataFrame(rows)
 
 
 def triplets_dataframe(stats: PrecomputedStats, top_n: int = 25) -> pd.DataFrame:
     rows = []
-    for (a, b, c), count in stats.triplet_all.most_common(top_n):
+    for (a, b, c), count in stats.cooc_all.most_common(3, top_n):
         rows.append({"a": a, "b": b, "c": c, "count": count})
     return pd.DataFrame(rows)
 
@@ -1149,8 +1332,20 @@ def load_default_pdf_if_exists() -> Optional[bytes]:
 
 
 @st.cache_data(show_spinner=True)
-def parse_pdf_cached(pdf_bytes: bytes) -> List[DrawRecord]:
-    return parse_lotto_pdf_bytes(pdf_bytes)
+def parse_pdf_cached(pdf_hash: str, _pdf_bytes: bytes) -> List[DrawRecord]:
+    # klucz cache to hash PDF; parser rusza tylko, gdy lokalny magazyn nie zna tego hasha
+    rows = DrawStore(DRAW_STORE_NAMESPACE).load_or_import(
+        _pdf_bytes,
+        lambda pdf_bytes: [{"draw_no": r.draw_no, "nums": r.numbers} for r in parse_lotto_pdf_bytes(pdf_bytes, concurrent=PDF_PARSE_CONCURRENT)],
+        pdf_hash=pdf_hash,
+    )
+    return [DrawRecord(draw_no=row["draw_no"], numbers=row["nums"]) for row in rows]
+
+
+@st.cache_data(show_spinner=False)
+def frequency_index_cached(records_serialized: Tuple[Tuple[Optional[int], Tuple[int, ...]], ...]) -> FrequencyIndex:
+    records = [DrawRecord(draw_no=r[0], numbers=list(r[1])) for r in records_serialized]
+    return FrequencyIndex(DrawHistory.from_draws(get_draws(records)))
 
 
 @st.cache_data(show_spinner=True)
@@ -1158,7 +1353,7 @@ def precompute_stats_cached(records_serialized: Tuple[Tuple[Optional[int], Tuple
     records = [DrawRecord(draw_no=r[0], numbers=list(r[1])) for r in records_serialized]
     draws_all = get_draws(records)
     draws = draws_all[:analysis_window]
-    return build_precomputed_stats(draws)
+    return build_precomputed_stats(draws, frequency_index_cached(records_serialized))
 
 
 # =========================================================
@@ -1212,6 +1407,14 @@ def main():
             step=1000,
         )
 
+        deadline_ms = st.slider(
+            "Limit czasu turnieju (ms, 0 = bez limitu)",
+            min_value=0,
+            max_value=20000,
+            value=DEFAULT_DEADLINE_MS,
+            step=250,
+        )
+
         final_count = st.slider(
             "Ile finalnych kuponów wybrać",
             min_value=3,
@@ -1222,7 +1425,7 @@ def main():
 
         chosen_modes = st.multiselect(
             "Tryby źródłowe",
-            options=["hybrid", "weighted", "momentum", "comeback", "hot", "cold", "bystrzacha", "random"],
+            options=list(TOURNAMENT_MODES),
             default=["hybrid", "weighted", "momentum", "comeback", "hot", "cold", "bystrzacha"],
         )
 
@@ -1251,7 +1454,7 @@ def main():
         st.stop()
 
     with st.spinner("Czytam PDF..."):
-        records = parse_pdf_cached(pdf_bytes)
+        records = parse_pdf_cached(pdf_sha256(pdf_bytes), pdf_bytes)
 
     draws_all = get_draws(records)
 
@@ -1296,18 +1499,29 @@ def main():
 
         if run_button:
             with st.spinner("Trwa turniej kandydatów i wybór najlepszych kuponów..."):
-                results = build_final_ticket_set(
+                results, report = build_final_ticket_set(
                     stats=stats,
                     n_candidates=candidate_pool,
                     final_count=final_count,
                     modes=chosen_modes if chosen_modes else None,
-                    use_bystrzacha_blend=use_bystrzacha_blend
+                    use_bystrzacha_blend=use_bystrzacha_blend,
+                    deadline_ms=deadline_ms or None
                 )
 
             if not results:
                 st.warning("Nie udało się wygenerować finalnych kuponów.")
             else:
-                st.success(f"Wybrano {len(results)} finalnych kuponów z puli {candidate_pool} kandydatów.")
+                st.success(
+                    f"Wybrano {len(results)} finalnych kuponów; ocenionych kandydatów: {report.evaluated} "
+                    f"(wylosowanych {report.generated} z {report.requested}) w {report.elapsed_ms:.0f} ms."
+                )
+                if report.timed_out:
+                    st.info(f"Limit czasu {deadline_ms} ms — turniej przerwany, wynik z dotychczasowych kandydatów.")
+                if any(report.rejected.values()):
+                    st.caption(
+                        "Odrzucone przez twarde filtry: " +
+                        ", ".join(f"{name}: {count}" for name, count in report.rejected.items() if count)
+                    )
 
                 for i, (ticket, metrics, mode, profile) in enumerate(results, start=1):
                     st.markdown(
@@ -1,14 +1,25 @@
+import math
 import random
 import re
 import statistics
 from dataclasses import dataclass
 from itertools import combinations
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 
-import fitz  # PyMuPDF
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+from cooccurrence import BINOM, CoOccurrence
+from draw_history import DrawHistory, numbers_to_masks
+from pdf_pages import extract_pages
+from shard_pool import SeedLike, map_shards, merge_ranked, python_seed
+from ticket_codec import SeenSet, rank_tickets, unique_ranks, unrank_tickets
+from ticket_filters import adjacent_pairs, even_counts, longest_runs, sorted_tickets, spans, sums
+from ticket_masks import masks_array, overlap_with, select_diverse, ticket_mask
+from ticket_topk import TopK
+from weighted_sampler import sample_tickets, weight_vector, weighted_sample
+
 
 # =========================================================
 # KONFIGURACJA
@@ -25,7 +36,13 @@ LOTTO_PICK = 6
 
 DEFAULT_HISTORY_WINDOW = 999
 DEFAULT_CANDIDATES = 3000
+MAX_RANKING_CANDIDATES = 1_000_000  # ranking liczony wsadowo (score_tickets), 1M kandydatów to kilka sekund
 DEFAULT_RANDOM_SEED = 42
+PDF_PAGE_WORKERS = 1  # procesy ekstrakcji stron PDF; 1 = szeregowo, None = liczba CPU (tylko duże archiwa)
+CANDIDATE_WORKERS = None  # procesy rankingu kandydatów; None = liczba CPU (wynik ten sam), 1 = szeregowo
+SZLACZEK_VARIANT_BUDGET = 20000  # ile kombinacji wariantów szlaczka ocenić najwyżej (5 wariantów na 6 pozycji = 15625)
+RANKING_SHARD_KEEP = 50  # ile najlepszych kandydatów na każdy żądany kupon trzyma ranking (i oddaje jeden shard)
+CANDIDATE_CHUNK = 16384  # kupony losowane i oceniane partiami — pamięć rankingu nie rośnie z liczbą kandydatów
 
 LINE_DRAWNO = re.compile(r"^\d{4}$")
 NUM_TOKEN_RE = re.compile(r"^\d{1,2}$")
@@ -207,39 +224,7 @@ def weighted_sample_without_replacement(
 ) -> List[int]:
     if k > len(population):
         raise ValueError("k nie może być większe niż populacja.")
-    pop = population[:]
-    wts = weights[:]
-    result = []
-
-    for _ in range(k):
-        total = sum(wts)
-        if total <= 0:
-            pick_idx = rng.randrange(len(pop))
-        else:
-            r = rng.uniform(0, total)
-            acc = 0.0
-            pick_idx = 0
-            for i, w in enumerate(wts):
-                acc += w
-                if acc >= r:
-                    pick_idx = i
-                    break
-
-        result.append(pop.pop(pick_idx))
-        wts.pop(pick_idx)
-
-    return sorted(result)
-
-
-def ticket_overlap(a: List[int], b: List[int]) -> int:
-    return len(set(a) & set(b))
-
-
-def is_diverse_enough(candidate: List[int], existing: List[List[int]], max_overlap: int = 3) -> bool:
-    for ex in existing:
-        if ticket_overlap(candidate, ex) > max_overlap:
-            return False
-    return True
+    return weighted_sample(rng, population, weights, k)
 
 
 def basic_structure_score(nums: List[int]) -> float:
@@ -279,6 +264,22 @@ def basic_structure_score(nums: List[int]) -> float:
     return score
 
 
+def basic_structure_scores(tickets: np.ndarray) -> np.ndarray:
+    """
+    basic_structure_score dla posortowanych kuponów (M, 6).
+    """
+    score = np.zeros(len(tickets))
+    evens = even_counts(tickets)
+    score += np.where((evens >= 2) & (evens <= 4), 1.2, -0.8)
+    spread = spans(tickets)
+    score += np.where((spread >= 18) & (spread <= 40), 1.4, -0.7)
+    score += np.where(adjacent_pairs(tickets) <= 2, 0.8, -0.8)
+    score += np.where(longest_runs(tickets) <= 3, 0.7, -1.0)
+    total = sums(tickets)
+    score += np.where((total >= 90) & (total <= 210), 1.1, -0.6)
+    return score
+
+
 # =========================================================
 # PDF PARSER
 # =========================================================
@@ -293,12 +294,7 @@ def _validate_pdf_bytes(pdf_bytes: bytes) -> None:
 
 def _read_pdf_pages_words(pdf_bytes: bytes) -> List[List[Tuple]]:
     _validate_pdf_bytes(pdf_bytes)
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    pages_words = []
-    for page in doc:
-        pages_words.append(page.get_text("words") or [])
-    doc.close()
-    return pages_words
+    return extract_pages(pdf_bytes, "words", workers=PDF_PAGE_WORKERS)
 
 
 def _group_words_into_rows(words: List[Tuple], y_tolerance: float = 2.2) -> List[List[Tuple]]:
@@ -440,46 +436,36 @@ DEFAULT_DRAWS: List[Draw] = [
 # ANALITYKA
 # =========================================================
 class LottoAnalyzer:
-    def __init__(self, draws: List[Draw]):
+    def __init__(self, draws: Union[List[Draw], DrawHistory]):
+        if isinstance(draws, DrawHistory):
+            draw_ids = draws.draw_ids.tolist() if draws.draw_ids is not None else range(len(draws), 0, -1)
+            draws = [Draw(int(i), nums) for i, nums in zip(draw_ids, draws.to_lists())]
+
         self.draws = sorted(draws, key=lambda d: d.draw_id, reverse=True)
         self.total_draws = len(self.draws)
         self.draw_only = [d.nums for d in self.draws]
+        self.history = DrawHistory.from_draws(self.draw_only, [d.draw_id for d in self.draws])
 
-        self.freq = self._freq_map(self.draw_only, LOTTO_MIN, LOTTO_MAX)
-        self.presence_pct = self._presence_pct(self.draw_only, LOTTO_MIN, LOTTO_MAX)
-        self.last_seen = self._last_seen_map(self.draw_only, LOTTO_MIN, LOTTO_MAX)
+        self.freq = self._freq_map(self.history, LOTTO_MIN, LOTTO_MAX)
+        self.presence_pct = self._presence_pct(self.history, LOTTO_MIN, LOTTO_MAX)
+        self.last_seen = self._last_seen_map(self.history, LOTTO_MIN, LOTTO_MAX)
         self.avg_gaps, self.gap_consistency = self._gap_stats(self.draw_only, LOTTO_MIN, LOTTO_MAX)
 
-        self.pair_counter = self._pair_counter(self.draw_only)
-        self.triple_counter = self._triple_counter(self.draw_only)
-        self.quad_counter = self._quad_counter(self.draw_only)
+        self.cooccurrence = CoOccurrence(self.history)
 
         self.target_profile = self._target_profile(self.draw_only, threshold=24)
 
-    def _freq_map(self, draws: List[List[int]], low: int, high: int) -> Dict[int, int]:
-        freq = {n: 0 for n in range(low, high + 1)}
-        for d in draws:
-            for n in d:
-                freq[n] += 1
-        return freq
-
-    def _presence_pct(self, draws: List[List[int]], low: int, high: int) -> Dict[int, float]:
-        total = len(draws)
-        if total == 0:
-            return {n: 0.0 for n in range(low, high + 1)}
+    def _freq_map(self, history: DrawHistory, low: int, high: int) -> Dict[int, int]:
+        freq = history.frequency()
+        return {n: int(freq[n]) for n in range(low, high + 1)}
 
-        pct = {}
-        for n in range(low, high + 1):
-            hits = sum(1 for d in draws if n in d)
-            pct[n] = 100.0 * hits / total
-        return pct
+    def _presence_pct(self, history: DrawHistory, low: int, high: int) -> Dict[int, float]:
+        pct = history.presence_pct()
+        return {n: float(pct[n]) for n in range(low, high + 1)}
 
-    def _last_seen_map(self, draws: List[List[int]], low: int, high: int) -> Dict[int, int]:
-        out = {}
-        for n in range(low, high + 1):
-            idx = next((i for i, d in enumerate(draws) if n in d), None)
-            out[n] = idx if idx is not None else len(draws) + 10
-        return out
+    def _last_seen_map(self, history: DrawHistory, low: int, high: int) -> Dict[int, int]:
+        last_seen = history.last_seen(missing=len(history) + 10)
+        return {n: int(last_seen[n]) for n in range(low, high + 1)}
 
     def _gap_stats(self, draws: List[List[int]], low: int, high: int) -> Tuple[Dict[int, float], Dict[int, float]]:
         positions = {n: [] for n in range(low, high + 1)}
@@ -510,27 +496,6 @@ class LottoAnalyzer:
 
         return avg_gaps, consistency
 
-    def _pair_counter(self, draws: List[List[int]]) -> Dict[Tuple[int, int], int]:
-        counter = {}
-        for d in draws:
-            for pair in combinations(sorted(d), 2):
-                counter[pair] = counter.get(pair, 0) + 1
-        return counter
-
-    def _triple_counter(self, draws: List[List[int]]) -> Dict[Tuple[int, int, int], int]:
-        counter = {}
-        for d in draws:
-            for tri in combinations(sorted(d), 3):
-                counter[tri] = counter.get(tri, 0) + 1
-        return counter
-
-    def _quad_counter(self, draws: List[List[int]]) -> Dict[Tuple[int, int, int, int], int]:
-        counter = {}
-        for d in draws:
-            for quad in combinations(sorted(d), 4):
-                counter[quad] = counter.get(quad, 0) + 1
-        return counter
-
     def _target_profile(self, draws: List[List[int]], threshold: int) -> Dict:
         if not draws:
             return {
@@ -583,6 +548,12 @@ class LottoAnalyzer:
 # =========================================================
 # SCORING
 # =========================================================
+# pozycje w posortowanym kuponie tworzące pary / trójki / czwórki (15 / 20 / 15)
+PAIR_POSITIONS = tuple(combinations(range(LOTTO_PICK), 2))
+TRIPLE_POSITIONS = tuple(combinations(range(LOTTO_PICK), 3))
+QUAD_POSITIONS = tuple(combinations(range(LOTTO_PICK), 4))
+
+
 class LottoScoringEngine:
     def __init__(self, analyzer: LottoAnalyzer):
         self.a = analyzer
@@ -592,6 +563,30 @@ class LottoScoringEngine:
             self.a.avg_gaps,
             self.a.gap_consistency,
         )
+        self.recent_masks = [int(m) for m in self.a.history.masks[:8]]
+        self._build_batch_tables()
+
+    def _build_batch_tables(self) -> None:
+        """
+        Tablice dla score_tickets: wektor number_component (indeks = liczba) i płaskie liczniki
+        par / trójek / czwórek z przesunięciami indeksu per pozycja w krotce — indeks krotki to suma
+        offset[j][liczba], bez sortowania i budowania krotek.
+        """
+        self.component = np.full(LOTTO_MAX + 1, 0.1)
+        for n, v in self.number_component.items():
+            self.component[n] = v
+
+        co = self.a.cooccurrence
+        numbers = np.arange(LOTTO_MAX + 1, dtype=np.int64)
+        size = LOTTO_MAX + 1
+        self._pair_counts = co.pairs.ravel()
+        self._pair_offsets = (numbers * size, numbers)
+        self._triple_counts = co.triples.ravel()
+        self._triple_offsets = (numbers * size * size, numbers * size, numbers)
+        # ranga colex czwórki: C(a-1, 1) + C(b-1, 2) + C(c-1, 3) + C(d-1, 4)
+        self._quad_counts = co.quads
+        shifted = np.maximum(numbers - LOTTO_MIN, 0)
+        self._quad_offsets = tuple(BINOM[shifted, k] for k in range(1, 5))
 
     def _build_number_scores(
         self,
@@ -615,9 +610,10 @@ class LottoScoringEngine:
         nums = sorted(nums)
         base = sum(self.number_component.get(n, 0.1) for n in nums)
 
-        pair_bonus = sum(self.a.pair_counter.get(tuple(sorted(pair)), 0) for pair in combinations(nums, 2)) * 0.02
-        triple_bonus = sum(self.a.triple_counter.get(tuple(sorted(tri)), 0) for tri in combinations(nums, 3)) * 0.03
-        quad_bonus = sum(self.a.quad_counter.get(tuple(sorted(quad)), 0) for quad in combinations(nums, 4)) * 0.04
+        co = self.a.cooccurrence
+        pair_bonus = co.combo_sum(nums, 2) * 0.02
+        triple_bonus = co.combo_sum(nums, 3) * 0.03
+        quad_bonus = co.combo_sum(nums, 4) * 0.04
 
         even_target = self.a.target_profile["target_even"]
         even_penalty = abs(count_even(nums) - even_target) * 0.24
@@ -629,8 +625,9 @@ class LottoScoringEngine:
         seq_penalty = max(0, max_run(nums) - 2) * 0.35
 
         recent_similarity_penalty = 0.0
-        for d in self.a.draw_only[:8]:
-            common = len(set(nums) & set(d))
+        nums_mask = ticket_mask(nums)
+        for recent_mask in self.recent_masks:
+            common = (nums_mask & recent_mask).bit_count()
             if common >= 5:
                 recent_similarity_penalty += 0.7
             elif common == 6:
@@ -651,6 +648,60 @@ class LottoScoringEngine:
             - recent_similarity_penalty
         )
 
+    def score_tickets(self, tickets) -> np.ndarray:
+        """
+        score_ticket dla partii kuponów (M, 6) naraz → (M,) float; te same składniki w tej samej kolejności działań.
+        """
+        t = sorted_tickets(tickets)
+        if not len(t):
+            return np.empty(0, dtype=float)
+
+        weights = self.component[t]
+        base = weights[:, 0]
+        for i in range(1, t.shape[1]):
+            base = base + weights[:, i]
+
+        cols = np.ascontiguousarray(t.T)
+        pair_sum = np.zeros(len(t), dtype=np.int64)
+        off = self._pair_offsets
+        for i, j in PAIR_POSITIONS:
+            pair_sum += self._pair_counts[off[0][cols[i]] + off[1][cols[j]]]
+        triple_sum = np.zeros(len(t), dtype=np.int64)
+        off = self._triple_offsets
+        for i, j, k in TRIPLE_POSITIONS:
+            triple_sum += self._triple_counts[off[0][cols[i]] + off[1][cols[j]] + off[2][cols[k]]]
+        quad_sum = np.zeros(len(t), dtype=np.int64)
+        off = self._quad_offsets
+        for i, j, k, l in QUAD_POSITIONS:
+            quad_sum += self._quad_counts[off[0][cols[i]] + off[1][cols[j]] + off[2][cols[k]] + off[3][cols[l]]]
+        pair_bonus = pair_sum * 0.02
+        triple_bonus = triple_sum * 0.03
+        quad_bonus = quad_sum * 0.04
+
+        profile = self.a.target_profile
+        even_penalty = np.abs(even_counts(t) - profile["target_even"]) * 0.24
+        spread_penalty = np.abs(spans(t) - profile["target_spread"]) / 85.0
+        sum_penalty = np.abs(sums(t) - profile["target_sum"]) / 220.0
+        seq_penalty = np.maximum(0, longest_runs(t) - 2) * 0.35
+
+        recent_similarity_penalty = np.zeros(len(t))
+        masks = numbers_to_masks(t)
+        for recent_mask in self.recent_masks:
+            recent_similarity_penalty += np.where(overlap_with(masks, recent_mask) >= 5, 0.7, 0.0)
+
+        return (
+            base
+            + pair_bonus
+            + triple_bonus
+            + quad_bonus
+            + basic_structure_scores(t)
+            - even_penalty
+            - spread_penalty
+            - sum_penalty
+            - seq_penalty
+            - recent_similarity_penalty
+        )
+
 
 # =========================================================
 # SZLACZEK
@@ -679,6 +730,24 @@ def fix_duplicates(nums: List[int], low: int, high: int) -> List[int]:
     return result
 
 
+def fix_duplicates_batch(tickets: np.ndarray, low: int, high: int) -> np.ndarray:
+    """
+    fix_duplicates dla każdego wiersza (M, L) naraz: kolumny po kolei, powtórka przesuwana o +1 (z zawinięciem).
+    """
+    t = np.array(tickets, dtype=np.int64)
+    rows = np.arange(len(t))
+    seen = np.zeros((len(t), high + 1), dtype=bool)
+    for i in range(t.shape[1]):
+        candidate = t[:, i]
+        clash = seen[rows, candidate]
+        while clash.any():
+            moved = candidate[clash] + 1
+            candidate[clash] = np.where(moved > high, low, moved)
+            clash = seen[rows, candidate]
+        seen[rows, candidate] = True
+    return t
+
+
 def predict_single_path(
     path: List[int],
     low: int,
@@ -810,6 +879,22 @@ def adjust_distribution(nums: List[int]) -> List[int]:
     return nums
 
 
+def adjust_distribution_batch(tickets: np.ndarray) -> np.ndarray:
+    """
+    adjust_distribution dla kuponów (M, 6) naraz; wynik posortowany w wierszach.
+    """
+    t = np.sort(np.asarray(tickets, dtype=np.int64), axis=1)
+    if not t.size:
+        return t
+    evens = even_counts(t)
+    last = t[:, -1]
+    last[:] = np.where(evens == t.shape[1], np.maximum(LOTTO_MIN, last - 1), last)
+    last[:] = np.where(evens == 0, np.minimum(LOTTO_MAX, last + 1), last)
+    long_run = longest_runs(np.sort(t, axis=1)) >= 4
+    last[:] = np.where(long_run, np.minimum(LOTTO_MAX, last + 2), last)
+    return np.sort(fix_duplicates_batch(t, LOTTO_MIN, LOTTO_MAX), axis=1)
+
+
 def predict_from_szlaczek(draws: List[Draw], pro: bool = False) -> Tuple[List[int], List[Dict]]:
     paths = build_position_paths(draws, LOTTO_PICK)
     pred, details = predict_positions(
@@ -860,51 +945,80 @@ def generate_szlaczek_variants(
     for d in details:
         per_position_variants.append(build_position_variants(d, LOTTO_MIN, LOTTO_MAX))
 
-    rng = random.Random()
-    candidates: List[TicketResult] = []
-    seen = set()
-
-    for _ in range(1200):
-        nums = []
-        for variants in per_position_variants:
-            nums.append(rng.choice(variants))
+    # wszystkie kombinacje wariantów, gdy iloczyn mieści się w budżecie; inaczej losowe kombinacje bez powtórzeń
+    sizes = [len(v) for v in per_position_variants]
+    total = math.prod(sizes)
+    if total <= SZLACZEK_VARIANT_BUDGET:
+        combo_ids = np.arange(total, dtype=np.int64)
+    else:
+        np_rng = np.random.default_rng(random.Random().getrandbits(64))
+        combo_ids = np.sort(np_rng.choice(total, SZLACZEK_VARIANT_BUDGET, replace=False))
 
-        nums = sorted(fix_duplicates(nums, LOTTO_MIN, LOTTO_MAX))
-        if pro:
-            nums = adjust_distribution(nums)
+    picks = np.empty((len(combo_ids), len(sizes)), dtype=np.int64)
+    rest = combo_ids
+    for pos in range(len(sizes) - 1, -1, -1):
+        rest, digit = np.divmod(rest, sizes[pos])
+        picks[:, pos] = np.asarray(per_position_variants[pos], dtype=np.int64)[digit]
 
-        key = tuple(nums)
-        if key in seen:
-            continue
-        seen.add(key)
-
-        score = scorer.score_ticket(nums)
-        candidates.append(
-            TicketResult(
-                "Szlaczek wariantowy PRO" if pro else "Szlaczek wariantowy",
-                nums,
-                score,
-                "Wariant wygenerowany z kilku prognoz pozycyjnych dla każdej ścieżki szlaczka.",
-            )
+    tickets = np.sort(fix_duplicates_batch(picks, LOTTO_MIN, LOTTO_MAX), axis=1)
+    if pro:
+        tickets = adjust_distribution_batch(tickets)
+    tickets = unrank_tickets(unique_ranks(rank_tickets(tickets))).astype(np.int64)
+    scores = scorer.score_tickets(tickets)
+
+    chosen = select_diverse(numbers_to_masks(tickets), scores, count, max_common=3)
+    final = [
+        TicketResult(
+            "Szlaczek wariantowy PRO" if pro else "Szlaczek wariantowy",
+            tickets[i].tolist(),
+            float(scores[i]),
+            "Wariant wygenerowany z kilku prognoz pozycyjnych dla każdej ścieżki szlaczka.",
         )
-
-    candidates.sort(key=lambda x: x.score, reverse=True)
-
-    final = []
-    chosen = []
-    for c in candidates:
-        if is_diverse_enough(c.nums, chosen, max_overlap=3):
-            final.append(c)
-            chosen.append(c.nums)
-        if len(final) >= count:
-            break
-
+        for i in chosen
+    ]
     return final, details
 
 
 # =========================================================
 # GENERATOR
 # =========================================================
+def rank_probability_candidates(
+    scorer: LottoScoringEngine, candidates: int, rng: random.Random, keep: int
+) -> List[TicketResult]:
+    """
+    Losuje candidates kuponów ważonych number_component, ocenia unikalne i zwraca keep najlepszych malejąco wg score.
+    """
+    seen = SeenSet()
+    top = TopK(keep)
+    weights = weight_vector(scorer.number_component)
+
+    # kupony partiami (Gumbel-top-k) ze strumienia numpy zaseedowanego z rng — ten sam strumień co jedna duża partia
+    np_rng = np.random.default_rng(rng.getrandbits(64))
+    for start in range(0, candidates, CANDIDATE_CHUNK):
+        tickets = sample_tickets(np_rng, weights, min(CANDIDATE_CHUNK, candidates - start))
+        ranks = rank_tickets(tickets)
+        fresh = seen.add_many(ranks)
+        top.push_many(scorer.score_tickets(tickets[fresh]), ranks[fresh])
+
+    scores, _, _ = top.result()
+    return [
+        TicketResult(
+            "Ranking prawdopodobieństwa",
+            nums,
+            score,
+            "Kupon rankingowy z dużej puli kandydatów ocenionych przez silnik scoringu.",
+        )
+        for nums, score in zip(top.tickets().astype(int).tolist(), scores.tolist())
+    ]
+
+
+def probability_ranking_shard(candidates: int, seed: SeedLike, scorer: LottoScoringEngine, keep: int) -> List[TicketResult]:
+    """
+    Shard rankingu dla map_shards: własny random.Random, zwraca tylko keep najlepszych.
+    """
+    return rank_probability_candidates(scorer, candidates, random.Random(python_seed(seed)), keep)
+
+
 class LottoTicketGenerator:
     def __init__(self, analyzer: LottoAnalyzer, scorer: LottoScoringEngine, seed: Optional[int] = None):
         self.a = analyzer
@@ -912,15 +1026,11 @@ class LottoTicketGenerator:
         self.rng = random.Random(seed) if seed is not None else random.Random()
 
     def generate_random_ticket(self) -> TicketResult:
-        best = None
-        best_score = -999999.0
-
+        candidates = []
         for _ in range(250):
             nums = sorted(self.rng.sample(list(range(LOTTO_MIN, LOTTO_MAX + 1)), LOTTO_PICK))
-            score = self.s.score_ticket(nums)
-            if score > best_score:
-                best_score = score
-                best = nums
+            candidates.append(nums)
+        best, best_score = self._best_of(candidates)
 
         return TicketResult(
             "Losowy",
@@ -932,15 +1042,11 @@ class LottoTicketGenerator:
     def generate_static_random_ticket(self, pool_size: int = 15) -> TicketResult:
         hot_pool = self._top_numbers(self.a.presence_pct, pool_size)
 
-        best = None
-        best_score = -999999.0
-
+        candidates = []
         for _ in range(250):
             nums = sorted(self.rng.sample(hot_pool, LOTTO_PICK))
-            score = self.s.score_ticket(nums)
-            if score > best_score:
-                best_score = score
-                best = nums
+            candidates.append(nums)
+        best, best_score = self._best_of(candidates)
 
         return TicketResult(
             "Losowy statyczny",
@@ -952,28 +1058,22 @@ class LottoTicketGenerator:
     def generate_hot_ticket(self, top_n: int = 18) -> TicketResult:
         pool = self._top_numbers(self.a.presence_pct, top_n)
 
-        best = None
-        best_score = -999999.0
+        candidates = []
         for _ in range(180):
             nums = sorted(self.rng.sample(pool, LOTTO_PICK))
-            score = self.s.score_ticket(nums)
-            if score > best_score:
-                best_score = score
-                best = nums
+            candidates.append(nums)
+        best, best_score = self._best_of(candidates)
 
         return TicketResult("Hot %", best, best_score, "Zestaw z puli liczb najczęściej występujących procentowo.")
 
     def generate_cold_ticket(self, bottom_n: int = 18) -> TicketResult:
         pool = self._bottom_numbers(self.a.presence_pct, bottom_n)
 
-        best = None
-        best_score = -999999.0
+        candidates = []
         for _ in range(180):
             nums = sorted(self.rng.sample(pool, LOTTO_PICK))
-            score = self.s.score_ticket(nums)
-            if score > best_score:
-                best_score = score
-                best = nums
+            candidates.append(nums)
+        best, best_score = self._best_of(candidates)
 
         return TicketResult("Cold %", best, best_score, "Zestaw z puli liczb najrzadziej występujących procentowo.")
 
@@ -982,20 +1082,15 @@ class LottoTicketGenerator:
         cold_pool = self._bottom_numbers(self.a.presence_pct, 18)
         neutral = [n for n in range(LOTTO_MIN, LOTTO_MAX + 1) if n not in hot_pool and n not in cold_pool]
 
-        best = None
-        best_score = -999999.0
-
+        candidates = []
         for _ in range(220):
             nums = []
             nums.extend(self.rng.sample(hot_pool, hot_n))
             nums.extend(self.rng.sample([n for n in cold_pool if n not in nums], cold_n))
             nums.extend(self.rng.sample([n for n in neutral if n not in nums], LOTTO_PICK - len(nums)))
             nums = sorted(nums)
-
-            score = self.s.score_ticket(nums)
-            if score > best_score:
-                best_score = score
-                best = nums
+            candidates.append(nums)
+        best, best_score = self._best_of(candidates)
 
         return TicketResult("50/50", best, best_score, "Mieszanka hot, cold i neutral dla zbalansowanego kuponu.")
 
@@ -1008,14 +1103,11 @@ class LottoTicketGenerator:
         population = list(range(LOTTO_MIN, LOTTO_MAX + 1))
         weights = [self.s.number_component[n] for n in population]
 
-        best_ticket = None
-        best_score = -999999.0
+        candidates = []
         for _ in range(500):
             nums = weighted_sample_without_replacement(population, weights, LOTTO_PICK, self.rng)
-            score = self.s.score_ticket(nums)
-            if score > best_score:
-                best_score = score
-                best_ticket = nums
+            candidates.append(nums)
+        best_ticket, best_score = self._best_of(candidates)
 
         return TicketResult(
             "Złoty Strzał",
@@ -1024,41 +1116,24 @@ class LottoTicketGenerator:
             "Najmocniejszy kupon znaleziony z wykorzystaniem score częstotliwości, rytmu, opóźnienia i zgodności układu.",
         )
 
-    def generate_probability_ranking(self, candidates: int = DEFAULT_CANDIDATES, top_n: int = 10) -> List[TicketResult]:
-        results: List[TicketResult] = []
-        seen = set()
-
-        population = list(range(LOTTO_MIN, LOTTO_MAX + 1))
-        weights = [self.s.number_component[n] for n in population]
-
-        for _ in range(candidates):
-            nums = tuple(weighted_sample_without_replacement(population, weights, LOTTO_PICK, self.rng))
-            if nums in seen:
-                continue
-            seen.add(nums)
-
-            score = self.s.score_ticket(list(nums))
-            results.append(
-                TicketResult(
-                    "Ranking prawdopodobieństwa",
-                    list(nums),
-                    score,
-                    "Kupon rankingowy z dużej puli kandydatów ocenionych przez silnik scoringu.",
-                )
+    def generate_probability_ranking(
+        self, candidates: int = DEFAULT_CANDIDATES, top_n: int = 10, workers: Optional[int] = CANDIDATE_WORKERS
+    ) -> List[TicketResult]:
+        if workers == 1:
+            results = rank_probability_candidates(self.s, candidates, self.rng, top_n * RANKING_SHARD_KEEP)
+        else:
+            # seed shardów z self.rng — ten sam seed generatora daje ten sam ranking przy każdej liczbie procesów
+            parts = map_shards(
+                probability_ranking_shard,
+                candidates,
+                self.rng.getrandbits(63),
+                workers=workers,
+                args=(self.s, top_n * RANKING_SHARD_KEEP),
             )
+            results = merge_ranked(parts, key=lambda x: x.score, unique_key=lambda x: tuple(x.nums))
 
-        results.sort(key=lambda x: x.score, reverse=True)
-
-        final = []
-        chosen = []
-        for r in results:
-            if is_diverse_enough(r.nums, chosen, max_overlap=3):
-                final.append(r)
-                chosen.append(r.nums)
-            if len(final) >= top_n:
-                break
-
-        return final
+        chosen = select_diverse(masks_array([r.nums for r in results]), [r.score for r in results], top_n, max_common=3)
+        return [results[i] for i in chosen]
 
     def generate_szlaczek_ticket(self, pro: bool = False) -> Tuple[TicketResult, List[Dict]]:
         nums, details = predict_from_szlaczek(self.a.draws, pro=pro)
@@ -1074,6 +1149,14 @@ class LottoTicketGenerator:
     def generate_szlaczek_multi(self, count: int = 5, pro: bool = True) -> Tuple[List[TicketResult], List[Dict]]:
         return generate_szlaczek_variants(self.a.draws, self.s, count=count, pro=pro)
 
+    def _best_of(self, candidates: List[List[int]]) -> Tuple[List[int], float]:
+        """
+        Kandydat o najwyższym score (przy remisie pierwszy), ocena całej listy jednym score_tickets.
+        """
+        scores = self.s.score_tickets(candidates)
+        best = int(np.argmax(scores))
+        return candidates[best], float(scores[best])
+
     def _top_numbers(self, pct_map: Dict[int, float], k: int) -> List[int]:
         return [n for n, _ in sorted(pct_map.items(), key=lambda x: (-x[1], x[0]))[:k]]
 
@@ -1236,8 +1319,8 @@ def main():
         ranking_candidates = st.slider(
             "Ile kandydatów dla rankingu i złotego strzału",
             min_value=300,
-            max_value=10000,
-            value=3000,
+            max_value=MAX_RANKING_CANDIDATES,
+            value=DEFAULT_CANDIDATES,
             step=100,
         )
 
@@ -1,11 +1,12 @@
 import io
 import os
 import re
+import heapq
 import math
+import pickle
 import random
-import itertools
 from dataclasses import dataclass
-from collections import Counter, defaultdict
+from collections import Counter
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional, Any
 
@@ -13,6 +14,11 @@ import fitz  # PyMuPDF
 import pandas as pd
 import streamlit as st
 
+from cooccurrence import CoOccurrence
+from draw_store import DrawStore, pdf_sha256
+from pdf_pages import extract_pages
+from ticket_masks import ticket_mask
+
 
 # ============================================================
 # KONFIGURACJA APLIKACJI
@@ -23,6 +29,10 @@ APP_SUBTITLE = "Analiza PDF + rytmika liczb + układy historyczne + gorące/zimn
 
 DEFAULT_PDF = "wyniki.pdf"
 PDF_CANDIDATES = ["wyniki.pdf", "wynik.pdf"]
+ANALYZER_SNAPSHOT_FILE = Path(__file__).resolve().parent / "lotwin_snapshot.pkl"
+ANALYZER_SNAPSHOT_VERSION = 2
+DRAW_STORE_NAMESPACE = "LotWinApp"
+PDF_PAGE_WORKERS = 1  # procesy ekstrakcji stron PDF; 1 = szeregowo, None = liczba CPU (tylko duże archiwa)
 
 LOTTO_MIN = 1
 LOTTO_MAX = 49
@@ -45,6 +55,7 @@ DEFAULT_GENERATION_ATTEMPTS = 7000
 
 DEFAULT_ENABLE_BYSTRZACHA = True
 DEFAULT_BYSTRZACHA_TOP_DELTAS = 10
+BYSTRZACHA_MAX_OPTIONS = 12  # najlepsze opcje na pozycję brane do przeszukiwania ciągów
 
 INT_RE = re.compile(r"\d+")
 
@@ -182,13 +193,11 @@ def read_pdf_bytes(pdf_source) -> bytes:
 # PARSER PDF — ODCZYT JAK W SPRAWDZONYM KODZIE
 # ============================================================
 
-@st.cache_data(show_spinner=False)
-def load_records_cached(pdf_bytes: bytes) -> List[Draw]:
+def parse_records(pdf_bytes: bytes) -> List[Draw]:
     if not pdf_bytes.startswith(b"%PDF"):
         raise ValueError("Brak nagłówka %PDF.")
 
-    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-        pages = [page.get_text("text") or "" for page in doc]
+    pages = extract_pages(pdf_bytes, "text", workers=PDF_PAGE_WORKERS)
 
     all_tokens: List[int] = []
     all_drawnos: List[int] = []
@@ -229,13 +238,25 @@ def load_records_cached(pdf_bytes: bytes) -> List[Draw]:
     return records
 
 
+@st.cache_data(show_spinner=False)
+def load_records_cached(pdf_hash: str, _pdf_bytes: bytes) -> List[Draw]:
+    # klucz cache to hash PDF (bajty z "_" nie są hashowane przez Streamlit);
+    # parser rusza tylko, gdy lokalny magazyn nie zna tego hasha
+    rows = DrawStore(DRAW_STORE_NAMESPACE).load_or_import(
+        _pdf_bytes,
+        lambda pdf_bytes: [{"draw_no": r.draw_id, "nums": r.numbers} for r in parse_records(pdf_bytes)],
+        pdf_hash=pdf_hash,
+    )
+    return [Draw(draw_id=row["draw_no"], numbers=row["nums"]) for row in rows]
+
+
 def parse_lotto_pdf(pdf_source, max_draws: int = 999) -> Tuple[List[Draw], Dict]:
     pdf_bytes = read_pdf_bytes(pdf_source)
 
     with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
         pages_total = len(doc)
 
-    parsed_records = load_records_cached(pdf_bytes)
+    parsed_records = load_records_cached(pdf_sha256(pdf_bytes), pdf_bytes)
 
     if not parsed_records:
         raise ValueError(
@@ -290,10 +311,34 @@ def parse_lotto_pdf(pdf_source, max_draws: int = 999) -> Tuple[List[Draw], Dict]
     return draws, diagnostics
 
 
+def snapshot_draws(path: Path) -> List[Draw]:
+    """
+    Losowania z zapisanego stanu (dowolnej wersji); pusta lista, gdy brak pliku albo nie da się go odczytać.
+    """
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+        return list(payload["state"]["draws"])
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError, TypeError):
+        return []
+
+
 # ============================================================
 # ANALIZATOR LOTTO
 # ============================================================
 
+def _decrement(counter: Counter, key) -> int:
+    """
+    counter[key] -= 1 bez zostawiania zer (jak Counter zbudowany od nowa); zwraca nową wartość.
+    """
+    left = counter[key] - 1
+    if left > 0:
+        counter[key] = left
+    else:
+        del counter[key]
+    return left
+
+
 class LottoAnalyzer:
     def __init__(self, draws: List[Draw], config: AnalyzerConfig):
         self.draws = self._sort_draws(draws)
@@ -302,15 +347,18 @@ class LottoAnalyzer:
         self.random = random.Random(config.seed)
 
         self.number_counter = Counter()
-        self.pair_counter = Counter()
-        self.triple_counter = Counter()
-        self.quad_counter = Counter()
+        self.cooccurrence: Optional[CoOccurrence] = None
         self.position_counter = [Counter() for _ in range(NUMBERS_IN_DRAW)]
 
         self.intervals = {}
         self.positional_delta_counters: List[Counter] = [Counter() for _ in range(NUMBERS_IN_DRAW)]
         self.positional_direction_counters: List[Counter] = [Counter() for _ in range(NUMBERS_IN_DRAW)]
 
+        # stan pomocniczy dla append_draw: ostatni indeks chronologiczny, liczniki i sumy odstępów
+        self._interval_last_seen: Dict[int, int] = {}
+        self._gap_counters: Dict[int, Counter] = {}
+        self._gap_sums: Dict[int, int] = {}
+
         self._analyze()
         self.intervals = self._analyze_intervals()
         self._analyze_positional_deltas()
@@ -331,14 +379,8 @@ class LottoAnalyzer:
             for i, n in enumerate(nums):
                 self.position_counter[i][n] += 1
 
-            for pair in itertools.combinations(nums, 2):
-                self.pair_counter[pair] += 1
-
-            for triple in itertools.combinations(nums, 3):
-                self.triple_counter[triple] += 1
-
-            for quad in itertools.combinations(nums, 4):
-                self.quad_counter[quad] += 1
+        # pary / trójki / czwórki jako gęste tablice zamiast Counterów z krotkami
+        self.cooccurrence = CoOccurrence([d.numbers for d in self.draws])
 
     def _analyze_intervals(self) -> Dict[int, Dict]:
         chronological = list(reversed(self.draws))
@@ -362,29 +404,40 @@ class LottoAnalyzer:
                     intervals_data[n]["gaps"].append(gap)
                 last_seen[n] = idx
 
-        total_draws = len(chronological)
+        self._interval_last_seen = last_seen
+        self._gap_counters = {n: Counter(intervals_data[n]["gaps"]) for n in intervals_data}
+        self._gap_sums = {n: sum(intervals_data[n]["gaps"]) for n in intervals_data}
 
         for n in range(LOTTO_MIN, LOTTO_MAX + 1):
-            if last_seen[n] != -1:
-                intervals_data[n]["current_gap"] = total_draws - 1 - last_seen[n]
-            else:
-                intervals_data[n]["current_gap"] = total_draws
+            self._refresh_interval(intervals_data[n], n, len(chronological))
 
-            gaps = intervals_data[n]["gaps"]
+        return intervals_data
 
-            if gaps:
-                intervals_data[n]["avg_gap"] = sum(gaps) / len(gaps)
-                intervals_data[n]["most_common_gap"] = Counter(gaps).most_common(1)[0][0]
+    def _refresh_interval(self, info: Dict, n: int, total_draws: int) -> None:
+        last_seen = self._interval_last_seen[n]
+        if last_seen != -1:
+            info["current_gap"] = total_draws - 1 - last_seen
+        else:
+            info["current_gap"] = total_draws
 
-                avg_gap = intervals_data[n]["avg_gap"]
-                current_gap = intervals_data[n]["current_gap"]
+        gaps = info["gaps"]
 
-                if avg_gap > 0:
-                    intervals_data[n]["overdue_factor"] = current_gap / avg_gap
-                else:
-                    intervals_data[n]["overdue_factor"] = 0.0
+        if gaps:
+            info["avg_gap"] = self._gap_sums[n] / len(gaps)
+            info["most_common_gap"] = self._gap_counters[n].most_common(1)[0][0]
 
-        return intervals_data
+            avg_gap = info["avg_gap"]
+            current_gap = info["current_gap"]
+
+            if avg_gap > 0:
+                info["overdue_factor"] = current_gap / avg_gap
+            else:
+                info["overdue_factor"] = 0.0
+        else:
+            # po wycofaniu najstarszego losowania liczba może stracić ostatni odstęp
+            info["avg_gap"] = 0.0
+            info["most_common_gap"] = 0
+            info["overdue_factor"] = 0.0
 
     def _analyze_positional_deltas(self):
         chronological = list(reversed(self.draws))
@@ -392,19 +445,170 @@ class LottoAnalyzer:
             return
 
         for i in range(len(chronological) - 1):
-            current_draw = sorted(chronological[i].numbers)
-            next_draw = sorted(chronological[i + 1].numbers)
+            self._count_positional_delta(chronological[i].numbers, chronological[i + 1].numbers)
+
+    def _count_positional_delta(self, previous: List[int], current: List[int]):
+        current_draw = sorted(previous)
+        next_draw = sorted(current)
+
+        for pos in range(NUMBERS_IN_DRAW):
+            delta = next_draw[pos] - current_draw[pos]
+            self.positional_delta_counters[pos][delta] += 1
+
+            if delta > 0:
+                self.positional_direction_counters[pos]["góra"] += 1
+            elif delta < 0:
+                self.positional_direction_counters[pos]["dół"] += 1
+            else:
+                self.positional_direction_counters[pos]["bez zmiany"] += 1
+
+    # ========================================================
+    # PRZYROSTOWA AKTUALIZACJA + ZAPIS STANU
+    # ========================================================
+
+    def append_draw(self, draw_id: int, numbers: List[int]):
+        """
+        Dopisuje nowe (najnowsze) losowanie i aktualizuje statystyki przyrostowo:
+        liczniki liczb i pozycji, pary/trójki/czwórki, odstępy oraz delty pozycyjne.
+        """
+        nums = sorted(numbers)
+        if len(set(nums)) != NUMBERS_IN_DRAW or not all(LOTTO_MIN <= n <= LOTTO_MAX for n in nums):
+            raise ValueError(f"Losowanie musi mieć {NUMBERS_IN_DRAW} różnych liczb z zakresu {LOTTO_MIN}–{LOTTO_MAX}.")
+
+        newest_id = next((d.draw_id for d in self.draws if d.draw_id is not None), None)
+        if newest_id is not None and draw_id <= newest_id:
+            raise ValueError(f"Losowanie {draw_id} nie jest nowsze niż ostatnie zapisane ({newest_id}).")
+
+        previous = self.get_last_draw()
+        self.draws.insert(0, Draw(draw_id=draw_id, numbers=nums))
+        self.total_draws += 1
+
+        self.number_counter.update(nums)
+        for i, n in enumerate(nums):
+            self.position_counter[i][n] += 1
+        self.cooccurrence.add_draw(nums)
+
+        idx = self.total_draws - 1
+        for n in nums:
+            last_seen = self._interval_last_seen[n]
+            if last_seen != -1:
+                gap = idx - last_seen
+                self.intervals[n]["gaps"].append(gap)
+                self._gap_counters[n][gap] += 1
+                self._gap_sums[n] += gap
+            self._interval_last_seen[n] = idx
+
+        for n in range(LOTTO_MIN, LOTTO_MAX + 1):
+            self._refresh_interval(self.intervals[n], n, self.total_draws)
+
+        if previous is not None:
+            self._count_positional_delta(previous.numbers, nums)
+
+    def retire_oldest_draw(self) -> Draw:
+        """
+        Odwrotność append_draw: usuwa najstarsze losowanie i cofa jego wkład w liczniki liczb i pozycji,
+        pary/trójki/czwórki, odstępy oraz deltę pozycyjną do następnego losowania — wynik jak po przebudowie
+        analizatora bez tego losowania (łącznie z kolejnością remisów w most_common).
+        """
+        if not self.draws:
+            raise ValueError("Brak losowań do usunięcia.")
 
+        oldest = self.draws.pop()
+        self.total_draws -= 1
+        nums = sorted(oldest.numbers)
+
+        for n in nums:
+            _decrement(self.number_counter, n)
+        for i, n in enumerate(nums):
+            _decrement(self.position_counter[i], n)
+        self.cooccurrence.remove_draw(nums)
+
+        # indeksy chronologiczne przesuwają się o 1; liczby z losowania tracą pierwszy odstęp
+        for n in oldest.numbers:
+            gaps = self.intervals[n]["gaps"]
+            if gaps:
+                gap = gaps.pop(0)
+                self._gap_sums[n] -= gap
+                if _decrement(self._gap_counters[n], gap) > 0:
+                    # klucz zostaje, ale jego pierwsze wystąpienie się przesunęło — most_common rozstrzyga remisy
+                    # kolejnością wstawienia, więc odtwarzamy ją jak w _analyze_intervals
+                    self._gap_counters[n] = Counter(gaps)
+        self._interval_last_seen = {n: i - 1 if i > 0 else -1 for n, i in self._interval_last_seen.items()}
+
+        for n in range(LOTTO_MIN, LOTTO_MAX + 1):
+            self._refresh_interval(self.intervals[n], n, self.total_draws)
+
+        if self.draws:
+            following = sorted(self.draws[-1].numbers)
+            stale = []
             for pos in range(NUMBERS_IN_DRAW):
-                delta = next_draw[pos] - current_draw[pos]
-                self.positional_delta_counters[pos][delta] += 1
+                delta = following[pos] - nums[pos]
+                if _decrement(self.positional_delta_counters[pos], delta) > 0:
+                    stale.append(pos)
+                direction = "góra" if delta > 0 else "dół" if delta < 0 else "bez zmiany"
+                _decrement(self.positional_direction_counters[pos], direction)
+            if stale:
+                # jak przy odstępach: kolejność wstawienia kluczy jak po przebudowie
+                self._recount_positional_deltas(stale)
+
+        return oldest
+
+    def _recount_positional_deltas(self, positions: List[int]):
+        chronological = [sorted(d.numbers) for d in reversed(self.draws)]
+        for pos in positions:
+            self.positional_delta_counters[pos] = Counter(
+                current[pos] - previous[pos] for previous, current in zip(chronological, chronological[1:])
+            )
 
-                if delta > 0:
-                    self.positional_direction_counters[pos]["góra"] += 1
-                elif delta < 0:
-                    self.positional_direction_counters[pos]["dół"] += 1
-                else:
-                    self.positional_direction_counters[pos]["bez zmiany"] += 1
+    def save_snapshot(self, path: Path, max_draws: int):
+        state = {k: v for k, v in self.__dict__.items() if k not in ("config", "random")}
+        with open(path, "wb") as f:
+            pickle.dump({"version": ANALYZER_SNAPSHOT_VERSION, "max_draws": max_draws, "state": state}, f)
+
+    @classmethod
+    def load_snapshot(cls, path: Path, config: AnalyzerConfig) -> Tuple["LottoAnalyzer", Optional[int]]:
+        """
+        Zwraca analizator i okno (max_draws), z którym zapisano stan.
+        """
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+
+        if payload.get("version") != ANALYZER_SNAPSHOT_VERSION:
+            raise ValueError("Zapisany stan analizatora pochodzi z innej wersji aplikacji — przeanalizuj PDF ponownie.")
+
+        analyzer = cls.__new__(cls)
+        analyzer.__dict__.update(payload["state"])
+        analyzer.config = config
+        analyzer.random = random.Random(config.seed)
+        return analyzer, payload.get("max_draws")
+
+    def merge_newer_draws(self, draws: List[Draw]) -> int:
+        """
+        Dopisuje (przyrostowo) losowania z numerem nowszym niż najnowsze w analizatorze, od najstarszego.
+        Zwraca liczbę dopisanych.
+        """
+        newest_id = next((d.draw_id for d in self.draws if d.draw_id is not None), None)
+        newer = sorted(
+            (d for d in draws if d.draw_id is not None and (newest_id is None or d.draw_id > newest_id)),
+            key=lambda d: d.draw_id
+        )
+        for d in newer:
+            self.append_draw(d.draw_id, d.numbers)
+        return len(newer)
+
+    def fit_window(self, max_draws: int) -> "LottoAnalyzer":
+        """
+        Analizator z najwyżej max_draws najnowszymi losowaniami: nadmiar wycofywany przyrostowo
+        (retire_oldest_draw), a przebudowa tylko, gdy usunąć trzeba więcej, niż zostaje.
+        """
+        excess = self.total_draws - max_draws
+        if excess <= 0:
+            return self
+        if excess > max_draws:
+            return LottoAnalyzer(self.draws[:max_draws], self.config)
+        for _ in range(excess):
+            self.retire_oldest_draw()
+        return self
 
     def get_last_draw(self) -> Optional[Draw]:
         return self.draws[0] if self.draws else None
@@ -429,16 +633,11 @@ class LottoAnalyzer:
             for n in draw.numbers:
                 recency_points[n] += weight
 
-        pair_by_number = defaultdict(int)
-        for pair, cnt in self.pair_counter.items():
-            a, b = pair
-            pair_by_number[a] += cnt
-            pair_by_number[b] += cnt
+        pair_totals = self.cooccurrence.number_totals(2)
+        pair_by_number = {n: int(pair_totals[n]) for n in range(LOTTO_MIN, LOTTO_MAX + 1) if pair_totals[n] > 0}
 
-        triple_by_number = defaultdict(int)
-        for triple, cnt in self.triple_counter.items():
-            for n in triple:
-                triple_by_number[n] += cnt
+        triple_totals = self.cooccurrence.number_totals(3)
+        triple_by_number = {n: int(triple_totals[n]) for n in range(LOTTO_MIN, LOTTO_MAX + 1) if triple_totals[n] > 0}
 
         overdue_raw = {
             n: self.intervals[n]["overdue_factor"]
@@ -522,13 +721,8 @@ class LottoAnalyzer:
         nums = sorted(nums)
         score = sum(ranked_scores.get(n, 0.0) for n in nums)
 
-        pair_bonus = 0.0
-        for pair in itertools.combinations(nums, 2):
-            pair_bonus += self.pair_counter.get(pair, 0) * 0.08
-
-        triple_bonus = 0.0
-        for triple in itertools.combinations(nums, 3):
-            triple_bonus += self.triple_counter.get(triple, 0) * 0.12
+        pair_bonus = self.cooccurrence.combo_sum(nums, 2) * 0.08
+        triple_bonus = self.cooccurrence.combo_sum(nums, 3) * 0.12
 
         rhythm_bonus = 0.0
         for n in nums:
@@ -605,47 +799,95 @@ class LottoAnalyzer:
 
         return options_per_position
 
-    def _search_best_bystrzacha_sequence(
+    def _search_bystrzacha_sequences(
         self,
-        options_per_position: List[List[Tuple[int, float, int]]]
-    ) -> Tuple[List[int], List[int], float]:
-        best_numbers: Optional[List[int]] = None
-        best_deltas: Optional[List[int]] = None
-        best_score = float("-inf")
+        options_per_position: List[List[Tuple[int, float, int]]],
+        top_n: int = 1
+    ) -> List[Tuple[List[int], List[int], float]]:
+        """
+        Dokładne top_n ciągów (liczby rosnąco po pozycjach) wg sumy score opcji, tylko kupony z validate_ticket.
+        Branch-and-bound: górna granica = bieżąca suma + najlepsze score pozostałych pozycji,
+        reguły (ciąg, parzyste, suma, rozpiętość) sprawdzane już na częściowym kuponie.
+        Kolejność i remisy jak w pełnym przeszukiwaniu: przy równym score wygrywa ciąg znaleziony wcześniej.
+        """
+        options = [opts[:BYSTRZACHA_MAX_OPTIONS] for opts in options_per_position[:NUMBERS_IN_DRAW]]
+        if len(options) < NUMBERS_IN_DRAW or top_n <= 0 or any(not opts for opts in options):
+            return []
 
-        def backtrack(pos: int, chosen_nums: List[int], chosen_deltas: List[int], total_score: float):
-            nonlocal best_numbers, best_deltas, best_score
+        # najlepsze score / najmniejsza i największa liczba od pozycji pos do końca
+        best_rest = [0.0] * (NUMBERS_IN_DRAW + 1)
+        min_rest = [0] * (NUMBERS_IN_DRAW + 1)
+        max_rest = [0] * (NUMBERS_IN_DRAW + 1)
+        for pos in range(NUMBERS_IN_DRAW - 1, -1, -1):
+            best_rest[pos] = best_rest[pos + 1] + max(score for _, score, _ in options[pos])
+            min_rest[pos] = min_rest[pos + 1] + min(n for n, _, _ in options[pos])
+            max_rest[pos] = max_rest[pos + 1] + max(n for n, _, _ in options[pos])
+        max_value = [max(n for n, _, _ in opts) for opts in options]
+
+        cfg = self.config
+        half = NUMBERS_IN_DRAW - 2  # najwięcej parzystych / nieparzystych przy regule 2-4
+        # kopiec (score, -kolejność znalezienia) — na szczycie najsłabszy z zachowanych
+        kept: List[Tuple[float, int, List[int], List[int]]] = []
+        found = 0
+        chosen_nums: List[int] = []
+        chosen_deltas: List[int] = []
+
+        def backtrack(pos: int, total_score: float, total: int, evens: int, run: int) -> None:
+            nonlocal found
 
             if pos == NUMBERS_IN_DRAW:
-                candidate = sorted(chosen_nums)
-                if len(set(candidate)) != NUMBERS_IN_DRAW:
-                    return
-                if not self.validate_ticket(candidate):
+                if not self.validate_ticket(chosen_nums):
                     return
-                if total_score > best_score:
-                    best_score = total_score
-                    best_numbers = candidate[:]
-                    best_deltas = chosen_deltas[:]
+                found += 1
+                item = (total_score, -found, chosen_nums[:], chosen_deltas[:])
+                if len(kept) < top_n:
+                    heapq.heappush(kept, item)
+                elif total_score > kept[0][0]:
+                    heapq.heapreplace(kept, item)
                 return
 
-            current_options = options_per_position[pos][:12]
+            # tolerancja na różną kolejność dodawania floatów w granicy i w sumie
+            if len(kept) == top_n and total_score + best_rest[pos] + 1e-9 <= kept[0][0]:
+                return
 
-            for predicted, score, delta in current_options:
-                if predicted in chosen_nums:
+            last = chosen_nums[-1] if chosen_nums else LOTTO_MIN - 1
+            for predicted, score, delta in options[pos]:
+                if predicted <= last:
                     continue
-                if chosen_nums and predicted <= chosen_nums[-1]:
+                if pos + 1 < NUMBERS_IN_DRAW and predicted >= max_value[pos + 1]:
+                    continue
+                next_run = run + 1 if predicted == last + 1 else 1
+                if next_run > 2:
+                    continue
+                next_evens = evens + (predicted % 2 == 0)
+                if cfg.rule_force_even_odd and (next_evens > half or pos + 1 - next_evens > half):
+                    continue
+                next_total = total + predicted
+                if cfg.rule_force_sum_range and (
+                    next_total + min_rest[pos + 1] > 210 or next_total + max_rest[pos + 1] < 90
+                ):
+                    continue
+                if cfg.rule_force_spread and pos == 0 and max_value[-1] - predicted < 20:
                     continue
 
                 chosen_nums.append(predicted)
                 chosen_deltas.append(delta)
-                backtrack(pos + 1, chosen_nums, chosen_deltas, total_score + score)
+                backtrack(pos + 1, total_score + score, next_total, next_evens, next_run)
                 chosen_nums.pop()
                 chosen_deltas.pop()
 
-        backtrack(0, [], [], 0.0)
+        backtrack(0, 0.0, 0, 0, 0)
 
-        if best_numbers is not None and best_deltas is not None:
-            return best_numbers, best_deltas, best_score
+        kept.sort(reverse=True)
+        return [(nums, deltas, score) for score, _, nums, deltas in kept]
+
+    def _search_best_bystrzacha_sequence(
+        self,
+        options_per_position: List[List[Tuple[int, float, int]]]
+    ) -> Tuple[List[int], List[int], float]:
+        best = self._search_bystrzacha_sequences(options_per_position, top_n=1)
+        if best:
+            return best[0]
 
         greedy_nums = []
         greedy_deltas = []
@@ -756,20 +998,22 @@ class LottoAnalyzer:
         hot_numbers, cold_numbers = self._split_hot_cold_numbers(ranked_numbers)
         candidate_pool = self._build_candidate_pool(ranked_numbers)
 
-        top_quads = [q for q, c in self.quad_counter.most_common(12) if c > 1]
-        top_triples = [t for t, c in self.triple_counter.most_common(30) if c > 1]
-        top_pairs = [p for p, c in self.pair_counter.most_common(40) if c > 1]
+        co = self.cooccurrence
+        top_quads = [q for q, c in co.most_common(4, 12) if c > 1]
+        top_triples = [t for t, c in co.most_common(3, 30) if c > 1]
+        top_pairs = [p for p, c in co.most_common(2, 40) if c > 1]
 
         historical_bases: List[Tuple[List[int], str]] = []
         for quad in top_quads:
-            historical_bases.append((list(quad), f"Rdzeń historyczny: częsta czwórka (padła {self.quad_counter[quad]}x)"))
+            historical_bases.append((list(quad), f"Rdzeń historyczny: częsta czwórka (padła {co.count(quad)}x)"))
         for triple in top_triples:
-            historical_bases.append((list(triple), f"Rdzeń historyczny: częsta trójka (padła {self.triple_counter[triple]}x)"))
+            historical_bases.append((list(triple), f"Rdzeń historyczny: częsta trójka (padła {co.count(triple)}x)"))
         for pair in top_pairs:
-            historical_bases.append((list(pair), f"Rdzeń historyczny: częsta para (padła {self.pair_counter[pair]}x)"))
+            historical_bases.append((list(pair), f"Rdzeń historyczny: częsta para (padła {co.count(pair)}x)"))
 
         results = []
         seen_tickets = set()
+        seen_masks: List[int] = []
 
         if self.config.enable_bystrzacha:
             bystrzacha_ticket = self.generate_bystrzacha_ticket()
@@ -777,6 +1021,7 @@ class LottoAnalyzer:
                 bt_numbers = [int(x) for x in bystrzacha_ticket["Liczby Lotto 6/49"].split()]
                 if len(bt_numbers) == NUMBERS_IN_DRAW:
                     seen_tickets.add(tuple(bt_numbers))
+                    seen_masks.append(ticket_mask(bt_numbers))
                     results.append({
                         "Kupon": "B",
                         "Liczby Lotto 6/49": bystrzacha_ticket["Liczby Lotto 6/49"],
@@ -804,15 +1049,15 @@ class LottoAnalyzer:
                     if base_choice == 4 and top_quads:
                         quad = self.random.choice(top_quads[:min(8, len(top_quads))])
                         base_nums = list(quad)
-                        reason = f"Mocny rdzeń: częsta czwórka (padła {self.quad_counter[quad]}x)"
+                        reason = f"Mocny rdzeń: częsta czwórka (padła {co.count(quad)}x)"
                     elif base_choice == 3 and top_triples:
                         triple = self.random.choice(top_triples[:min(15, len(top_triples))])
                         base_nums = list(triple)
-                        reason = f"Mocny rdzeń: częsta trójka (padła {self.triple_counter[triple]}x)"
+                        reason = f"Mocny rdzeń: częsta trójka (padła {co.count(triple)}x)"
                     elif base_choice == 2 and top_pairs:
                         pair = self.random.choice(top_pairs[:min(20, len(top_pairs))])
                         base_nums = list(pair)
-                        reason = f"Mocny rdzeń: częsta para (padła {self.pair_counter[pair]}x)"
+                        reason = f"Mocny rdzeń: częsta para (padła {co.count(pair)}x)"
                     else:
                         base_nums = []
                         reason = "Ranking częstotliwość + rytm + układy"
@@ -901,8 +1146,9 @@ class LottoAnalyzer:
 
                 quality = self.ticket_quality_score(nums, number_scores)
 
-                for existing in seen_tickets:
-                    overlap = len(set(existing) & set(nums))
+                nums_mask = ticket_mask(nums)
+                for existing_mask in seen_masks:
+                    overlap = (existing_mask & nums_mask).bit_count()
                     if overlap >= 5:
                         quality -= 1.2
                     elif overlap == 4:
@@ -935,6 +1181,8 @@ class LottoAnalyzer:
                 else:
                     best_reason = "Awaryjny kupon z najwyżej punktowanych liczb"
 
+            if tuple(best_ticket) not in seen_tickets:
+                seen_masks.append(ticket_mask(best_ticket))
             seen_tickets.add(tuple(best_ticket))
 
             if self.config.hot_pool >= 49:
@@ -1001,21 +1249,21 @@ class LottoAnalyzer:
 
     def get_top_patterns_table(self) -> Dict[str, List[Dict]]:
         pairs = []
-        for pair, cnt in self.pair_counter.most_common(20):
+        for pair, cnt in self.cooccurrence.most_common(2, 20):
             pairs.append({
                 "Para": format_number_list(list(pair)),
                 "Wystąpienia": cnt
             })
 
         triples = []
-        for triple, cnt in self.triple_counter.most_common(20):
+        for triple, cnt in self.cooccurrence.most_common(3, 20):
             triples.append({
                 "Trójka": format_number_list(list(triple)),
                 "Wystąpienia": cnt
             })
 
         quads = []
-        for quad, cnt in self.quad_counter.most_common(15):
+        for quad, cnt in self.cooccurrence.most_common(4, 15):
             quads.append({
                 "Czwórka": format_number_list(list(quad)),
                 "Wystąpienia": cnt
@@ -1238,6 +1486,30 @@ def render_sidebar() -> Tuple[int, int, AnalyzerConfig]:
     return int(max_draws), int(tickets_count), config
 
 
+def render_history_panel(snapshot_exists: bool) -> Tuple[bool, Optional[Tuple[int, List[int]]]]:
+    st.sidebar.subheader("💾 Zapisana historia")
+
+    use_snapshot = False
+    if snapshot_exists:
+        use_snapshot = st.sidebar.checkbox(
+            "Użyj zapisanej historii (bez czytania PDF)",
+            value=True,
+            help="Stan analizatora zapisany po ostatniej analizie wraz z dopisanymi losowaniami. "
+                 "Nowo wgrany PDF ma pierwszeństwo — dopisane losowania nowsze niż PDF są wtedy zachowane."
+        )
+    else:
+        st.sidebar.caption("Brak zapisanego stanu — zostanie utworzony po pierwszej analizie PDF.")
+
+    new_draw = None
+    with st.sidebar.expander("➕ Dopisz nowe losowanie"):
+        draw_id = st.number_input("Numer losowania", min_value=DRAWNO_MIN, max_value=99999, value=DRAWNO_MIN, step=1)
+        numbers_text = st.text_input("Wylosowane liczby", placeholder="np. 3 11 19 27 38 45")
+        if st.button("Dopisz i zapisz"):
+            new_draw = (int(draw_id), [int(x) for x in INT_RE.findall(numbers_text)])
+
+    return use_snapshot, new_draw
+
+
 def render_file_input():
     st.subheader("📄 Plik wejściowy PDF")
 
@@ -1421,21 +1693,53 @@ def main():
     render_header()
 
     max_draws, tickets_count, analyzer_config = render_sidebar()
+    snapshot_path = ANALYZER_SNAPSHOT_FILE
+    use_snapshot, new_draw = render_history_panel(snapshot_path.exists())
     uploaded_file, use_local_file = render_file_input()
 
     pdf_source = resolve_pdf_source(uploaded_file, DEFAULT_PDF) if (uploaded_file is not None or use_local_file) else None
 
-    if pdf_source is None:
+    if use_snapshot and uploaded_file is not None:
+        use_snapshot = False
+        st.info("Wgrano nowy PDF — historia zostanie odczytana z pliku, a losowania dopisane do zapisanego stanu (nowsze niż PDF) zostaną zachowane.")
+
+    if pdf_source is None and not use_snapshot:
         st.warning("Wgraj plik PDF albo umieść lokalnie plik 'wyniki.pdf' obok aplikacji.")
         st.stop()
 
-    if not st.button("🚀 Analizuj plik i wygeneruj kupony", type="primary"):
+    if not st.button("🚀 Analizuj plik i wygeneruj kupony", type="primary") and new_draw is None:
         st.stop()
 
     try:
         with st.spinner("Trwa analiza historii Lotto i budowa modeli statystycznych..."):
-            draws, diagnostics = parse_lotto_pdf(pdf_source, max_draws=max_draws)
-            analyzer = LottoAnalyzer(draws, analyzer_config)
+            analyzer = None
+            if use_snapshot:
+                analyzer, snapshot_window = LottoAnalyzer.load_snapshot(snapshot_path, analyzer_config)
+                diagnostics = {
+                    "draws_total_before_dedup": analyzer.total_draws,
+                    "draws_total_after_dedup": analyzer.total_draws,
+                    "pages_total": "-",
+                }
+                if snapshot_window != max_draws:
+                    if pdf_source is not None:
+                        # inne okno historii — odczyt PDF od nowa, dopisane losowania dołączane niżej
+                        analyzer = None
+                    elif analyzer.total_draws < max_draws:
+                        st.info(f"Zapisany stan ma tylko {analyzer.total_draws} losowań — wgraj PDF, aby poszerzyć okno do {max_draws}.")
+
+            if analyzer is None:
+                draws, diagnostics = parse_lotto_pdf(pdf_source, max_draws=max_draws)
+                analyzer = LottoAnalyzer(draws, analyzer_config)
+                kept = analyzer.merge_newer_draws(snapshot_draws(snapshot_path))
+                if kept:
+                    st.info(f"Zachowano {kept} losowań z zapisanego stanu, nowszych niż ostatnie w PDF.")
+
+            if new_draw is not None:
+                analyzer.append_draw(*new_draw)
+                st.success(f"✅ Dopisano losowanie {new_draw[0]}: {format_number_list(new_draw[1])}")
+
+            analyzer = analyzer.fit_window(max_draws)
+            analyzer.save_snapshot(snapshot_path, max_draws)
 
         tabs = st.tabs([
             "📊 Podsumowanie",
@@ -4,17 +4,35 @@ import math
 import json
 import random
 import logging
+import threading
 from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional, Iterable
-from collections import Counter, defaultdict
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
+from collections import Counter, defaultdict, deque
 from itertools import combinations
 
-import fitz  # PyMuPDF
 import numpy as np
 import pandas as pd
 import streamlit as st
 
+from draw_history import DrawHistory, FrequencyIndex
+from draw_store import DrawStore, file_stamp, pdf_sha256
+from pdf_pages import extract_pages, iter_pages
+from shard_pool import SeedLike, map_shards, merge_ranked
+from tempering import parallel_tempering
+from ticket_codec import SeenSet, ticket_rank, unrank_tickets
+from ticket_masks import max_overlap, ticket_mask
+from ticket_topk import TopK
+from weighted_sampler import pool_mask, sample_tickets, sample_two_stage, weight_vector, weighted_sample
+from lotus_scoring import (
+    TOTAL_TICKETS,
+    ScoreTables,
+    SwapScorer,
+    build_score_tables,
+    exhaustive_top_k,
+    score_tickets_batch,
+)
+
 
 # =========================================================
 # LOGGING
@@ -36,6 +54,11 @@ NUM_MIN = 1
 NUM_MAX = 49
 PICK_COUNT = 6
 DRAWNO_MIN = 1000
+DRAW_STORE_NAMESPACE = "LotusWygranus"
+PDF_PAGE_WORKERS = 1  # procesy ekstrakcji stron PDF; 1 = szeregowo, None = liczba CPU (tylko duże archiwa)
+CANDIDATE_WORKERS = None  # procesy generatora kandydatów; None = liczba CPU (wynik ten sam), 1 = szeregowo
+CANDIDATE_BATCH = 4096  # kupony bazowe losowane jednym wywołaniem samplera; tyle samo kandydatów oceniane naraz
+CANDIDATE_SOURCES = ("weighted", "diverse", "mutated")  # tryby generatora; indeks = znacznik w TopK
 
 DEFAULT_SEED = 123456
 
@@ -45,11 +68,15 @@ WINDOWS_SHORT = 20
 WINDOWS_MEDIUM = 50
 WINDOWS_LONG = 100
 WINDOWS_ULTRA = 250
+# okna częstości liczone z jednego indeksu sum prefiksowych — dodanie okna nie kosztuje skanu
+FREQUENCY_WINDOWS = (WINDOWS_SHORT, WINDOWS_MEDIUM, WINDOWS_LONG, WINDOWS_ULTRA)
 
 MAX_RECENT_OVERLAP = 3
 
 DEFAULT_CANDIDATES = 6000
 DEFAULT_TICKETS = 30
+TEMPERING_MAX_STEPS = 40000  # ruchy silnika parallel tempering — ten sam seed daje te same kupony
+TEMPERING_TIME_BUDGET_S = 15.0  # awaryjny limit czasu tempering (ucina przebieg tylko na bardzo wolnej maszynie)
 
 INT_RE = re.compile(r"\d+")
 
@@ -301,15 +328,7 @@ def weighted_unique_sample(
     weights: List[float],
     k: int
 ) -> List[int]:
-    arr_pop = np.array(population, dtype=int)
-    arr_w = np.array(weights, dtype=float)
-    if len(arr_pop) < k:
-        raise ValueError("Population smaller than k.")
-    if arr_w.sum() <= 0:
-        arr_w = np.ones_like(arr_w, dtype=float)
-    probs = arr_w / arr_w.sum()
-    chosen = rng.choice(arr_pop, size=k, replace=False, p=probs)
-    return sorted(chosen.tolist())
+    return weighted_sample(rng, population, weights, k)
 
 
 # =========================================================
@@ -325,12 +344,7 @@ def _validate_pdf_bytes(pdf_bytes: bytes) -> None:
 
 
 def _read_pdf_pages_text(pdf_bytes: bytes) -> List[str]:
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    pages = []
-    for page in doc:
-        pages.append(page.get_text("text") or "")
-    doc.close()
-    return pages
+    return extract_pages(pdf_bytes, "text", workers=PDF_PAGE_WORKERS)
 
 
 def _clean_line(line: str) -> str:
@@ -387,27 +401,25 @@ def _split_numbers_from_lines(page_text: str) -> Tuple[List[int], List[int]]:
     return result_tokens, draw_numbers
 
 
-def _chunk_tokens_to_draws(tokens: List[int]) -> List[List[int]]:
+def _is_valid_draw(draw: List[int]) -> bool:
+    return len(draw) == PICK_COUNT and len(set(draw)) == PICK_COUNT and all(NUM_MIN <= x <= NUM_MAX for x in draw)
+
+
+def _split_into_draws(tokens: List[int]) -> List[List[int]]:
+    usable = (len(tokens) // PICK_COUNT) * PICK_COUNT
+    return [sorted(tokens[i:i + PICK_COUNT]) for i in range(0, usable, PICK_COUNT)]
+
+
+def _best_token_offset(tokens: List[int]) -> int:
     """
-    Szuka najlepszego przesunięcia i buduje losowania po 6 liczb.
+    Przesunięcie 0..5, przy którym podział tokenów na szóstki daje najwięcej sensownych losowań.
     """
-    if len(tokens) < PICK_COUNT:
-        return []
-
-    best_draws: List[List[int]] = []
+    best_offset = 0
     best_score = -1
 
     for offset in range(PICK_COUNT):
-        sliced = tokens[offset:]
-        usable = (len(sliced) // PICK_COUNT) * PICK_COUNT
-        sliced = sliced[:usable]
-        draws: List[List[int]] = []
         score = 0
-
-        for i in range(0, len(sliced), PICK_COUNT):
-            draw = sorted(sliced[i:i + PICK_COUNT])
-            draws.append(draw)
-
+        for draw in _split_into_draws(tokens[offset:]):
             unique_ok = len(set(draw)) == PICK_COUNT
             range_ok = all(NUM_MIN <= n <= NUM_MAX for n in draw)
             spread_ok = (draw[-1] - draw[0]) >= 8
@@ -418,15 +430,20 @@ def _chunk_tokens_to_draws(tokens: List[int]) -> List[List[int]]:
 
         if score > best_score:
             best_score = score
-            best_draws = draws
+            best_offset = offset
+
+    return best_offset
 
-    # finalna walidacja: bierzemy tylko sensowne zestawy
-    validated = []
-    for d in best_draws:
-        if len(d) == PICK_COUNT and len(set(d)) == PICK_COUNT and all(NUM_MIN <= x <= NUM_MAX for x in d):
-            validated.append(d)
 
-    return validated
+def _chunk_tokens_to_draws(tokens: List[int]) -> List[List[int]]:
+    """
+    Szuka najlepszego przesunięcia i buduje losowania po 6 liczb.
+    """
+    if len(tokens) < PICK_COUNT:
+        return []
+
+    # finalna walidacja: bierzemy tylko sensowne zestawy
+    return [d for d in _split_into_draws(tokens[_best_token_offset(tokens):]) if _is_valid_draw(d)]
 
 
 def _pair_draws_with_drawnos(draws: List[List[int]], drawnos: List[int]) -> List[DrawRecord]:
@@ -457,8 +474,7 @@ def _pair_draws_with_drawnos(draws: List[List[int]], drawnos: List[int]) -> List
     return records
 
 
-@st.cache_data(show_spinner=False)
-def load_records_cached(pdf_bytes: bytes) -> List[DrawRecord]:
+def parse_records(pdf_bytes: bytes) -> List[DrawRecord]:
     _validate_pdf_bytes(pdf_bytes)
     pages = _read_pdf_pages_text(pdf_bytes)
 
@@ -485,6 +501,148 @@ def load_records_cached(pdf_bytes: bytes) -> List[DrawRecord]:
     return records
 
 
+def iter_records(pdf_bytes: bytes) -> Iterator[DrawRecord]:
+    """
+    Strumieniowy odpowiednik parse_records: DrawRecord oddawane strona po stronie,
+    w kolejności z PDF (najnowsze pierwsze), bez budowania pełnych list tokenów.
+    - przesunięcie szóstek ustalane na tokenach pierwszej strony,
+    - niepełna szóstka z końca strony przechodzi na następną,
+    - losowanie czeka na swój numer; niesparowane wychodzą na końcu z draw_no=None.
+    """
+    _validate_pdf_bytes(pdf_bytes)
+
+    carry: List[int] = []
+    offset: Optional[int] = None
+    draws: deque = deque()
+    drawnos: deque = deque()
+
+    for page_text in iter_pages(pdf_bytes, "text"):
+        tokens, page_drawnos = _split_numbers_from_lines(page_text)
+        carry.extend(tokens)
+        drawnos.extend(page_drawnos)
+
+        if offset is None:
+            if len(carry) < PICK_COUNT:
+                continue
+            offset = _best_token_offset(carry)
+            carry = carry[offset:]
+
+        usable = (len(carry) // PICK_COUNT) * PICK_COUNT
+        draws.extend(d for d in _split_into_draws(carry[:usable]) if _is_valid_draw(d))
+        carry = carry[usable:]
+
+        while draws and drawnos:
+            yield DrawRecord(draw_no=drawnos.popleft(), nums=draws.popleft(), date_str="—", date_iso="")
+
+    while draws:
+        yield DrawRecord(draw_no=None, nums=draws.popleft(), date_str="—", date_iso="")
+
+
+def pdf_newest_first(pdf_bytes: bytes) -> bool:
+    """
+    Numery losowań z pierwszej strony maleją — PDF zaczyna się od najnowszych losowań,
+    więc kolejność strumienia (iter_records) zgadza się z kolejnością po sortowaniu.
+    """
+    for page_text in iter_pages(pdf_bytes, "text"):
+        _, drawnos = _split_numbers_from_lines(page_text)
+        return len(drawnos) >= 2 and all(a > b for a, b in zip(drawnos, drawnos[1:]))
+    return False
+
+
+class LazyRecordLoader:
+    """
+    Rekordy z PDF wczytywane leniwie (najnowsze pierwsze): ensure(n) parsuje tylko tyle stron,
+    ile potrzeba na n losowań, a start_background() dociąga resztę historii w wątku w tle.
+    Po wczytaniu całości rekordy trafiają do DrawStore, więc kolejny start jest natychmiastowy.
+    Wymaga PDF z najnowszymi losowaniami na początku (pdf_newest_first) — inaczej pierwsza sesja
+    analizowałaby inne okno niż kolejne, czytane z posortowanego DrawStore.
+    """
+
+    def __init__(
+        self,
+        pdf_bytes: Optional[bytes] = None,
+        records: Optional[List[DrawRecord]] = None,
+        store: Optional[DrawStore] = None,
+        stamp: Optional[Dict] = None
+    ):
+        self.records: List[DrawRecord] = list(records or [])
+        self.done = records is not None
+        self._pdf_bytes = pdf_bytes
+        self._stream = None if self.done else iter_records(pdf_bytes)
+        self._store = store
+        self._stamp = stamp
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.error: Optional[Exception] = None
+
+    def _pull(self, count: Optional[int]) -> None:
+        # blokada na pojedynczy rekord: wątek w tle i ensure() z UI dzielą jeden strumień
+        while not self.done and (count is None or len(self.records) < count):
+            with self._lock:
+                if self.done:
+                    break
+                try:
+                    self.records.append(next(self._stream))
+                except StopIteration:
+                    self._finish()
+                except Exception as e:
+                    self.error = e
+                    self.done = True
+
+    def _finish(self) -> None:
+        self.done = True
+        self._stream = None
+        if self._store is not None and len(self.records) >= 20:
+            ordered = list(self.records)
+            if sum(r.draw_no is not None for r in ordered) > 10:
+                ordered.sort(key=lambda r: (r.draw_no is None, r.draw_no or -1), reverse=True)
+            self._store.save(pdf_sha256(self._pdf_bytes), [asdict(r) for r in ordered], self._stamp)
+        self._pdf_bytes = None
+
+    def ensure(self, count: int) -> List[DrawRecord]:
+        """
+        Co najmniej count najnowszych rekordów (mniej tylko, gdy PDF ich nie ma).
+        """
+        self._pull(int(count))
+        if self.error is not None:
+            raise self.error
+        if not self.records:
+            raise RuntimeError("Nie udało się wyciągnąć poprawnych losowań z PDF.")
+        if self.done and len(self.records) < 20:
+            raise RuntimeError(
+                f"Wyciągnięto zbyt mało rekordów ({len(self.records)}). "
+                "Sprawdź, czy PDF ma prawidłowy układ."
+            )
+        return self.records[:int(count)]
+
+    def start_background(self) -> None:
+        if self.done or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._pull, args=(None,), daemon=True)
+        self._thread.start()
+
+    def available(self) -> int:
+        return len(self.records)
+
+
+@st.cache_resource(show_spinner=False)
+def record_loader_cached(pdf_path: str, pdf_stamp: Tuple[int, int]) -> LazyRecordLoader:
+    # loader żyje między rerunami; pdf_stamp (rozmiar, mtime) unieważnia go po podmianie PDF
+    store = DrawStore(DRAW_STORE_NAMESPACE)
+    rows = store.load_path(pdf_path)
+    if rows is None:
+        pdf_bytes = Path(pdf_path).read_bytes()
+        rows = store.load(pdf_sha256(pdf_bytes))
+        if rows is None:
+            if pdf_newest_first(pdf_bytes):
+                return LazyRecordLoader(pdf_bytes=pdf_bytes, store=store, stamp=file_stamp(pdf_path))
+            # inna kolejność w PDF: pełne parsowanie z sortowaniem po numerze losowania
+            records = parse_records(pdf_bytes)
+            store.save(pdf_sha256(pdf_bytes), [asdict(r) for r in records], file_stamp(pdf_path))
+            return LazyRecordLoader(records=records)
+    return LazyRecordLoader(records=[DrawRecord(**row) for row in rows])
+
+
 # =========================================================
 # ANALYSIS CORE
 # =========================================================
@@ -618,25 +776,22 @@ def build_shape_profile(draws: List[List[int]]) -> Dict:
     }
 
 
-def build_frequency_windows(draws: List[List[int]]) -> Dict[str, Dict[int, float]]:
+def build_frequency_windows(
+    draws: List[List[int]],
+    windows: Iterable[int] = FREQUENCY_WINDOWS
+) -> Dict[str, Dict[int, float]]:
     """
-    Liczy częstości na wielu oknach naraz.
+    Liczy częstości na wielu oknach naraz: klucze "w<okno>" oraz "wall".
     """
-    def pct_map(sub_draws: List[List[int]]) -> Dict[int, float]:
-        total = len(sub_draws)
-        c = Counter()
-        for d in sub_draws:
-            for n in set(d):
-                c[n] += 1
-        return {n: (c.get(n, 0) / total if total else 0.0) for n in range(NUM_MIN, NUM_MAX + 1)}
+    index = FrequencyIndex(DrawHistory.from_draws(draws))
 
-    return {
-        "w20": pct_map(draws[:min(WINDOWS_SHORT, len(draws))]),
-        "w50": pct_map(draws[:min(WINDOWS_MEDIUM, len(draws))]),
-        "w100": pct_map(draws[:min(WINDOWS_LONG, len(draws))]),
-        "w250": pct_map(draws[:min(WINDOWS_ULTRA, len(draws))]),
-        "wall": pct_map(draws),
-    }
+    def pct_map(size: Optional[int]) -> Dict[int, float]:
+        rate = index.rate(size)
+        return {n: float(rate[n]) for n in range(NUM_MIN, NUM_MAX + 1)}
+
+    result = {f"w{size}": pct_map(size) for size in windows}
+    result["wall"] = pct_map(None)
+    return result
 
 
 def build_number_feature_table(draws: List[List[int]]) -> pd.DataFrame:
@@ -723,10 +878,7 @@ def build_elite_and_soft_pools(feature_df: pd.DataFrame, elite_size: int, soft_s
 # SCORING
 # =========================================================
 def similarity_to_recent(ticket: List[int], recent_draws: List[List[int]]) -> int:
-    tset = set(ticket)
-    if not recent_draws:
-        return 0
-    return max(len(tset.intersection(set(d))) for d in recent_draws)
+    return max_overlap(ticket_mask(ticket), [ticket_mask(d) for d in recent_draws])
 
 
 def ticket_shape_values(ticket: List[int]) -> Dict[str, object]:
@@ -860,6 +1012,40 @@ def score_ticket(
     )
 
 
+def batch_to_ticket_metrics(batch: Dict[str, np.ndarray], sources: List[str]) -> List[TicketMetrics]:
+    results = []
+    for i, source in enumerate(sources):
+        results.append(TicketMetrics(
+            ticket=batch["ticket"][i].tolist(),
+            final_score=float(batch["final_score"][i]),
+            freq_score=float(batch["freq_score"][i]),
+            momentum_score=float(batch["momentum_score"][i]),
+            overdue_score=float(batch["overdue_score"][i]),
+            pair_score=float(batch["pair_score"][i]),
+            triple_score=float(batch["triple_score"][i]),
+            shape_score=float(batch["shape_score"][i]),
+            diversity_penalty=float(batch["diversity_penalty"][i]),
+            recent_overlap_penalty=float(batch["recent_overlap_penalty"][i]),
+            odd_even=f"{batch['ev'][i]}/{batch['od'][i]}",
+            low_high=f"{batch['low'][i]}/{batch['high'][i]}",
+            spread=int(batch["spread"][i]),
+            consecutive_pairs=int(batch["consecutive_pairs"][i]),
+            sum_total=int(batch["sum_total"][i]),
+            source=source
+        ))
+    return results
+
+
+def score_tickets_metrics(
+    tickets: List[List[int]],
+    tables: ScoreTables,
+    sources: List[str]
+) -> List[TicketMetrics]:
+    if len(tickets) == 0:
+        return []
+    return batch_to_ticket_metrics(score_tickets_batch(np.array(tickets), tables), sources)
+
+
 # =========================================================
 # CANDIDATE GENERATION
 # =========================================================
@@ -890,44 +1076,27 @@ def build_generation_weights(feature_df: pd.DataFrame) -> Dict[int, float]:
     return weights
 
 
-def generate_weighted_candidate(
+def generate_weighted_candidates(
     rng: np.random.Generator,
-    generation_weights: Dict[int, float],
-    elite_pool: List[int],
-    soft_pool: List[int]
-) -> List[int]:
+    weight_vec: np.ndarray,
+    elite_mask: np.ndarray,
+    soft_mask: np.ndarray,
+    count: int
+) -> np.ndarray:
     """
-    Generator hybrydowy:
-    - 2 lub 3 liczby z elite,
+    Generator hybrydowy, count kuponów naraz (Gumbel-top-k):
+    - 2, 3 lub 4 liczby z elite,
     - reszta z szerszej puli ważonej.
     """
-    elite_take = int(rng.choice([2, 3, 4], p=[0.30, 0.45, 0.25]))
-    elite_take = min(elite_take, PICK_COUNT)
-
-    elite_weights = [generation_weights[n] for n in elite_pool]
-    elite_part = weighted_unique_sample(rng, elite_pool, elite_weights, elite_take)
+    elite_take = np.minimum(rng.choice([2, 3, 4], size=count, p=[0.30, 0.45, 0.25]), PICK_COUNT)
+    return sample_two_stage(rng, weight_vec, elite_take, elite_mask, soft_mask)
 
-    remaining_count = PICK_COUNT - elite_take
-    remaining_population = [n for n in soft_pool if n not in elite_part]
-    if len(remaining_population) < remaining_count:
-        remaining_population = [n for n in range(NUM_MIN, NUM_MAX + 1) if n not in elite_part]
 
-    remaining_weights = [generation_weights[n] for n in remaining_population]
-    rest = weighted_unique_sample(rng, remaining_population, remaining_weights, remaining_count)
-
-    return sorted(elite_part + rest)
-
-
-def generate_diverse_candidate(
-    rng: np.random.Generator,
-    generation_weights: Dict[int, float],
-    full_pool: List[int]
-) -> List[int]:
+def generate_diverse_candidates(rng: np.random.Generator, weight_vec: np.ndarray, count: int) -> np.ndarray:
     """
     Drugi generator: bardziej szeroki, by nie zamknąć się tylko w hotach.
     """
-    weights = [generation_weights[n] for n in full_pool]
-    return weighted_unique_sample(rng, full_pool, weights, PICK_COUNT)
+    return sample_tickets(rng, weight_vec, count)
 
 
 def mutate_ticket(
@@ -958,32 +1127,43 @@ def local_search_improve(
     ticket: List[int],
     generation_weights: Dict[int, float],
     soft_pool: List[int],
-    score_fn,
+    scorer: SwapScorer,
     steps: int
 ) -> List[int]:
-    best = sorted(ticket)
-    best_score = score_fn(best).final_score
+    """
+    Mutacja zmienia 1–2 liczby, więc kandydat oceniany jest przyrostowo (TicketState) —
+    tylko pary i trójki z zamienioną liczbą, zamiast pełnego przeliczenia kuponu.
+    """
+    best = scorer.state(ticket)
 
     for _ in range(steps):
         replace_count = int(rng.choice([1, 2], p=[0.75, 0.25]))
-        candidate = mutate_ticket(rng, best, generation_weights, soft_pool, replace_count)
-        candidate_score = score_fn(candidate).final_score
-        if candidate_score > best_score:
-            best = candidate
-            best_score = candidate_score
+        candidate = mutate_ticket(rng, best.ticket, generation_weights, soft_pool, replace_count)
+        removed = [n for n in best.ticket if n not in candidate]
+        added = [n for n in candidate if n not in best.ticket]
+        if removed and best.move_score(removed, added) > best.score:
+            best = best.move(removed, added)
 
-    return best
+    return best.ticket
 
 
-def build_candidates(
+def generate_candidates(
+    budget: int,
+    seed: SeedLike,
     draws: List[List[int]],
     feature_df: pd.DataFrame,
     pair_map: Dict[Tuple[int, int], float],
     triple_map: Dict[Tuple[int, int, int], float],
     profile: Dict,
     cfg: EngineConfig
-) -> List[TicketMetrics]:
-    rng = np.random.default_rng(cfg.seed)
+) -> Tuple[List[TicketMetrics], int]:
+    """
+    Jeden shard generatora: budget prób z własnego strumienia losowego → (cfg.n_tickets najlepszych
+    malejąco wg final_score, liczba ocenionych unikalnych kandydatów).
+    Kandydaci oceniani wektorowo partiami po CANDIDATE_BATCH, ranking trzyma tylko wyniki i rangi (TopK),
+    więc pamięć nie rośnie z budżetem; TicketMetrics powstają tylko dla zwycięzców.
+    """
+    rng = np.random.default_rng(seed)
 
     recent_draws = draws[:10]
     generation_weights = build_generation_weights(feature_df)
@@ -993,48 +1173,61 @@ def build_candidates(
         elite_size=cfg.elite_pool_size,
         soft_size=cfg.soft_pool_size
     )
-    full_pool = list(range(NUM_MIN, NUM_MAX + 1))
-
-    def score_fn(ticket: List[int], source: str = "gen") -> TicketMetrics:
-        return score_ticket(
-            ticket=ticket,
-            feature_df=feature_df,
-            pair_map=pair_map,
-            triple_map=triple_map,
-            profile=profile,
-            recent_draws=recent_draws,
-            max_recent_overlap=cfg.max_recent_overlap,
-            source=source
-        )
 
-    uniq = set()
-    results: List[TicketMetrics] = []
+    # tablice liczone raz — scoring kandydatów idzie wektorowo
+    tables = build_score_tables(
+        feature_df=feature_df,
+        pair_map=pair_map,
+        triple_map=triple_map,
+        profile=profile,
+        recent_draws=recent_draws,
+        max_recent_overlap=cfg.max_recent_overlap
+    )
+
+    scorer = SwapScorer(tables)
+
+    # kandydaci trzymani jako rangi uint32 (ticket_codec), deduplikacja przez bitset C(49, 6)
+    seen = SeenSet()
+    top = TopK(cfg.n_tickets)
+    target = budget
+    ranks: List[int] = []
+    tags: List[int] = []
+
+    def score_pending() -> None:
+        if ranks:
+            pending = np.asarray(ranks, dtype=np.uint32)
+            scored = score_tickets_batch(unrank_tickets(pending), tables)
+            top.push_many(scored["final_score"], pending, np.asarray(tags))
+            ranks.clear()
+            tags.clear()
 
-    target = cfg.candidate_count
     hard_limit = target * 5
     attempts = 0
 
-    while len(results) < target and attempts < hard_limit:
+    weight_vec = weight_vector(generation_weights)
+    elite_mask, soft_mask = pool_mask(elite_pool), pool_mask(soft_pool)
+    batch: List[Tuple[str, List[int]]] = []
+
+    while top.pushed + len(ranks) < target and attempts < hard_limit:
+        if not batch:
+            # kandydaci losowani partiami: tryby i kupony bazowe jednym wywołaniem samplera
+            size = min(CANDIDATE_BATCH, hard_limit - attempts)
+            modes = rng.choice(CANDIDATE_SOURCES, size=size, p=[0.56, 0.24, 0.20])
+            diverse = modes == "diverse"
+            tickets = np.empty((size, PICK_COUNT), dtype=np.int64)
+            tickets[~diverse] = generate_weighted_candidates(rng, weight_vec, elite_mask, soft_mask, int((~diverse).sum()))
+            tickets[diverse] = generate_diverse_candidates(rng, weight_vec, int(diverse.sum()))
+            batch = list(zip(modes.tolist(), tickets.tolist()))
+            batch.reverse()
+
         attempts += 1
+        mode, ticket = batch.pop()
 
-        mode = rng.choice(
-            ["weighted", "diverse", "mutated"],
-            p=[0.56, 0.24, 0.20]
-        )
+        if mode == "mutated":
+            ticket = mutate_ticket(rng, ticket, generation_weights, soft_pool, replace_count=int(rng.choice([1, 2])))
 
-        if mode == "weighted":
-            ticket = generate_weighted_candidate(rng, generation_weights, elite_pool, soft_pool)
-            source = "weighted"
-        elif mode == "diverse":
-            ticket = generate_diverse_candidate(rng, generation_weights, full_pool)
-            source = "diverse"
-        else:
-            seed_ticket = generate_weighted_candidate(rng, generation_weights, elite_pool, soft_pool)
-            ticket = mutate_ticket(rng, seed_ticket, generation_weights, soft_pool, replace_count=int(rng.choice([1, 2])))
-            source = "mutated"
-
-        key = tuple(ticket)
-        if key in uniq:
+        rank = ticket_rank(ticket)
+        if rank in seen:
             continue
 
         if cfg.enable_local_search:
@@ -1043,19 +1236,55 @@ def build_candidates(
                 ticket=ticket,
                 generation_weights=generation_weights,
                 soft_pool=soft_pool,
-                score_fn=lambda t: score_fn(t, source="local_search"),
+                scorer=scorer,
                 steps=cfg.local_search_steps
             )
             ticket = improved
-            key = tuple(ticket)
-            if key in uniq:
+            rank = ticket_rank(ticket)
+            if rank in seen:
                 continue
 
-        uniq.add(key)
-        results.append(score_fn(ticket, source=source))
+        seen.add(rank)
+        ranks.append(rank)
+        tags.append(CANDIDATE_SOURCES.index(mode))
+        if len(ranks) >= CANDIDATE_BATCH:
+            score_pending()
 
-    results.sort(key=lambda x: x.final_score, reverse=True)
-    return results
+    score_pending()
+    _, top_ranks, top_tags = top.result()
+    results = score_tickets_metrics(unrank_tickets(top_ranks), tables, [CANDIDATE_SOURCES[t] for t in top_tags.tolist()])
+    return results, top.pushed
+
+
+def build_candidates(
+    draws: List[List[int]],
+    feature_df: pd.DataFrame,
+    pair_map: Dict[Tuple[int, int], float],
+    triple_map: Dict[Tuple[int, int, int], float],
+    profile: Dict,
+    cfg: EngineConfig,
+    workers: Optional[int] = CANDIDATE_WORKERS
+) -> Tuple[List[TicketMetrics], int]:
+    """
+    Budżet cfg.candidate_count dzielony na stałą liczbę shardów z seedami z SeedSequence(cfg.seed).spawn;
+    rankingi shardów (po cfg.n_tickets najlepszych) są scalane, powtórki między shardami usuwane.
+    Zwraca (cfg.n_tickets najlepszych, liczba ocenionych kandydatów). Wynik zależy tylko od seeda (nie od liczby CPU),
+    a workers=1 daje dokładnie wynik wersji szeregowej.
+    """
+    parts = map_shards(
+        generate_candidates,
+        cfg.candidate_count,
+        cfg.seed,
+        workers=workers,
+        args=(draws, feature_df, pair_map, triple_map, profile, cfg)
+    )
+    metrics = merge_ranked(
+        [p[0] for p in parts],
+        key=lambda m: m.final_score,
+        top_k=cfg.n_tickets,
+        unique_key=lambda m: tuple(m.ticket)
+    )
+    return metrics, sum(p[1] for p in parts)
 
 
 # =========================================================
@@ -1334,24 +1563,29 @@ def main() -> None:
         st.stop()
 
     try:
-        pdf_bytes = pdf_path.read_bytes()
-        all_records = load_records_cached(pdf_bytes)
+        pdf_stat = pdf_path.stat()
+        loader = record_loader_cached(str(pdf_path), (pdf_stat.st_size, pdf_stat.st_mtime_ns))
+        # pełna liczba rekordów znana dopiero po wczytaniu całości — do tego czasu górny próg suwaka to 1000
+        cfg_raw = settings_panel(max_records=loader.available() if loader.done else max(loader.available(), 1000))
+        cfg = EngineConfig(**cfg_raw)
+        used_records = loader.ensure(cfg.analysis_window)
+        loader.start_background()
     except Exception as e:
         logger.exception("Błąd podczas odczytu PDF")
         st.error("❌ Nie udało się odczytać lub sparsować PDF.")
         st.code(str(e))
         st.stop()
 
-    cfg_raw = settings_panel(max_records=len(all_records))
-    cfg = EngineConfig(**cfg_raw)
-
-    used_window = min(cfg.analysis_window, len(all_records))
-    used_records = all_records[:used_window]
+    all_records = loader.records
+    used_window = len(used_records)
     draws = [r.nums for r in used_records]
 
     st.markdown('<div class="v-card">', unsafe_allow_html=True)
     st.subheader("📊 Diagnostyka danych")
-    st.success(f"✅ Odczytano rekordów z PDF: **{len(all_records)}**")
+    if loader.done:
+        st.success(f"✅ Odczytano rekordów z PDF: **{len(all_records)}**")
+    else:
+        st.success(f"✅ Odczytano rekordów z PDF: **{len(all_records)}** (starsza historia wczytuje się w tle)")
     st.info(f"✅ Do analizy użyto: **{used_window}** najnowszych losowań")
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -1411,6 +1645,8 @@ def main() -> None:
         st.markdown('<div class="btn-gold">', unsafe_allow_html=True)
         momentum_btn = st.button("🌟 MOMENTUM MASTER", use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
+        global_btn = st.button("🌍 GLOBALNE TOP", type="primary", use_container_width=True)
+        tempering_btn = st.button("🌡️ TEMPERING", type="primary", use_container_width=True)
 
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -1422,7 +1658,7 @@ def main() -> None:
         status = st.empty()
 
         with st.spinner("Buduję kandydatów, punktuję i wybieram najlepsze kupony..."):
-            metrics = build_candidates(
+            metrics, evaluated = build_candidates(
                 draws=draws,
                 feature_df=feature_df,
                 pair_map=pair_map,
@@ -1430,13 +1666,59 @@ def main() -> None:
                 profile=shape_profile,
                 cfg=cfg
             )
-            st.session_state["generated_metrics"] = metrics[:cfg.n_tickets]
+            st.session_state["generated_metrics"] = metrics
             progress.progress(100)
-            status.write(f"Wygenerowano i oceniono {len(metrics)} unikalnych kandydatów.")
+            status.write(f"Wygenerowano i oceniono {evaluated} unikalnych kandydatów.")
 
         progress.empty()
         status.empty()
 
+    if global_btn:
+        with st.spinner(f"Przeglądam wszystkie {TOTAL_TICKETS} kombinacji 6/49..."):
+            tables = build_score_tables(
+                feature_df=feature_df,
+                pair_map=pair_map,
+                triple_map=triple_map,
+                profile=shape_profile,
+                recent_draws=draws[:10],
+                max_recent_overlap=cfg.max_recent_overlap
+            )
+            ranked = exhaustive_top_k(tables, top_k=cfg.n_tickets)
+            st.session_state["generated_metrics"] = score_tickets_metrics(
+                [ticket for _, ticket in ranked],
+                tables,
+                ["global"] * len(ranked)
+            )
+
+    if tempering_btn:
+        with st.spinner(f"Parallel tempering: {TEMPERING_MAX_STEPS} ruchów..."):
+            tables = build_score_tables(
+                feature_df=feature_df,
+                pair_map=pair_map,
+                triple_map=triple_map,
+                profile=shape_profile,
+                recent_draws=draws[:10],
+                max_recent_overlap=cfg.max_recent_overlap
+            )
+            result = parallel_tempering(
+                SwapScorer(tables),
+                top_n=cfg.n_tickets,
+                seed=cfg.seed,
+                max_steps=TEMPERING_MAX_STEPS,
+                time_budget_s=TEMPERING_TIME_BUDGET_S
+            )
+            st.session_state["generated_metrics"] = score_tickets_metrics(
+                result.tickets,
+                tables,
+                ["tempering"] * len(result.tickets)
+            )
+        st.caption(f"Tempering: {result.steps} ruchów ({result.steps_per_second:.0f}/s), {len(result.tickets)} zróżnicowanych kuponów.")
+        if result.truncated:
+            st.caption(
+                f"⚠️ Przerwano po {TEMPERING_TIME_BUDGET_S:.0f} s, przed {TEMPERING_MAX_STEPS} ruchami — "
+                "wynik nie jest powtarzalny dla tego seeda."
+            )
+
     if daily_btn:
         st.session_state["daily_ticket"] = build_daily_ticket(draws, feature_df, seed=cfg.seed + 7)
 
@@ -1457,7 +1739,7 @@ def main() -> None:
     if st.session_state["show_results"]:
         st.markdown("### 📋 Ostatnie wyniki z PDF")
         show_n = st.selectbox("Ile rekordów pokazać?", [10, 50, 100, 200], index=1)
-        view_records = all_records[:min(show_n, len(all_records))]
+        view_records = loader.ensure(show_n)
         df_results = pd.DataFrame({
             "Numer losowania": [r.draw_no if r.draw_no is not None else "—" for r in view_records],
             "Data": [r.date_str for r in view_records],
@@ -1614,6 +1896,7 @@ Nowy silnik:
 7. Dodatkowo mutuje i dopieszcza część kuponów przez local search.
 8. Ocenia wszystkie kandydaty wspólną funkcją score.
 9. Zwraca najlepsze kupony według końcowego rankingu.
+10. Przycisk **GLOBALNE TOP** ocenia wszystkie 13 983 816 kombinacji tą samą funkcją score i zwraca dokładne top-N.
         """)
 
 
@@ -2,18 +2,25 @@ import os
 import re
 import logging
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional, Iterable, Set
+from typing import List, Dict, Tuple, Optional, Iterable, Sequence, Set
 from collections import Counter
 from itertools import combinations
 
-import fitz  # PyMuPDF
 import numpy as np
 import pandas as pd
 import streamlit as st
 import scipy.stats as stats
 
+from draw_history import DrawHistory, FrequencyIndex
+from draw_store import DrawStore
+from pdf_pages import extract_pages
+from shard_pool import SeedLike, map_shards, merge_ranked, shard_processes
+from ticket_codec import SeenSet, ticket_rank, unrank_tickets
+from ticket_topk import TopK
+from weighted_sampler import pool_mask, sample_tickets, sample_two_stage, weight_vector, weighted_sample
+
 
 # =========================================================
 # LOGGING
@@ -35,6 +42,11 @@ NUM_MIN = 1
 NUM_MAX = 49
 PICK_COUNT = 6
 DRAWNO_MIN = 1000
+DRAW_STORE_NAMESPACE = "LotusWygranus2.0"
+PDF_PAGE_WORKERS = 1  # procesy ekstrakcji stron PDF; 1 = szeregowo, None = liczba CPU (tylko duże archiwa)
+CANDIDATE_WORKERS = None  # procesy generatora kandydatów; None = liczba CPU (wynik ten sam), 1 = szeregowo
+CANDIDATE_CHUNK = 16384  # kupony bazowe losowane naraz — pamięć shardu nie rośnie z liczbą kandydatów
+CANDIDATE_SOURCES = ("elite_hybrid", "diverse", "local_search")  # indeks = znacznik źródła w TopK
 
 LOW_HIGH_THRESHOLD = 24
 
@@ -161,22 +173,16 @@ def normalize_scores(score_map: Dict[int, float]) -> Dict[int, float]:
     return {k: (v - mn) / (mx - mn) for k, v in score_map.items()}
 
 def weighted_unique_sample(rng: np.random.Generator, population: List[int], weights: List[float], k: int) -> List[int]:
-    arr_pop, arr_w = np.array(population, dtype=int), np.array(weights, dtype=float)
-    if len(arr_pop) < k: raise ValueError("Populacja mniejsza niż k.")
-    if arr_w.sum() <= 0: arr_w = np.ones_like(arr_w, dtype=float)
-    probs = arr_w / arr_w.sum()
-    return sorted(rng.choice(arr_pop, size=k, replace=False, p=probs).tolist())
+    return weighted_sample(rng, population, weights, k)
 
 
 # =========================================================
 # PDF PARSER
 # =========================================================
-@st.cache_data(show_spinner=False)
-def load_records_cached(pdf_bytes: bytes) -> List[DrawRecord]:
+def parse_records(pdf_bytes: bytes) -> List[DrawRecord]:
     if not pdf_bytes.startswith(b"%PDF"): raise ValueError("Brak nagłówka %PDF.")
     
-    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-        pages = [page.get_text("text") or "" for page in doc]
+    pages = extract_pages(pdf_bytes, "text", workers=PDF_PAGE_WORKERS)
 
     all_tokens, all_drawnos = [], []
     for page_text in pages:
@@ -205,6 +211,16 @@ def load_records_cached(pdf_bytes: bytes) -> List[DrawRecord]:
     return records
 
 
+@st.cache_data(show_spinner=False)
+def load_records_cached(pdf_path: str, pdf_stamp: Tuple[int, int]) -> List[DrawRecord]:
+    # pdf_stamp (rozmiar, mtime) to tylko klucz cache; parser rusza, gdy zmieni się hash PDF
+    rows = DrawStore(DRAW_STORE_NAMESPACE).load_or_import_path(
+        pdf_path,
+        lambda pdf_bytes: [asdict(r) for r in parse_records(pdf_bytes)],
+    )
+    return [DrawRecord(**row) for row in rows]
+
+
 # =========================================================
 # ADVANCED ANALYTICS
 # =========================================================
@@ -262,12 +278,15 @@ def build_shape_profile(draws: List[List[int]]) -> Dict:
     }
 
 def build_number_feature_table(draws: List[List[int]]) -> pd.DataFrame:
-    def pct_map(sub: List[List[int]]) -> Dict[int, float]:
-        c = Counter(n for d in sub for n in d)
-        return {n: (c.get(n, 0) / len(sub) if len(sub) else 0.0) for n in range(NUM_MIN, NUM_MAX + 1)}
+    # jeden indeks sum prefiksowych zamiast czterech przeliczeń okien
+    index = FrequencyIndex(DrawHistory.from_draws(draws))
+
+    def pct_map(size: Optional[int]) -> Dict[int, float]:
+        rate = index.rate(size)
+        return {n: float(rate[n]) for n in range(NUM_MIN, NUM_MAX + 1)}
 
-    w20, w50 = pct_map(draws[:20]), pct_map(draws[:50])
-    w100, fall = pct_map(draws[:100]), pct_map(draws)
+    w20, w50 = pct_map(20), pct_map(50)
+    w100, fall = pct_map(100), pct_map(None)
     weibull_map = dict(zip((w_df := compute_weibull_hazard_and_gaps(draws))["Liczba"], w_df["Weibull_Hazard"]))
     
     last_seen = {n: 999 for n in range(NUM_MIN, NUM_MAX + 1)}
@@ -339,15 +358,89 @@ def score_ticket(
         odd_even=f"{ev}/{od}", low_high=f"{low}/{high}", source=source
     )
 
+class MarkovSwapScorer:
+    """
+    Przyrostowy final_score z score_ticket dla lokalnego przeszukiwania.
+    Weibull, Markov i Momentum są sumami po liczbach kuponu, więc zamiana x → y
+    zmienia tylko dwa wyrazy sumy i liczniki overlapu — O(k) zamiast pełnego score_ticket.
+    Stany zgodne z TicketState z lotus_scoring (ticket, score, swap_score, swap, move) — działa też z tempering.
+    """
+    def __init__(
+        self, feat_map: Dict[int, Dict[str, float]], markov_matrix: np.ndarray, last_draw: List[int],
+        profile: Dict, recent_draws_sets: List[Set[int]], max_recent_overlap: int
+    ):
+        self.number_value = [0.0] * (NUM_MAX + 1)
+        for n in range(NUM_MIN, NUM_MAX + 1):
+            markov = sum(markov_matrix[p][n] for p in last_draw) / 36.0 if last_draw else 0.0
+            self.number_value[n] = (feat_map[n]["WeibullHazard_Norm"] * 1.8 + feat_map[n]["Momentum_Norm"] * 1.2) / PICK_COUNT + markov * 1.6
+        self.profile, self.recent_sets, self.max_recent_overlap = profile, recent_draws_sets, max_recent_overlap
+
+    def state(self, ticket: Sequence[int]) -> "MarkovTicketState":
+        t = sorted(int(n) for n in ticket)
+        return MarkovTicketState(self, t, sum(self.number_value[n] for n in t), [len(set(t).intersection(d)) for d in self.recent_sets])
+
+    def final_score(self, t: List[int], linear: float, overlaps: List[int]) -> float:
+        p = self.profile
+        ev = sum(1 for x in t if x % 2 == 0)
+        low = sum(1 for x in t if x <= LOW_HIGH_THRESHOLD)
+        even_odd_pen = abs(ev - p["target_even_odd"][0]) + abs(PICK_COUNT - ev - p["target_even_odd"][1])
+        low_high_pen = abs(low - p["target_low_high"][0]) + abs(PICK_COUNT - low - p["target_low_high"][1])
+        shape_score = max(0.0, 1.0 - (even_odd_pen * 0.15 + low_high_pen * 0.15 + abs(t[-1] - t[0] - p["target_spread"])/30.0 * 0.1))
+
+        recent_overlap = max(overlaps, default=0)
+        overlap_pen = ((recent_overlap - self.max_recent_overlap) * 0.40) if recent_overlap > self.max_recent_overlap else 0.0
+
+        div_pen = 0.0
+        if sum(1 for x in t if x <= 31) >= 5: div_pen += 0.30
+        if has_run_length(t, 4): div_pen += 0.65
+        if ev in (0, 6) or low in (0, 6): div_pen += 0.35
+
+        return round(linear + shape_score * 1.0 - div_pen - overlap_pen, 6)
+
+
+class MarkovTicketState:
+    def __init__(self, scorer: MarkovSwapScorer, ticket: List[int], linear: float, overlaps: List[int]):
+        self.scorer = scorer
+        self.ticket = ticket
+        self.linear = linear          # suma wkładów liczb (Weibull + Markov + Momentum)
+        self.overlaps = overlaps      # część wspólna z każdym z ostatnich losowań
+        self.score = scorer.final_score(ticket, linear, overlaps)
+
+    def _swapped(self, x: int, y: int) -> Tuple[List[int], float, List[int]]:
+        s = self.scorer
+        linear = self.linear + s.number_value[y] - s.number_value[x]
+        overlaps = [c - (x in d) + (y in d) for c, d in zip(self.overlaps, s.recent_sets)]
+        return sorted([n for n in self.ticket if n != x] + [y]), linear, overlaps
+
+    def swap_score(self, x: int, y: int) -> float:
+        return self.scorer.final_score(*self._swapped(int(x), int(y)))
+
+    def swap(self, x: int, y: int) -> "MarkovTicketState":
+        return MarkovTicketState(self.scorer, *self._swapped(int(x), int(y)))
+
+    def move(self, removed: Sequence[int], added: Sequence[int]) -> "MarkovTicketState":
+        state = self
+        for x, y in zip(removed, added):
+            state = state.swap(x, y)
+        return state
+
+    def move_score(self, removed: Sequence[int], added: Sequence[int]) -> float:
+        return self.move(removed, added).score
+
 
 # =========================================================
 # CANDIDATE GENERATION WITH PROGRESS
 # =========================================================
-def build_candidates(
-    draws: List[List[int]], feature_df: pd.DataFrame, markov_matrix: np.ndarray,
-    profile: Dict, cfg: EngineConfig, progress_bar, status_text
-) -> List[TicketMetrics]:
-    rng = np.random.default_rng(cfg.seed)
+def generate_candidates(
+    budget: int, seed: SeedLike, draws: List[List[int]], feature_df: pd.DataFrame,
+    markov_matrix: np.ndarray, profile: Dict, cfg: EngineConfig, progress=None
+) -> Tuple[List[TicketMetrics], int]:
+    """
+    Jeden shard generatora: budget prób z własnego strumienia losowego → (cfg.n_tickets najlepszych malejąco
+    wg final_score, liczba ocenionych unikalnych kuponów). Ranking trzyma tylko wyniki i rangi (TopK),
+    TicketMetrics powstają tylko dla zwycięzców. progress(i, budget) — opcjonalnie, co 10% pętli.
+    """
+    rng = np.random.default_rng(seed)
     recent_sets = [set(d) for d in draws[:10]]
     last_draw = draws[0] if draws else []
     feat_map = feature_df.set_index("Liczba").to_dict("index")
@@ -362,52 +455,97 @@ def build_candidates(
     def eval_fn(t: List[int], s: str = "gen") -> TicketMetrics:
         return score_ticket(t, feat_map, markov_matrix, last_draw, profile, recent_sets, cfg.max_recent_overlap, s)
 
-    results, uniq = [], set()
-    target = cfg.candidate_count
-    
-    start_time = time.time()
+    swap_scorer = MarkovSwapScorer(feat_map, markov_matrix, last_draw, profile, recent_sets, cfg.max_recent_overlap)
+
+    seen, top = SeenSet(), TopK(cfg.n_tickets)
+    target = budget
+    weight_vec = weight_vector(weights)
 
     for i in range(target):
         # Update progress bar every 10%
-        if i % (target // 10 + 1) == 0:
-            progress = int((i / target) * 100)
-            progress_bar.progress(progress)
-            status_text.write(f"⏳ Generowanie i optymalizacja kuponów: {progress}% (przeliczono {i} wektorów)...")
+        if progress is not None and i % (target // 10 + 1) == 0:
+            progress(i, target)
 
-        mode = rng.choice(["elite", "diverse"], p=[0.75, 0.25])
-        if mode == "elite":
-            elite_take = min(int(rng.choice([2, 3, 4], p=[0.3, 0.5, 0.2])), PICK_COUNT)
-            e_part = weighted_unique_sample(rng, elite_pool, [weights[n] for n in elite_pool], elite_take)
-            rem = [n for n in soft_pool if n not in e_part] or full_pool
-            r_part = weighted_unique_sample(rng, rem, [weights[n] for n in rem], PICK_COUNT - elite_take)
-            ticket = sorted(e_part + r_part)
-            src = "elite_hybrid"
-        else:
-            ticket = weighted_unique_sample(rng, full_pool, [weights[n] for n in full_pool], PICK_COUNT)
-            src = "diverse"
+        if i % CANDIDATE_CHUNK == 0:
+            # kupony bazowe losowane naraz (Gumbel-top-k) porcjami po CANDIDATE_CHUNK, pętla tylko je ulepsza i ocenia
+            size = min(CANDIDATE_CHUNK, target - i)
+            elite = rng.choice([True, False], size=size, p=[0.75, 0.25])
+            base = np.empty((size, PICK_COUNT), dtype=np.int64)
+            elite_take = np.minimum(rng.choice([2, 3, 4], size=int(elite.sum()), p=[0.3, 0.5, 0.2]), PICK_COUNT)
+            base[elite] = sample_two_stage(rng, weight_vec, elite_take, pool_mask(elite_pool), pool_mask(soft_pool))
+            base[~elite] = sample_tickets(rng, weight_vec, int((~elite).sum()))
+            base_tickets, elite = base.tolist(), elite.tolist()
+
+        ticket = base_tickets[i % CANDIDATE_CHUNK]
+        src = 0 if elite[i % CANDIDATE_CHUNK] else 1
 
-        if tuple(ticket) in uniq: continue
+        if ticket_rank(ticket) in seen: continue
 
         if cfg.enable_local_search:
-            best, b_score = ticket, eval_fn(ticket).final_score
+            # kandydat różni się od best 1–2 liczbami — ocena przyrostowa przez MarkovSwapScorer
+            best = swap_scorer.state(ticket)
+            b_score = best.score
             for _ in range(cfg.local_search_steps):
-                to_rm = set(rng.choice(best, size=int(rng.choice([1, 2])), replace=False).tolist())
-                kept = [n for n in best if n not in to_rm]
+                to_rm = set(rng.choice(best.ticket, size=int(rng.choice([1, 2])), replace=False).tolist())
+                kept = [n for n in best.ticket if n not in to_rm]
                 cands = [n for n in soft_pool if n not in kept] or full_pool
-                cand = sorted(kept + weighted_unique_sample(rng, cands, [weights[n] for n in cands], PICK_COUNT - len(kept)))
-                c_score = eval_fn(cand).final_score
+                picked = weighted_unique_sample(rng, cands, [weights[n] for n in cands], PICK_COUNT - len(kept))
+                removed, added = [n for n in to_rm if n not in picked], [n for n in picked if n not in to_rm]
+                if not added: continue
+                cand = best.move(removed, added)
+                c_score = cand.score
                 if c_score > b_score: best, b_score = cand, c_score
-            ticket, src = best, "local_search"
+            ticket, src = best.ticket, 2
 
-        if tuple(ticket) in uniq: continue
-        uniq.add(tuple(ticket))
-        results.append(eval_fn(ticket, src))
+        rank = ticket_rank(ticket)
+        if rank in seen: continue
+        seen.add(rank)
+        # świeży stan (bez sum przyrostowych) — wynik równy final_score z score_ticket
+        top.push(swap_scorer.state(ticket).score, rank, src)
+
+    _, ranks, sources = top.result()
+    results = [eval_fn(t, CANDIDATE_SOURCES[s]) for t, s in zip(unrank_tickets(ranks).astype(int).tolist(), sources.tolist())]
+    return results, top.pushed
+
+
+def build_candidates(
+    draws: List[List[int]], feature_df: pd.DataFrame, markov_matrix: np.ndarray,
+    profile: Dict, cfg: EngineConfig, progress_bar, status_text,
+    workers: Optional[int] = CANDIDATE_WORKERS
+) -> List[TicketMetrics]:
+    """
+    Budżet cfg.candidate_count dzielony na stałą liczbę shardów z seedami z SeedSequence(cfg.seed).spawn,
+    rankingi shardów (po cfg.n_tickets najlepszych) scalane bez powtórek. Wynik zależy tylko od seeda, nie od liczby CPU;
+    workers=1 = wersja szeregowa.
+    """
+    start_time = time.time()
+    args = (draws, feature_df, markov_matrix, profile, cfg)
+
+    if workers == 1:
+        def on_progress(i: int, target: int) -> None:
+            progress = int((i / target) * 100)
+            progress_bar.progress(progress)
+            status_text.write(f"⏳ Generowanie i optymalizacja kuponów: {progress}% (przeliczono {i} wektorów)...")
+
+        parts = map_shards(generate_candidates, cfg.candidate_count, cfg.seed, workers=1, args=args + (on_progress,))
+    else:
+        def on_shard(done: int, total: int) -> None:
+            progress = int((done / total) * 100)
+            progress_bar.progress(progress)
+            status_text.write(f"⏳ Generowanie i optymalizacja kuponów: {progress}% (gotowe shardy: {done}/{total})...")
+
+        status_text.write(
+            f"⏳ Generowanie i optymalizacja kuponów w {shard_processes(workers, cfg.candidate_count)} procesach..."
+        )
+        parts = map_shards(generate_candidates, cfg.candidate_count, cfg.seed, workers=workers, args=args, on_done=on_shard)
+
+    results = merge_ranked(
+        [p[0] for p in parts], key=lambda x: x.final_score, top_k=cfg.n_tickets, unique_key=lambda x: tuple(x.ticket)
+    )
 
-    results.sort(key=lambda x: x.final_score, reverse=True)
-    
     elapsed = time.time() - start_time
     progress_bar.progress(100)
-    status_text.success(f"✅ Przeliczono {len(results)} unikalnych kuponów w {elapsed:.2f} sekund!")
+    status_text.success(f"✅ Przeliczono {sum(p[1] for p in parts)} unikalnych kuponów w {elapsed:.2f} sekund!")
     return results
 
 
@@ -514,7 +652,8 @@ def main() -> None:
         st.stop()
 
     try:
-        all_records = load_records_cached(pdf_path.read_bytes())
+        pdf_stat = pdf_path.stat()
+        all_records = load_records_cached(str(pdf_path), (pdf_stat.st_size, pdf_stat.st_mtime_ns))
     except Exception as e:
         st.error(f"❌ Błąd PDF: {e}")
         st.stop()
@@ -549,7 +688,7 @@ def main() -> None:
         status_text = st.empty()
         
         metrics = build_candidates(draws, feature_df, markov_matrix, shape_profile, cfg, progress_bar, status_text)
-        st.session_state["metrics"] = metrics[:cfg.n_tickets]
+        st.session_state["metrics"] = metrics
 
     if st.session_state["metrics"]:
         st.markdown("### 🏆 Najlepsze zoptymalizowane kupony (TOP EV)")
@@ -0,0 +1,259 @@
+import random
+from dataclasses import dataclass, fields, replace
+from math import comb
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+NUM_MIN = 1
+NUM_MAX = 49
+PICK_COUNT = 6
+
+RandomLike = Union[random.Random, np.random.Generator]
+
+
+# =========================================================
+# RULES
+# =========================================================
+@dataclass(frozen=True)
+class TicketRules:
+    """
+    Twarde reguły kuponu (None = reguła wyłączona):
+    - even_counts: dozwolone liczby parzystych (pusta krotka = żaden kupon),
+    - max_adjacent_pairs: najwięcej par sąsiednich (różnica 1),
+    - max_run: najdłuższy dozwolony ciąg kolejnych liczb,
+    - max_decade_pairs: najwięcej par liczb w tej samej dziesiątce (n // 10).
+    """
+    even_counts: Optional[Tuple[int, ...]] = None
+    max_adjacent_pairs: Optional[int] = None
+    max_run: Optional[int] = None
+    max_decade_pairs: Optional[int] = None
+
+    def ok(self, ticket: Sequence[int]) -> bool:
+        nums = sorted(int(n) for n in ticket)
+        if self.even_counts is not None and sum(1 for n in nums if n % 2 == 0) not in self.even_counts:
+            return False
+        adjacent = run = longest = 0
+        for a, b in zip(nums, nums[1:]):
+            run = run + 1 if b == a + 1 else 0
+            adjacent += b == a + 1
+            longest = max(longest, run)
+        if self.max_adjacent_pairs is not None and adjacent > self.max_adjacent_pairs:
+            return False
+        if self.max_run is not None and nums and longest + 1 > self.max_run:
+            return False
+        if self.max_decade_pairs is not None:
+            buckets: Dict[int, int] = {}
+            for n in nums:
+                buckets[n // 10] = buckets.get(n // 10, 0) + 1
+            if sum(c * (c - 1) // 2 for c in buckets.values()) > self.max_decade_pairs:
+                return False
+        return True
+
+
+# =========================================================
+# SAMPLER
+# =========================================================
+class ConstrainedSampler:
+    """
+    Kupony spełniające TicketRules budowane wprost, bez losowania "na ślepo" i odrzucania.
+
+    stages = [(pula, ile), ...] opisuje oryginalny generator: kolejno `ile` liczb równomiernie z puli
+    bez liczb wybranych we wcześniejszych etapach (jak pick_unique hot → pick_unique cold bez h).
+    Dla danych stages (jednego trybu generatora) wynik ma dokładnie ten sam rozkład co
+    "losuj wg stages, odrzucaj kupony łamiące reguły", ale koszt kuponu jest stały (jedno przejście 1..49) niezależnie od ostrości reguł.
+
+    Liczby przechodzimy rosnąco; stan = ile wybrano w każdym etapie + to, czego potrzebują reguły
+    (parzyste, bieżący ciąg, pary sąsiednie, liczebność bieżącej dziesiątki, pary w dziesiątkach).
+    f(n, stan) = ważona liczba dokończeń (memo), waga etykietowanego wyboru = prawd. oryginału
+    Π 1 / C(|pula_g| - już zajęte w pula_g, ile_g). Losowanie: dla n kolejno pomiń / weź do etapu g
+    z prawd. proporcjonalnym do f następnego stanu.
+    """
+
+    def __init__(self, stages: Sequence[Tuple[Sequence[int], int]], rules: TicketRules):
+        stages = [(sorted(set(int(n) for n in pool)), int(k)) for pool, k in stages if int(k) > 0]
+        if sum(k for _, k in stages) != PICK_COUNT:
+            raise ValueError(f"Etapy muszą dawać razem {PICK_COUNT} liczb.")
+        for pool, k in stages:
+            if len(pool) < k:
+                raise ValueError("Za mało liczb w puli, aby wylosować unikalny zestaw.")
+            if pool[0] < NUM_MIN or pool[-1] > NUM_MAX:
+                raise ValueError(f"Liczby w puli muszą być z zakresu {NUM_MIN}..{NUM_MAX}.")
+
+        self.rules = rules
+        self.stages = stages
+        self.takes = tuple(k for _, k in stages)
+        self.sizes = tuple(len(pool) for pool, _ in stages)
+        g_count = len(stages)
+        pools = [set(pool) for pool, _ in stages]
+
+        # dla każdej liczby: etapy, do których może trafić
+        self._stages_of: List[Tuple[int, ...]] = [()] * (NUM_MAX + 2)
+        for n in range(NUM_MIN, NUM_MAX + 1):
+            self._stages_of[n] = tuple(g for g in range(g_count) if n in pools[g])
+        # ile liczb puli g jest >= n (odcinanie gałęzi bez szans na dobranie etapu)
+        self._left = [[0] * g_count for _ in range(NUM_MAX + 2)]
+        self._left_any = [0] * (NUM_MAX + 2)
+        for n in range(NUM_MAX, NUM_MIN - 1, -1):
+            self._left[n] = [self._left[n + 1][g] + (n in pools[g]) for g in range(g_count)]
+            self._left_any[n] = self._left_any[n + 1] + bool(self._stages_of[n])
+        # zajętość liczona tylko dla etapów, których pula nachodzi na wcześniejsze
+        self._tracks_taken = tuple(any(pools[g] & pools[h] for h in range(g)) for g in range(g_count))
+
+        evens = rules.even_counts
+        self._even_lo = min(evens) if evens else 0
+        self._even_hi = max(evens) if evens else PICK_COUNT
+        self._memo: Dict[tuple, float] = {}
+        self._moves: Dict[tuple, Tuple[List[Tuple[int, tuple]], List[float]]] = {}
+        self._blocking: Optional[Tuple[str, ...]] = None
+        self._start = (tuple([0] * g_count), tuple([0] * g_count), 0, 0, 0, 0, 0)
+        # suma wag = prawd., że kupon oryginalnego generatora spełni reguły
+        self.total = self._count(NUM_MIN, self._start) if evens != () else 0.0
+
+    @property
+    def feasible(self) -> bool:
+        return self.total > 0
+
+    def blocking_rules(self) -> Tuple[str, ...]:
+        """
+        Gdy żaden kupon nie spełnia reguł: nazwy pól TicketRules, z których każde osobno wyklucza wszystkie
+        kupony; gdy żadne osobno nie wyklucza — wszystkie włączone (wyklucza dopiero ich połączenie).
+        Pusta krotka, gdy kupony istnieją.
+        """
+        if self.feasible:
+            return ()
+        if self._blocking is None:
+            active = [f.name for f in fields(self.rules) if getattr(self.rules, f.name) is not None]
+            off = TicketRules()
+            alone = tuple(
+                name for name in active
+                if not ConstrainedSampler(self.stages, replace(off, **{name: getattr(self.rules, name)})).feasible
+            )
+            self._blocking = alone or tuple(active)
+        return self._blocking
+
+    def _step(self, n: int, state: tuple, g: int) -> Optional[tuple]:
+        """
+        Stan po wzięciu n do etapu g (g < 0 = pominięcie n); None gdy reguła już złamana.
+        """
+        counts, taken, evens, run, adjacent, decade, decade_pairs = state
+        rules = self.rules
+        if n % 10 == 0:
+            decade = 0
+        if g < 0:
+            return counts, taken, evens, 0, adjacent, decade, decade_pairs
+
+        counts = counts[:g] + (counts[g] + 1,) + counts[g + 1:]
+        if any(self._tracks_taken[h] for h in range(g + 1, len(counts))):
+            taken = tuple(
+                t + (h > g and self._tracks_taken[h] and h in self._stages_of[n])
+                for h, t in enumerate(taken)
+            )
+        if rules.even_counts is not None:
+            evens += n % 2 == 0
+            picked = sum(counts)
+            if evens > self._even_hi or picked - evens > PICK_COUNT - self._even_lo:
+                return None
+        if run:
+            adjacent += 1
+            if rules.max_adjacent_pairs is not None and adjacent > rules.max_adjacent_pairs:
+                return None
+        run += 1
+        if rules.max_run is not None:
+            if run > rules.max_run:
+                return None
+        elif rules.max_adjacent_pairs is None:
+            run = 0
+        else:
+            run = 1
+        if rules.max_decade_pairs is not None:
+            decade_pairs += decade
+            decade += 1
+            if decade_pairs > rules.max_decade_pairs:
+                return None
+        if rules.max_adjacent_pairs is None:
+            adjacent = 0
+        return counts, taken, evens, run, adjacent, decade, decade_pairs
+
+    def _weight(self, taken: Tuple[int, ...]) -> float:
+        w = 1.0
+        for size, k, t in zip(self.sizes, self.takes, taken):
+            if size - t < k:
+                return 0.0
+            w /= comb(size - t, k)
+        return w
+
+    def _options(self, n: int, state: tuple) -> List[Tuple[int, tuple]]:
+        out = []
+        nxt = self._step(n, state, -1)
+        out.append((-1, nxt))
+        counts = state[0]
+        for g in self._stages_of[n]:
+            if counts[g] < self.takes[g]:
+                nxt = self._step(n, state, g)
+                if nxt is not None:
+                    out.append((g, nxt))
+        return out
+
+    def _count(self, n: int, state: tuple) -> float:
+        counts = state[0]
+        if n > NUM_MAX:
+            if counts != self.takes:
+                return 0.0
+            if self.rules.even_counts is not None and state[2] not in self.rules.even_counts:
+                return 0.0
+            return self._weight(state[1])
+        need = [k - c for k, c in zip(self.takes, counts)]
+        if sum(need) > self._left_any[n] or any(r > left for r, left in zip(need, self._left[n])):
+            return 0.0
+
+        key = (n, state)
+        cached = self._memo.get(key)
+        if cached is not None:
+            return cached
+        total = sum(self._count(n + 1, nxt) for _, nxt in self._options(n, state))
+        self._memo[key] = total
+        return total
+
+    def _choices(self, n: int, state: tuple) -> Tuple[List[Tuple[int, tuple]], List[float]]:
+        """
+        Wykonalne ruchy z (n, stan) + skumulowane wagi (memo — kolejne kupony nie liczą ich od nowa).
+        """
+        key = (n, state)
+        cached = self._moves.get(key)
+        if cached is None:
+            options, weights, acc = [], [], 0.0
+            for g, nxt in self._options(n, state):
+                w = self._count(n + 1, nxt)
+                if w > 0:
+                    acc += w
+                    options.append((g, nxt))
+                    weights.append(acc)
+            cached = self._moves[key] = (options, weights)
+        return cached
+
+    def sample(self, rng: RandomLike = random) -> List[int]:
+        """
+        Jeden kupon (posortowany). rng: random.Random / moduł random albo np.random.Generator.
+        """
+        if not self.feasible:
+            raise ValueError("Żaden kupon nie spełnia reguł dla tych pul.")
+        ticket: List[int] = []
+        state = self._start
+        for n in range(NUM_MIN, NUM_MAX + 1):
+            options, weights = self._choices(n, state)
+            u = rng.random() * weights[-1]
+            i = 0
+            while i < len(weights) - 1 and u >= weights[i]:
+                i += 1
+            g, state = options[i]
+            if g >= 0:
+                ticket.append(n)
+        return ticket
+
+    def sample_many(self, count: int, rng: RandomLike = random) -> List[List[int]]:
+        return [self.sample(rng) for _ in range(count)]
@@ -0,0 +1,214 @@
+from functools import lru_cache
+from itertools import combinations
+from math import comb
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+
+from draw_history import DrawHistory
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+NUM_MIN = 1
+NUM_MAX = 49
+SIZE = NUM_MAX + 1
+MAX_ORDER = 4
+
+QUAD_COUNT = comb(NUM_MAX, 4)
+
+# BINOM[x, k] = C(x, k) — do rangi kombinatorycznej (colex)
+BINOM = np.array([[comb(x, k) for k in range(MAX_ORDER + 1)] for x in range(SIZE)], dtype=np.int64)
+
+
+# =========================================================
+# INDEX HELPERS
+# =========================================================
+@lru_cache(maxsize=None)
+def _position_combinations(length: int, k: int) -> np.ndarray:
+    return np.array(list(combinations(range(length), k)), dtype=np.int64).reshape(-1, k)
+
+
+@lru_cache(maxsize=1)
+def _quad_table() -> np.ndarray:
+    """
+    Wszystkie czwórki 1..49 w kolejności rangi colex: _quad_table()[rank] -> (a, b, c, d).
+    """
+    arr = np.array(list(combinations(range(NUM_MIN, NUM_MAX + 1), 4)), dtype=np.uint8)
+    return arr[quad_rank(arr).argsort()]
+
+
+def quad_rank(quads: np.ndarray) -> np.ndarray:
+    """
+    Ranga colex posortowanych czwórek (…, 4) liczb 1..49 → 0..C(49,4)-1.
+    """
+    x = np.asarray(quads, dtype=np.int64) - NUM_MIN
+    return (
+        BINOM[x[..., 0], 1] +
+        BINOM[x[..., 1], 2] +
+        BINOM[x[..., 2], 3] +
+        BINOM[x[..., 3], 4]
+    )
+
+
+def _sorted_rows(draws: Sequence[Sequence[int]]) -> List[np.ndarray]:
+    """
+    Losowania pogrupowane wg długości jako posortowane tablice (N_L, L).
+    """
+    groups = {}
+    for d in draws:
+        s = sorted(set(int(x) for x in d))
+        groups.setdefault(len(s), []).append(s)
+    return [np.array(rows, dtype=np.int64) for _, rows in sorted(groups.items())]
+
+
+# =========================================================
+# CO-OCCURRENCE
+# =========================================================
+class CoOccurrence:
+    """
+    Gęste liczniki współwystępowania liczb w losowaniach:
+    - pairs:   (50, 50) symetryczna macierz par,
+    - triples: (50, 50, 50) wypełniona dla a < b < c,
+    - quads:   (C(49,4),) indeksowana rangą colex czwórki.
+    Zastępuje Countery kluczowane krotkami; odczyty to wektorowe gathery.
+    """
+
+    def __init__(self, draws: Union[Sequence[Sequence[int]], DrawHistory], max_order: int = MAX_ORDER):
+        if not 2 <= max_order <= MAX_ORDER:
+            raise ValueError(f"max_order musi być w zakresie 2..{MAX_ORDER}")
+
+        self.max_order = max_order
+        self.total_draws = len(draws)
+
+        if isinstance(draws, DrawHistory):
+            incidence = draws.incidence.astype(np.float64)
+            row_groups = [draws.numbers.astype(np.int64)]
+        else:
+            incidence = np.zeros((len(draws), SIZE), dtype=np.float64)
+            for i, d in enumerate(draws):
+                incidence[i, list(d)] = 1.0
+            row_groups = _sorted_rows(draws)
+
+        self.pairs = (incidence.T @ incidence).astype(np.int32)
+        np.fill_diagonal(self.pairs, 0)
+
+        self.triples = np.zeros((SIZE, SIZE, SIZE), dtype=np.int32) if max_order >= 3 else None
+        self.quads = np.zeros(QUAD_COUNT, dtype=np.int32) if max_order >= 4 else None
+
+        for rows in row_groups:
+            length = rows.shape[1]
+            if self.triples is not None and length >= 3:
+                cols = rows[:, _position_combinations(length, 3)]
+                flat = (cols[..., 0] * SIZE + cols[..., 1]) * SIZE + cols[..., 2]
+                self.triples += np.bincount(flat.ravel(), minlength=SIZE ** 3).reshape(SIZE, SIZE, SIZE).astype(np.int32)
+            if self.quads is not None and length >= 4:
+                ranks = quad_rank(rows[:, _position_combinations(length, 4)])
+                self.quads += np.bincount(ranks.ravel(), minlength=QUAD_COUNT).astype(np.int32)
+
+    def add_draw(self, nums: Sequence[int]) -> None:
+        """
+        Przyrostowo dolicza jedno losowanie: C(6,2) + C(6,3) + C(6,4) inkrementów.
+        """
+        self._update(nums, 1)
+
+    def remove_draw(self, nums: Sequence[int]) -> None:
+        """
+        Odwrotność add_draw — wycofuje losowanie, które wypada z okna historii.
+        """
+        self._update(nums, -1)
+
+    def _update(self, nums: Sequence[int], step: int) -> None:
+        row = np.array(sorted(set(int(x) for x in nums)), dtype=np.int64)
+        length = len(row)
+        self.total_draws += step
+
+        if length >= 2:
+            cols = row[_position_combinations(length, 2)]
+            np.add.at(self.pairs, (cols[:, 0], cols[:, 1]), step)
+            np.add.at(self.pairs, (cols[:, 1], cols[:, 0]), step)
+        if self.triples is not None and length >= 3:
+            cols = row[_position_combinations(length, 3)]
+            np.add.at(self.triples, (cols[:, 0], cols[:, 1], cols[:, 2]), step)
+        if self.quads is not None and length >= 4:
+            np.add.at(self.quads, quad_rank(row[_position_combinations(length, 4)]), step)
+
+    # -----------------------------------------------------
+    # odczyty
+    # -----------------------------------------------------
+    def _check_order(self, k: int) -> None:
+        if not 2 <= k <= self.max_order:
+            raise ValueError(f"Brak liczników rzędu {k} (max_order={self.max_order})")
+
+    def _gather(self, cols: np.ndarray, k: int) -> np.ndarray:
+        if k == 2:
+            return self.pairs[cols[..., 0], cols[..., 1]]
+        if k == 3:
+            return self.triples[cols[..., 0], cols[..., 1], cols[..., 2]]
+        return self.quads[quad_rank(cols)]
+
+    def count(self, combo: Sequence[int]) -> int:
+        k = len(combo)
+        self._check_order(k)
+        return int(self._gather(np.array(sorted(combo), dtype=np.int64), k))
+
+    def combo_counts(self, tickets: np.ndarray, k: int) -> np.ndarray:
+        """
+        Liczniki wszystkich k-podzbiorów kuponów: (M, L) → (M, C(L, k)).
+        """
+        self._check_order(k)
+        t = np.sort(np.asarray(tickets, dtype=np.int64), axis=-1)
+        return self._gather(t[..., _position_combinations(t.shape[-1], k)], k)
+
+    def combo_sum(self, tickets: Union[np.ndarray, Sequence[int]], k: int) -> Union[np.ndarray, int]:
+        """
+        Suma liczników k-podzbiorów; dla pojedynczego kuponu zwraca int.
+        """
+        sums = self.combo_counts(tickets, k).sum(axis=-1)
+        return int(sums) if np.ndim(sums) == 0 else sums
+
+    def max_count(self, k: int) -> int:
+        self._check_order(k)
+        arr = {2: self.pairs, 3: self.triples, 4: self.quads}[k]
+        return int(arr.max()) if arr.size else 0
+
+    def number_totals(self, k: int) -> np.ndarray:
+        """
+        Dla każdej liczby: suma liczników k-krotek, w których występuje (indeks = liczba).
+        """
+        self._check_order(k)
+        if k == 2:
+            return self.pairs.sum(axis=1)
+        if k == 3:
+            t = self.triples
+            return t.sum(axis=(1, 2)) + t.sum(axis=(0, 2)) + t.sum(axis=(0, 1))
+        table = _quad_table()
+        totals = np.zeros(SIZE, dtype=np.int64)
+        for i in range(4):
+            totals += np.bincount(table[:, i], weights=self.quads, minlength=SIZE).astype(np.int64)
+        return totals
+
+    def most_common(self, k: int, n: int) -> List[Tuple[Tuple[int, ...], int]]:
+        """
+        Jak Counter.most_common: top n krotek rzędu k; remisy w kolejności leksykograficznej.
+        """
+        self._check_order(k)
+        if k == 2:
+            a, b = np.triu_indices(SIZE, 1)
+            counts = self.pairs[a, b]
+            keys = np.stack([a, b], axis=1)
+        elif k == 3:
+            flat = np.flatnonzero(self.triples)
+            counts = self.triples.ravel()[flat]
+            keys = np.stack(np.unravel_index(flat, self.triples.shape), axis=1)
+        else:
+            ranks = np.flatnonzero(self.quads)
+            counts = self.quads[ranks]
+            keys = _quad_table()[ranks].astype(np.int64)
+
+        keep = counts > 0
+        counts = counts[keep]
+        keys = keys[keep]
+        order = np.lexsort(tuple(keys[:, i] for i in reversed(range(k))) + (-counts,))[:n]
+        return [(tuple(int(x) for x in keys[i]), int(counts[i])) for i in order]
@@ -0,0 +1,135 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+NUM_MIN = 1
+NUM_MAX = 49
+PICK_COUNT = 6
+SIZE = NUM_MAX + 1
+
+
+def numbers_to_masks(numbers: np.ndarray) -> np.ndarray:
+    """
+    (…, k) liczby 1..49 → (…,) maski uint64 z ustawionym bitem n dla każdej liczby.
+    """
+    bits = np.left_shift(np.uint64(1), np.asarray(numbers, dtype=np.uint64))
+    return np.bitwise_or.reduce(bits, axis=-1)
+
+
+# =========================================================
+# DRAW HISTORY
+# =========================================================
+class DrawHistory:
+    """
+    Zwarta historia losowań 6/49, najnowsze pierwsze (indeks 0 = ostatnie losowanie):
+    - numbers:   (N, 6) uint8, posortowane rosnąco,
+    - incidence: (N, 50) bool, incidence[i, n] == liczba n padła w losowaniu i
+                 (ewentualne duplikaty z parsera liczone raz),
+    - masks:     (N,) uint64, bit n ustawiony dla każdej wylosowanej liczby.
+    """
+
+    def __init__(self, numbers: np.ndarray, draw_ids: Optional[np.ndarray] = None):
+        numbers = np.sort(np.asarray(numbers, dtype=np.uint8).reshape(-1, PICK_COUNT), axis=1)
+        if len(numbers) and (numbers.min() < NUM_MIN or numbers.max() > NUM_MAX):
+            raise ValueError(f"Liczby losowań muszą być z zakresu {NUM_MIN}..{NUM_MAX}.")
+        if draw_ids is not None and len(draw_ids) != len(numbers):
+            raise ValueError("Liczba numerów losowań nie zgadza się z liczbą losowań.")
+
+        self.numbers = np.ascontiguousarray(numbers)
+        self.draw_ids = None if draw_ids is None else np.asarray(draw_ids, dtype=np.int64)
+
+        self.incidence = np.zeros((len(numbers), SIZE), dtype=bool)
+        self.incidence[np.arange(len(numbers))[:, None], numbers] = True
+        self.masks = numbers_to_masks(numbers)
+
+    @classmethod
+    def from_draws(
+        cls,
+        draws: Sequence[Sequence[int]],
+        draw_ids: Optional[Sequence[int]] = None
+    ) -> "DrawHistory":
+        numbers = np.array([sorted(d) for d in draws], dtype=np.uint8).reshape(-1, PICK_COUNT)
+        return cls(numbers, None if draw_ids is None else np.array(draw_ids, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def window(self, size: int) -> "DrawHistory":
+        """
+        size najnowszych losowań — bez kopiowania tablic.
+        """
+        size = max(0, min(int(size), len(self)))
+        out = object.__new__(DrawHistory)
+        out.numbers = self.numbers[:size]
+        out.draw_ids = None if self.draw_ids is None else self.draw_ids[:size]
+        out.incidence = self.incidence[:size]
+        out.masks = self.masks[:size]
+        return out
+
+    def to_lists(self) -> List[List[int]]:
+        return self.numbers.astype(int).tolist()
+
+    # -----------------------------------------------------
+    # statystyki per liczba (tablice indeksowane liczbą, indeks 0 nieużywany)
+    # -----------------------------------------------------
+    def frequency(self) -> np.ndarray:
+        return self.incidence.sum(axis=0, dtype=np.int64)
+
+    def presence_pct(self) -> np.ndarray:
+        if len(self) == 0:
+            return np.zeros(SIZE, dtype=float)
+        return 100.0 * self.frequency() / len(self)
+
+    def last_seen(self, missing: int) -> np.ndarray:
+        """
+        Indeks najnowszego losowania z daną liczbą (0 = ostatnie), missing gdy nie padła.
+        """
+        if len(self) == 0:
+            return np.full(SIZE, missing, dtype=np.int64)
+        seen = self.incidence.any(axis=0)
+        return np.where(seen, self.incidence.argmax(axis=0), missing).astype(np.int64)
+
+
+# =========================================================
+# FREQUENCY INDEX
+# =========================================================
+class FrequencyIndex:
+    """
+    Indeks sum prefiksowych: cum[i, n] = liczba losowań z liczbą n wśród i najnowszych.
+    Częstość dowolnego okna to różnica dwóch wierszy, bez ponownego skanu historii.
+    """
+
+    def __init__(self, history: DrawHistory):
+        self.cum = np.zeros((len(history) + 1, SIZE), dtype=np.int32)
+        np.cumsum(history.incidence, axis=0, out=self.cum[1:])
+
+    def __len__(self) -> int:
+        return len(self.cum) - 1
+
+    def _bounds(self, size: Optional[int], start: int) -> Tuple[int, int]:
+        start = max(0, min(int(start), len(self)))
+        end = len(self) if size is None else max(start, min(start + int(size), len(self)))
+        return start, end
+
+    def counts(self, size: Optional[int] = None, start: int = 0) -> np.ndarray:
+        """
+        Liczniki w oknie [start, start + size) — size=None oznacza całą historię od start.
+        """
+        lo, hi = self._bounds(size, start)
+        return (self.cum[hi] - self.cum[lo]).astype(np.int64)
+
+    def rate(self, size: Optional[int] = None, start: int = 0) -> np.ndarray:
+        """
+        Udział losowań z daną liczbą w oknie (0..1); puste okno daje same zera.
+        """
+        lo, hi = self._bounds(size, start)
+        if hi == lo:
+            return np.zeros(SIZE, dtype=float)
+        return (self.cum[hi] - self.cum[lo]) / (hi - lo)
+
+    def windows(self, sizes: Sequence[Optional[int]]) -> Dict[Optional[int], np.ndarray]:
+        return {size: self.counts(size) for size in sizes}
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+STORE_VERSION = 1
+DEFAULT_STORE_DIR = Path(__file__).resolve().parent / ".draw_store"
+
+NUM_MIN = 1
+NUM_MAX = 49
+PICK_COUNT = 6
+MISSING_DRAW_NO = -1
+
+MANIFEST_FILE = "manifest.json"
+NUMBERS_FILE = "numbers.npy"
+DRAW_NOS_FILE = "draw_nos.npy"
+COLUMNS_FILE = "columns.json"
+
+Row = Dict[str, object]
+
+
+def pdf_sha256(pdf_bytes: bytes) -> str:
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def file_stamp(path: Union[str, Path]) -> Dict[str, object]:
+    """
+    Tani odcisk pliku (ścieżka, rozmiar, mtime) — pozwala pominąć hashowanie niezmienionego PDF.
+    """
+    st = os.stat(path)
+    return {"path": str(Path(path).resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _write_atomic(path: Path, write: Callable[[Path], None]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+# =========================================================
+# DRAW STORE
+# =========================================================
+class DrawStore:
+    """
+    Lokalny magazyn sparsowanych losowań, kluczowany hashem SHA-256 zawartości PDF:
+    - numbers.npy:  (N, 6) uint8, ładowane przez memory-map,
+    - draw_nos.npy: (N,) int64, -1 = brak numeru losowania,
+    - columns.json: opcjonalne kolumny tekstowe (np. date_str, date_iso),
+    - manifest.json: hash PDF, odcisk pliku, liczba losowań, wersja formatu.
+    Wiersze mają postać {"draw_no": Optional[int], "nums": List[int], ...kolumny tekstowe}.
+    Importer (parser PDF) uruchamiany jest tylko, gdy zmienił się hash pliku.
+    """
+
+    def __init__(self, namespace: str, root: Union[str, Path] = DEFAULT_STORE_DIR, schema: int = 1):
+        self.dir = Path(root) / namespace
+        self.schema = schema
+
+    # -----------------------------------------------------
+    # manifest
+    # -----------------------------------------------------
+    def _read_manifest(self) -> Optional[Dict]:
+        try:
+            with open(self.dir / MANIFEST_FILE, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != STORE_VERSION or manifest.get("schema") != self.schema:
+            return None
+        return manifest
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        def write(tmp: Path):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+
+        _write_atomic(self.dir / MANIFEST_FILE, write)
+
+    # -----------------------------------------------------
+    # odczyt / zapis
+    # -----------------------------------------------------
+    def load(self, pdf_hash: str) -> Optional[List[Row]]:
+        """
+        Wiersze zapisane dla danego hasha PDF albo None, gdy magazyn jest pusty lub nieaktualny.
+        """
+        manifest = self._read_manifest()
+        if manifest is None or manifest.get("sha256") != pdf_hash:
+            return None
+        return self._load_rows(manifest)
+
+    def _load_rows(self, manifest: Dict) -> Optional[List[Row]]:
+        try:
+            numbers = np.load(self.dir / NUMBERS_FILE, mmap_mode="r")
+            draw_nos = np.load(self.dir / DRAW_NOS_FILE, mmap_mode="r")
+            columns: Dict[str, List[str]] = {}
+            if manifest.get("columns"):
+                with open(self.dir / COLUMNS_FILE, "r", encoding="utf-8") as f:
+                    columns = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        count = manifest.get("count")
+        if len(numbers) != count or len(draw_nos) != count or any(len(v) != count for v in columns.values()):
+            return None
+
+        keys = ("draw_no", "nums") + tuple(columns)
+        draw_no_list = [None if no == MISSING_DRAW_NO else no for no in draw_nos.tolist()]
+        return [dict(zip(keys, values)) for values in zip(draw_no_list, numbers.tolist(), *columns.values())]
+
+    def save(self, pdf_hash: str, rows: List[Row], stamp: Optional[Dict] = None) -> bool:
+        """
+        Zapisuje wiersze; False gdy nie pasują do formatu 6/49 albo katalog jest niezapisywalny.
+        """
+        if any(len(r["nums"]) != PICK_COUNT for r in rows):
+            return False
+
+        numbers = np.array([r["nums"] for r in rows], dtype=np.int64).reshape(-1, PICK_COUNT)
+        if len(numbers) and (numbers.min() < NUM_MIN or numbers.max() > NUM_MAX):
+            return False
+
+        draw_nos = np.array(
+            [MISSING_DRAW_NO if r["draw_no"] is None else int(r["draw_no"]) for r in rows],
+            dtype=np.int64,
+        )
+        names = sorted({k for r in rows for k in r} - {"draw_no", "nums"})
+        columns = {name: [str(r.get(name, "")) for r in rows] for name in names}
+
+        manifest = {
+            "version": STORE_VERSION,
+            "schema": self.schema,
+            "sha256": pdf_hash,
+            "count": len(rows),
+            "columns": names,
+            "source": stamp,
+        }
+
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            # manifest znika pierwszy i wraca ostatni — przerwany zapis nie zostawi
+            # manifestu wskazującego na niekompletne dane
+            (self.dir / MANIFEST_FILE).unlink(missing_ok=True)
+            _write_atomic(self.dir / NUMBERS_FILE, lambda tmp: _save_npy(tmp, numbers.astype(np.uint8)))
+            _write_atomic(self.dir / DRAW_NOS_FILE, lambda tmp: _save_npy(tmp, draw_nos))
+            if names:
+                def write_columns(tmp: Path):
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        json.dump(columns, f, ensure_ascii=False)
+
+                _write_atomic(self.dir / COLUMNS_FILE, write_columns)
+            self._write_manifest(manifest)
+        except OSError:
+            return False
+        return True
+
+    # -----------------------------------------------------
+    # import tylko przy zmianie PDF
+    # -----------------------------------------------------
+    def load_or_import(
+        self,
+        pdf_bytes: bytes,
+        importer: Callable[[bytes], List[Row]],
+        pdf_hash: Optional[str] = None,
+        stamp: Optional[Dict] = None
+    ) -> List[Row]:
+        pdf_hash = pdf_hash or pdf_sha256(pdf_bytes)
+        manifest = self._read_manifest()
+        if manifest is not None and manifest.get("sha256") == pdf_hash:
+            rows = self._load_rows(manifest)
+            if rows is not None:
+                if stamp is not None and manifest.get("source") != stamp:
+                    manifest["source"] = stamp
+                    try:
+                        self._write_manifest(manifest)
+                    except OSError:
+                        pass
+                return rows
+
+        rows = importer(pdf_bytes)
+        self.save(pdf_hash, rows, stamp)
+        return rows
+
+    def load_path(self, pdf_path: Union[str, Path]) -> Optional[List[Row]]:
+        """
+        Wiersze dla pliku na dysku bez hashowania, gdy rozmiar i mtime zgadzają się z manifestem.
+        """
+        manifest = self._read_manifest()
+        if manifest is None or manifest.get("source") != file_stamp(pdf_path):
+            return None
+        return self._load_rows(manifest)
+
+    def load_or_import_path(self, pdf_path: Union[str, Path], importer: Callable[[bytes], List[Row]]) -> List[Row]:
+        """
+        Jak load_or_import, ale dla pliku na dysku: przy niezmienionym rozmiarze i mtime
+        PDF nie jest nawet czytany ani hashowany.
+        """
+        rows = self.load_path(pdf_path)
+        if rows is not None:
+            return rows
+
+        return self.load_or_import(Path(pdf_path).read_bytes(), importer, stamp=file_stamp(pdf_path))
+
+
+def _save_npy(path: Path, arr: np.ndarray) -> None:
+    with open(path, "wb") as f:
+        np.save(f, arr)
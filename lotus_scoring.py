@@ -0,0 +1,561 @@
+import os
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import combinations
+from math import comb
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ticket_codec import BINOM, unrank_tickets
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+NUM_MIN = 1
+NUM_MAX = 49
+PICK_COUNT = 6
+LOW_HIGH_THRESHOLD = 24
+
+TOTAL_TICKETS = comb(NUM_MAX, PICK_COUNT)
+
+PAIR_INDEX = list(combinations(range(PICK_COUNT), 2))
+TRIPLE_INDEX = list(combinations(range(PICK_COUNT), 3))
+
+
+# =========================================================
+# SCORE TABLES
+# =========================================================
+@dataclass
+class ScoreTables:
+    """
+    Tablice NumPy odpowiadające argumentom score_ticket z LotusWygranus.
+    Indeksowane bezpośrednio liczbą 1..49 (indeks 0 nieużywany).
+    """
+    freq_norm: np.ndarray        # (50,)
+    momentum_norm: np.ndarray    # (50,)
+    gap_norm: np.ndarray         # (50,)
+    pair_weights: np.ndarray     # (50, 50) symetryczna
+    triple_weights: np.ndarray   # (50, 50, 50) wypełniona dla x < y < z
+    recent_incidence: np.ndarray  # (R, 50) bool
+    target_even: int
+    target_odd: int
+    target_low: int
+    target_high: int
+    target_spread: float
+    target_sum: float
+    target_adj_pairs: float
+    max_recent_overlap: int
+
+
+def build_score_tables(
+    feature_df: pd.DataFrame,
+    pair_map: Dict[Tuple[int, int], float],
+    triple_map: Dict[Tuple[int, int, int], float],
+    profile: Dict,
+    recent_draws: List[List[int]],
+    max_recent_overlap: int
+) -> ScoreTables:
+    size = NUM_MAX + 1
+
+    def column(name: str) -> np.ndarray:
+        arr = np.zeros(size, dtype=float)
+        arr[feature_df["Liczba"].to_numpy(dtype=int)] = feature_df[name].to_numpy(dtype=float)
+        return arr
+
+    pair_weights = np.zeros((size, size), dtype=float)
+    for (a, b), v in pair_map.items():
+        pair_weights[a, b] = v
+        pair_weights[b, a] = v
+
+    triple_weights = np.zeros((size, size, size), dtype=float)
+    for (a, b, c), v in triple_map.items():
+        triple_weights[a, b, c] = v
+
+    recent_incidence = np.zeros((len(recent_draws), size), dtype=bool)
+    for i, d in enumerate(recent_draws):
+        recent_incidence[i, list(d)] = True
+
+    target_ev, target_od = profile["target_even_odd"]
+    target_low, target_high = profile["target_low_high"]
+
+    return ScoreTables(
+        freq_norm=column("FreqAll_Norm"),
+        momentum_norm=column("Momentum_Norm"),
+        gap_norm=column("GapRatio_Norm"),
+        pair_weights=pair_weights,
+        triple_weights=triple_weights,
+        recent_incidence=recent_incidence,
+        target_even=int(target_ev),
+        target_odd=int(target_od),
+        target_low=int(target_low),
+        target_high=int(target_high),
+        target_spread=float(profile["target_spread"]),
+        target_sum=float(profile["target_sum"]),
+        target_adj_pairs=float(profile["target_adj_pairs"]),
+        max_recent_overlap=int(max_recent_overlap),
+    )
+
+
+# =========================================================
+# SHARED KERNEL PIECES
+# =========================================================
+def _shape_and_penalties(
+    tables: ScoreTables,
+    ev: np.ndarray,
+    low: np.ndarray,
+    spread: np.ndarray,
+    total: np.ndarray,
+    adj_pairs: np.ndarray,
+    run3: np.ndarray,
+    run4: np.ndarray,
+    recent_overlap: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    od = PICK_COUNT - ev
+    high = PICK_COUNT - low
+
+    even_odd_pen = np.abs(ev - tables.target_even) + np.abs(od - tables.target_odd)
+    low_high_pen = np.abs(low - tables.target_low) + np.abs(high - tables.target_high)
+    spread_pen = np.abs(spread - tables.target_spread) / 25.0
+    sum_pen = np.abs(total - tables.target_sum) / 45.0
+    adj_pen = np.abs(adj_pairs - tables.target_adj_pairs) / 2.0
+
+    shape_score = np.maximum(
+        0.0,
+        1.0 - (even_odd_pen * 0.10 + low_high_pen * 0.10 + spread_pen * 0.10 + sum_pen * 0.12 + adj_pen * 0.08)
+    )
+
+    mro = tables.max_recent_overlap
+    recent_overlap_penalty = np.where(
+        recent_overlap > mro,
+        (recent_overlap - mro) * 0.30,
+        recent_overlap * 0.05
+    )
+
+    diversity_penalty = np.where(run4, 0.65, np.where(run3, 0.28, 0.0))
+    diversity_penalty = diversity_penalty + np.where(adj_pairs >= 3, 0.20, 0.0)
+    diversity_penalty = diversity_penalty + np.where((ev == 0) | (ev == PICK_COUNT), 0.40, 0.0)
+    diversity_penalty = diversity_penalty + np.where((low == 0) | (low == PICK_COUNT), 0.35, 0.0)
+
+    return shape_score, diversity_penalty, recent_overlap_penalty
+
+
+def _shape_and_penalties_scalar(
+    tables: ScoreTables,
+    ev: int,
+    low: int,
+    spread: int,
+    total: int,
+    adj_pairs: int,
+    run3: bool,
+    run4: bool,
+    recent_overlap: int
+) -> Tuple[float, float, float]:
+    """
+    Skalarny odpowiednik _shape_and_penalties dla jednego kuponu (bez narzutu NumPy) — wzory muszą być identyczne.
+    """
+    od = PICK_COUNT - ev
+    high = PICK_COUNT - low
+
+    even_odd_pen = abs(ev - tables.target_even) + abs(od - tables.target_odd)
+    low_high_pen = abs(low - tables.target_low) + abs(high - tables.target_high)
+    spread_pen = abs(spread - tables.target_spread) / 25.0
+    sum_pen = abs(total - tables.target_sum) / 45.0
+    adj_pen = abs(adj_pairs - tables.target_adj_pairs) / 2.0
+
+    shape_score = max(
+        0.0,
+        1.0 - (even_odd_pen * 0.10 + low_high_pen * 0.10 + spread_pen * 0.10 + sum_pen * 0.12 + adj_pen * 0.08)
+    )
+
+    mro = tables.max_recent_overlap
+    if recent_overlap > mro:
+        recent_overlap_penalty = (recent_overlap - mro) * 0.30
+    else:
+        recent_overlap_penalty = recent_overlap * 0.05
+
+    diversity_penalty = 0.65 if run4 else (0.28 if run3 else 0.0)
+    diversity_penalty = diversity_penalty + (0.20 if adj_pairs >= 3 else 0.0)
+    diversity_penalty = diversity_penalty + (0.40 if ev in (0, PICK_COUNT) else 0.0)
+    diversity_penalty = diversity_penalty + (0.35 if low in (0, PICK_COUNT) else 0.0)
+
+    return shape_score, diversity_penalty, recent_overlap_penalty
+
+
+def _number_weights(tables: ScoreTables) -> np.ndarray:
+    return (
+        tables.freq_norm * 1.65 +
+        tables.momentum_norm * 2.20 +
+        tables.gap_norm * 0.85
+    ) / PICK_COUNT
+
+
+# =========================================================
+# BATCH SCORING
+# =========================================================
+def score_tickets_batch(tickets: np.ndarray, tables: ScoreTables) -> Dict[str, np.ndarray]:
+    """
+    Wektorowy odpowiednik score_ticket dla M kuponów naraz (tablica M x 6).
+    Zwraca kolumny o nazwach pól TicketMetrics, zaokrąglone jak w wersji skalarnej.
+    """
+    t = np.sort(np.asarray(tickets, dtype=np.int64).reshape(-1, PICK_COUNT), axis=1)
+    cols = [t[:, i] for i in range(PICK_COUNT)]
+
+    freq_score = tables.freq_norm[t].sum(axis=1) / PICK_COUNT
+    momentum_score = tables.momentum_norm[t].sum(axis=1) / PICK_COUNT
+    overdue_score = tables.gap_norm[t].sum(axis=1) / PICK_COUNT
+
+    pair_score = sum(tables.pair_weights[cols[i], cols[j]] for i, j in PAIR_INDEX) / len(PAIR_INDEX)
+    triple_score = sum(
+        tables.triple_weights[cols[i], cols[j], cols[k]] for i, j, k in TRIPLE_INDEX
+    ) / len(TRIPLE_INDEX)
+
+    ev = (t % 2 == 0).sum(axis=1)
+    low = (t <= LOW_HIGH_THRESHOLD).sum(axis=1)
+    spread = cols[-1] - cols[0]
+    sum_total = t.sum(axis=1)
+    d = np.diff(t, axis=1) == 1
+    adj_pairs = d.sum(axis=1)
+    run3 = (d[:, :-1] & d[:, 1:]).any(axis=1)
+    run4 = (d[:, :-2] & d[:, 1:-1] & d[:, 2:]).any(axis=1)
+
+    if len(tables.recent_incidence):
+        recent_overlap = tables.recent_incidence[:, t].sum(axis=2).max(axis=0)
+    else:
+        recent_overlap = np.zeros(len(t), dtype=np.int64)
+
+    shape_score, diversity_penalty, recent_overlap_penalty = _shape_and_penalties(
+        tables, ev, low, spread, sum_total, adj_pairs, run3, run4, recent_overlap
+    )
+
+    final_score = (
+        freq_score * 1.65 +
+        momentum_score * 2.20 +
+        overdue_score * 0.85 +
+        pair_score * 0.90 +
+        triple_score * 1.10 +
+        shape_score * 1.55
+        - diversity_penalty
+        - recent_overlap_penalty
+    )
+
+    return {
+        "ticket": t,
+        "final_score": np.round(final_score, 6),
+        "freq_score": np.round(freq_score, 6),
+        "momentum_score": np.round(momentum_score, 6),
+        "overdue_score": np.round(overdue_score, 6),
+        "pair_score": np.round(pair_score, 6),
+        "triple_score": np.round(triple_score, 6),
+        "shape_score": np.round(shape_score, 6),
+        "diversity_penalty": np.round(diversity_penalty, 6),
+        "recent_overlap_penalty": np.round(recent_overlap_penalty, 6),
+        "ev": ev,
+        "od": PICK_COUNT - ev,
+        "low": low,
+        "high": PICK_COUNT - low,
+        "spread": spread,
+        "consecutive_pairs": adj_pairs,
+        "sum_total": sum_total,
+    }
+
+
+# =========================================================
+# DELTA SCORING (local search)
+# =========================================================
+class SwapScorer:
+    """
+    Ocena ruchów "usuń x, dodaj y" bez przeliczania całego kuponu.
+    Tablice liczone raz na ScoreTables; stan kuponu trzyma TicketState.
+    """
+
+    def __init__(self, tables: ScoreTables):
+        self.tables = tables
+        self.u = _number_weights(tables)
+        self.w2 = tables.pair_weights * (0.90 / len(PAIR_INDEX))
+        # pełna symetria w3[x, y, z] dla dowolnej kolejności, zera dla powtórzonych indeksów
+        w3 = tables.triple_weights * (1.10 / len(TRIPLE_INDEX))
+        self.w3 = sum(w3.transpose(p) for p in ((0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0)))
+        self.recent = tables.recent_incidence.astype(np.int64)
+
+    def state(self, ticket: Sequence[int]) -> "TicketState":
+        return TicketState(self, ticket)
+
+
+class TicketState:
+    """
+    Kupon z sumami częściowymi:
+    - pair_sums[n]   = suma w2[n, r] po r z kuponu,
+    - triple_sums[n] = suma w3[n, r, s] po parach r < s z kuponu,
+    - recent_counts  = część wspólna z każdym z ostatnich losowań.
+    Dzięki nim wynik po zamianie x → y to O(k) odczytów zamiast 6 + 15 + 20.
+    Wynik zgodny z final_score z score_tickets_batch (zaokrąglenie do 6 miejsc).
+    """
+
+    def __init__(self, scorer: SwapScorer, ticket: Sequence[int], _parts: Optional[Tuple] = None):
+        self.scorer = scorer
+        self.ticket = sorted(int(n) for n in ticket)
+        if len(set(self.ticket)) != PICK_COUNT:
+            raise ValueError(f"Kupon musi mieć {PICK_COUNT} różnych liczb.")
+
+        if _parts is None:
+            t = self.ticket
+            u, w2, w3 = scorer.u, scorer.w2, scorer.w3
+            pair_sums = w2[:, t].sum(axis=1)
+            triple_sums = sum(w3[:, t[i], t[j]] for i, j in PAIR_INDEX)
+            linear = float(u[t].sum() + pair_sums[t].sum() / 2.0 + triple_sums[t].sum() / 3.0)
+            recent_counts = scorer.recent[:, t].sum(axis=1)
+            _parts = (linear, pair_sums, triple_sums, recent_counts)
+
+        self.linear, self.pair_sums, self.triple_sums, self.recent_counts = _parts
+        self.score = self._final_score(self.ticket, self.linear, self.recent_counts)
+
+    def _final_score(self, ticket: List[int], linear: float, recent_counts: np.ndarray) -> float:
+        ev = sum(1 for n in ticket if n % 2 == 0)
+        low = sum(1 for n in ticket if n <= LOW_HIGH_THRESHOLD)
+        d = [b - a == 1 for a, b in zip(ticket, ticket[1:])]
+        run3 = any(a and b for a, b in zip(d, d[1:]))
+        run4 = any(a and b and c for a, b, c in zip(d, d[1:], d[2:]))
+        recent_overlap = int(recent_counts.max()) if len(recent_counts) else 0
+
+        shape_score, diversity_penalty, recent_overlap_penalty = _shape_and_penalties_scalar(
+            self.scorer.tables, ev, low, ticket[-1] - ticket[0], sum(ticket), sum(d), run3, run4, recent_overlap
+        )
+        return round(linear + shape_score * 1.55 - diversity_penalty - recent_overlap_penalty, 6)
+
+    def _swap_linear(self, x: int, y: int) -> float:
+        s = self.scorer
+        # wkład x liczony względem reszty kuponu; y — względem kuponu bez x
+        removed = s.u[x] + self.pair_sums[x] + self.triple_sums[x]
+        added = (
+            s.u[y]
+            + self.pair_sums[y] - s.w2[y, x]
+            + self.triple_sums[y] - s.w3[y, x, self.ticket].sum()
+        )
+        return self.linear - float(removed) + float(added)
+
+    def _check_swap(self, x: int, y: int) -> None:
+        if x not in self.ticket or y in self.ticket or not (NUM_MIN <= y <= NUM_MAX):
+            raise ValueError(f"Niepoprawna zamiana {x} → {y} dla kuponu {self.ticket}.")
+
+    def swap_score(self, x: int, y: int) -> float:
+        """
+        final_score kuponu po zamianie x → y, bez zmiany stanu.
+        """
+        x, y = int(x), int(y)
+        self._check_swap(x, y)
+        ticket = sorted([n for n in self.ticket if n != x] + [y])
+        recent_counts = self.recent_counts
+        if len(recent_counts):
+            recent_counts = recent_counts + self.scorer.recent[:, y] - self.scorer.recent[:, x]
+        return self._final_score(ticket, self._swap_linear(x, y), recent_counts)
+
+    def swap(self, x: int, y: int) -> "TicketState":
+        """
+        Nowy stan po zamianie x → y; sumy częściowe aktualizowane wektorowo (O(49·k)).
+        """
+        x, y = int(x), int(y)
+        self._check_swap(x, y)
+        s = self.scorer
+        rest = [n for n in self.ticket if n != x]
+        pair_sums = self.pair_sums + s.w2[:, y] - s.w2[:, x]
+        triple_sums = (
+            self.triple_sums
+            - s.w3[:, x, rest].sum(axis=1)
+            + s.w3[:, y, rest].sum(axis=1)
+        )
+        recent_counts = self.recent_counts + s.recent[:, y] - s.recent[:, x]
+        parts = (self._swap_linear(x, y), pair_sums, triple_sums, recent_counts)
+        return TicketState(s, rest + [y], _parts=parts)
+
+    def move_score(self, removed: Sequence[int], added: Sequence[int]) -> float:
+        """
+        final_score po zamianie wielu liczb naraz (removed[i] → added[i]); pojedyncza zamiana bez kopiowania stanu.
+        """
+        if len(removed) != len(added):
+            raise ValueError("Liczby usuwane i dodawane muszą mieć tę samą długość.")
+        if not removed:
+            return self.score
+        state = self
+        for x, y in zip(removed[:-1], added[:-1]):
+            state = state.swap(x, y)
+        return state.swap_score(removed[-1], added[-1])
+
+    def move(self, removed: Sequence[int], added: Sequence[int]) -> "TicketState":
+        state = self
+        for x, y in zip(removed, added):
+            state = state.swap(x, y)
+        return state
+
+
+# =========================================================
+# EXHAUSTIVE SEARCH
+# =========================================================
+@lru_cache(maxsize=1)
+def _colex_tail_combinations() -> np.ndarray:
+    """
+    Wszystkie 4-elementowe kombinacje z 0..44 w porządku colex:
+    kombinacje zbioru 0..m-1 to dokładnie pierwsze C(m, 4) wierszy.
+    """
+    tail_len = PICK_COUNT - 2
+    arr = np.array(list(combinations(range(NUM_MAX - 2), tail_len)), dtype=np.int64)
+    order = np.lexsort(tuple(arr[:, i] for i in range(tail_len)))
+    return arr[order]
+
+
+def _select_top(scores: np.ndarray, ranks: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k wg (score malejąco, ranga rosnąco) — jednoznaczne także przy remisach.
+    """
+    if len(scores) > k:
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        keep = scores >= kth
+        scores = scores[keep]
+        ranks = ranks[keep]
+    order = np.lexsort((ranks, -scores))[:k]
+    return scores[order], ranks[order]
+
+
+def _scan_second_number(tables: ScoreTables, b: int, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ocena wszystkich kuponów, których druga (posortowana) liczba to b.
+    Część zależna tylko od b i ogona 4 liczb liczona jest raz, potem dokładamy każdą a < b.
+    """
+    u = _number_weights(tables)
+    w2 = tables.pair_weights * (0.90 / comb(PICK_COUNT, 2))
+    w3 = tables.triple_weights * (1.10 / comb(PICK_COUNT, 3))
+
+    m = NUM_MAX - b
+    tail = _colex_tail_combinations()[:comb(m, PICK_COUNT - 2)] + (b + 1)
+    x = [tail[:, i] for i in range(PICK_COUNT - 2)]
+    tail_pairs = list(combinations(range(PICK_COUNT - 2), 2))
+    tail_triples = list(combinations(range(PICK_COUNT - 2), 3))
+
+    # liniowa część score: liczby + pary + trójki
+    lin_b = u[b] + sum(u[xi] for xi in x)
+    lin_b = lin_b + sum(w2[x[i], x[j]] for i, j in tail_pairs)
+    lin_b = lin_b + sum(w3[x[i], x[j], x[k]] for i, j, k in tail_triples)
+    lin_b = lin_b + sum(w2[b, xi] for xi in x)
+    lin_b = lin_b + sum(w3[b, x[i], x[j]] for i, j in tail_pairs)
+
+    # kształt
+    ev_b = (b % 2 == 0) + sum((xi % 2 == 0).astype(np.int64) for xi in x)
+    low_b = (b <= LOW_HIGH_THRESHOLD) + sum((xi <= LOW_HIGH_THRESHOLD).astype(np.int64) for xi in x)
+    sum_b = b + sum(x)
+    d1 = x[0] == b + 1
+    d2 = x[1] == x[0] + 1
+    d3 = x[2] == x[1] + 1
+    d4 = x[3] == x[2] + 1
+    adj_b = d1.astype(np.int64) + d2 + d3 + d4
+    run3_b = (d1 & d2) | (d2 & d3) | (d3 & d4)
+    run4_b = (d1 & d2 & d3) | (d2 & d3 & d4)
+    run3_with_a = run3_b | d1
+    run4_with_a = run4_b | (d1 & d2)
+
+    recent = tables.recent_incidence
+    if len(recent):
+        overlap_b = recent[:, [b]].astype(np.int8) + sum(recent[:, xi].astype(np.int8) for xi in x)
+    else:
+        overlap_b = None
+
+    # ranga colex (ticket_codec): ogon + b liczone raz, a dokłada C(a-1, 1)
+    tail_ranks = BINOM[b - NUM_MIN, 2] + sum(BINOM[xi - NUM_MIN, i + 3] for i, xi in enumerate(x))
+
+    best_scores = np.empty(0, dtype=float)
+    best_ranks = np.empty(0, dtype=np.int64)
+
+    for a in range(NUM_MIN, b):
+        va = w2[a] + w3[a, b]
+        wa = w3[a]
+        lin = lin_b + (u[a] + w2[a, b]) + sum(va[xi] for xi in x)
+        lin = lin + sum(wa[x[i], x[j]] for i, j in tail_pairs)
+
+        adjacent_ab = (b == a + 1)
+        ev = ev_b + (a % 2 == 0)
+        low = low_b + (a <= LOW_HIGH_THRESHOLD)
+        adj_pairs = adj_b + adjacent_ab
+        run3 = run3_with_a if adjacent_ab else run3_b
+        run4 = run4_with_a if adjacent_ab else run4_b
+
+        if overlap_b is not None:
+            recent_overlap = (overlap_b + recent[:, [a]]).max(axis=0)
+        else:
+            recent_overlap = np.zeros(len(tail), dtype=np.int8)
+
+        shape_score, diversity_penalty, recent_overlap_penalty = _shape_and_penalties(
+            tables, ev, low, x[3] - a, sum_b + a, adj_pairs, run3, run4, recent_overlap
+        )
+        scores = np.round(lin + shape_score * 1.55 - diversity_penalty - recent_overlap_penalty, 6)
+        ranks = tail_ranks + (a - NUM_MIN)
+
+        scores, ranks = _select_top(scores, ranks, top_k)
+        best_scores, best_ranks = _select_top(
+            np.concatenate([best_scores, scores]),
+            np.concatenate([best_ranks, ranks]),
+            top_k
+        )
+
+    return best_scores, best_ranks
+
+
+_WORKER_TABLES: Optional[ScoreTables] = None
+
+
+def _init_worker(tables: ScoreTables) -> None:
+    global _WORKER_TABLES
+    _WORKER_TABLES = tables
+
+
+def _scan_second_number_worker(b: int, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    return _scan_second_number(_WORKER_TABLES, b, top_k)
+
+
+def exhaustive_top_k(
+    tables: ScoreTables,
+    top_k: int,
+    workers: Optional[int] = None
+) -> List[Tuple[float, List[int]]]:
+    """
+    Przegląda wszystkie C(49, 6) = 13 983 816 kuponów i zwraca top_k
+    wg final_score z score_ticket (remisy: mniejsza ranga colex z ticket_codec wyżej).
+    Wynik nie zależy od seeda ani od liczby procesów.
+    """
+    top_k = max(1, int(top_k))
+    second_numbers = list(range(NUM_MIN + 1, NUM_MAX - (PICK_COUNT - 2) + 1))
+    # najcięższe bloki najpierw, żeby procesy kończyły równo
+    second_numbers.sort(key=lambda b: (b - 1) * comb(NUM_MAX - b, PICK_COUNT - 2), reverse=True)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(int(workers), len(second_numbers)))
+
+    if workers == 1:
+        parts = [_scan_second_number(tables, b, top_k) for b in second_numbers]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(tables,)
+        ) as pool:
+            parts = list(pool.map(_scan_second_number_worker, second_numbers, [top_k] * len(second_numbers)))
+
+    # scalanie: ograniczony kopiec top_k po kluczu (score, -ranga)
+    heap: List[Tuple[float, int]] = []
+    for scores, ranks in parts:
+        for score, rank in zip(scores.tolist(), ranks.tolist()):
+            item = (score, -rank)
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+    ranked = sorted(heap, reverse=True)
+    tickets = unrank_tickets(np.array([-neg_rank for _, neg_rank in ranked], dtype=np.int64)).astype(int).tolist()
+    return [(score, ticket) for (score, _), ticket in zip(ranked, tickets)]
+
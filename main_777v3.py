@@ -2,15 +2,24 @@ import os
 import re
 import random
 from collections import Counter
-from itertools import combinations
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Iterator, Tuple, Optional, Union
 
-import fitz
 import numpy as np
 import pandas as pd
 import streamlit as st
 
+from constrained_sampler import ConstrainedSampler, TicketRules
+from cooccurrence import CoOccurrence
+from draw_history import DrawHistory
+from draw_store import DrawStore
+from pdf_pages import extract_pages
+from shard_pool import SeedLike, map_shards, merge_ranked, python_seed
+from ticket_codec import SeenSet, ticket_rank, unrank_tickets
+from ticket_masks import max_overlap, ticket_mask
+from ticket_topk import TopK
+from weighted_sampler import sample_tickets, weight_vector
+
 # =========================================================
 # APP CONFIG
 # =========================================================
@@ -20,6 +29,9 @@ NUM_MIN = 1
 NUM_MAX = 49
 PICK_COUNT = 6
 DRAWNO_MIN = 1000
+DRAW_STORE_NAMESPACE = "main_777v3"
+PDF_PAGE_WORKERS = 1  # procesy ekstrakcji stron PDF; 1 = szeregowo, None = liczba CPU (tylko duże archiwa)
+CANDIDATE_WORKERS = None  # procesy nowego silnika; None = liczba CPU (wynik ten sam), 1 = szeregowo
 
 HYBRID_HOT_P = 0.70
 HYBRID_COLD_P = 0.20
@@ -309,19 +321,6 @@ def even_odd_split(nums: List[int]) -> Tuple[int, int]:
 def count_adjacent_pairs(nums_sorted: List[int]) -> int:
     return sum(1 for a, b in zip(nums_sorted, nums_sorted[1:]) if b == a + 1)
 
-def has_run_length(nums_sorted: List[int], run_len: int) -> bool:
-    if run_len <= 1:
-        return True
-    run = 1
-    for a, b in zip(nums_sorted, nums_sorted[1:]):
-        if b == a + 1:
-            run += 1
-            if run >= run_len:
-                return True
-        else:
-            run = 1
-    return False
-
 def pick_unique(pool: List[int], k: int) -> List[int]:
     pool = list(dict.fromkeys(pool))
     if len(pool) < k:
@@ -448,12 +447,7 @@ def _validate_pdf_bytes(pdf_bytes: bytes) -> None:
         )
 
 def _read_pdf_pages_text_pymupdf(pdf_bytes: bytes) -> List[str]:
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    pages = []
-    for page in doc:
-        pages.append(page.get_text("text") or "")
-    doc.close()
-    return pages
+    return extract_pages(pdf_bytes, "text", workers=PDF_PAGE_WORKERS)
 
 def _extract_tokens_and_drawnos_from_page(page_text: str) -> Tuple[List[int], List[int]]:
     tokens: List[int] = []
@@ -533,8 +527,7 @@ def _pair_draws_with_drawnos(draws: List[List[int]], drawnos: List[int]) -> List
         records.sort(key=lambda r: (r["draw_no"] is None, r["draw_no"] or -1), reverse=True)
     return records
 
-@st.cache_data(show_spinner=False)
-def load_records_cached(pdf_bytes: bytes) -> List[Dict]:
+def parse_records(pdf_bytes: bytes) -> List[Dict]:
     _validate_pdf_bytes(pdf_bytes)
     pages = _read_pdf_pages_text_pymupdf(pdf_bytes)
     all_tokens: List[int] = []
@@ -549,6 +542,11 @@ def load_records_cached(pdf_bytes: bytes) -> List[Dict]:
     records = _pair_draws_with_drawnos(draws, all_drawnos)
     return records
 
+@st.cache_data(show_spinner=False)
+def load_records_cached(pdf_path: str, pdf_stamp: Tuple[int, int]) -> List[Dict]:
+    # pdf_stamp (rozmiar, mtime) to tylko klucz cache; parser rusza, gdy zmieni się hash PDF
+    return DrawStore(DRAW_STORE_NAMESPACE).load_or_import_path(pdf_path, parse_records)
+
 # =========================================================
 # STATS
 # =========================================================
@@ -585,16 +583,8 @@ def build_hot_master_set(percent_df: pd.DataFrame) -> List[int]:
     return sorted(percent_df.head(PICK_COUNT)["Liczba"].tolist())
 
 @st.cache_data(show_spinner=False)
-def compute_pair_triple_stats_cached(draws: List[List[int]]) -> Tuple[Counter, Counter]:
-    pair_counter = Counter()
-    triple_counter = Counter()
-    for draw in draws:
-        sdraw = sorted(draw)
-        for pair in combinations(sdraw, 2):
-            pair_counter[pair] += 1
-        for triple in combinations(sdraw, 3):
-            triple_counter[triple] += 1
-    return pair_counter, triple_counter
+def compute_cooccurrence_cached(draws: List[List[int]]) -> CoOccurrence:
+    return CoOccurrence(draws, max_order=3)
 
 def build_target_profile(draws: List[List[int]]) -> Dict:
     spreads = [(max(d) - min(d)) for d in draws if d]
@@ -656,6 +646,22 @@ def gen_ticket(mode: str, hot: List[int], cold: List[int], mix_hot_count: int) -
         return sorted(h + c)
     raise ValueError("Nieznany tryb losowania.")
 
+def ticket_stages(mode: str, hot: List[int], cold: List[int], mix_hot_count: int) -> List[Tuple[List[int], int]]:
+    """
+    Etapy losowania gen_ticket jako [(pula, ile), ...] (dla ConstrainedSampler).
+    """
+    if mode == "hot":
+        return [(hot, PICK_COUNT)]
+    if mode == "cold":
+        return [(cold, PICK_COUNT)]
+    if mode == "mix":
+        if mix_hot_count >= PICK_COUNT:
+            return [(hot, PICK_COUNT)]
+        if mix_hot_count <= 0:
+            return [(cold, PICK_COUNT)]
+        return [(hot, mix_hot_count), (cold, PICK_COUNT - mix_hot_count)]
+    raise ValueError("Nieznany tryb losowania.")
+
 def gen_ticket_hot_max_percent(draws_for_window: List[List[int]]) -> Tuple[List[int], pd.DataFrame]:
     pct_df = compute_presence_percent_df_cached(draws_for_window)
     top6 = pct_df.head(PICK_COUNT).copy()
@@ -665,41 +671,77 @@ def gen_ticket_hot_max_percent(draws_for_window: List[List[int]]) -> Tuple[List[
 # =========================================================
 # SMART MODE
 # =========================================================
-def smart_ok(
-    ticket: List[int],
+def smart_ticket_rules(
     block_run_2: bool,
     block_run_3: bool,
     max_adjacent_pairs: Optional[int],
     even_odd_choice: str
-) -> bool:
-    nums = sorted(ticket)
-    if block_run_3 and has_run_length(nums, 3): return False
-    if block_run_2 and has_run_length(nums, 2): return False
-    pairs = count_adjacent_pairs(nums)
-    if max_adjacent_pairs is not None and pairs > max_adjacent_pairs: return False
-    ev, od = even_odd_split(nums)
+) -> TicketRules:
+    """
+    Filtry trybu inteligentnego w postaci dla ConstrainedSampler
+    (blokada ciągu 2 / 3 kolejnych, limit par sąsiednich, wybrany układ parzyste/nieparzyste).
+    """
+    max_run = 1 if block_run_2 else (2 if block_run_3 else None)
+    even = None
     if even_odd_choice != "Dowolnie":
         try:
-            ev_t, od_t = even_odd_choice.split("/")
-            if not (ev == int(ev_t) and od == int(od_t)):
-                return False
-        except Exception: pass
-    return True
+            ev_t, od_t = (int(x) for x in even_odd_choice.split("/"))
+            even = (ev_t,) if ev_t + od_t == PICK_COUNT else ()
+        except Exception:
+            pass
+    return TicketRules(even_counts=even, max_adjacent_pairs=max_adjacent_pairs, max_run=max_run)
+
+def smart_rule_labels(
+    block_run_2: bool,
+    block_run_3: bool,
+    max_adjacent_pairs: Optional[int],
+    even_odd_choice: str
+) -> Dict[str, str]:
+    """
+    Pole TicketRules -> nazwa filtra do raportu odrzuceń.
+    """
+    return {
+        "max_run": "ciąg 2 kolejnych" if block_run_2 else "ciąg 3 kolejnych",
+        "max_adjacent_pairs": f"pary sąsiednie (max {max_adjacent_pairs})",
+        "even_counts": f"parzyste/nieparzyste {even_odd_choice}",
+    }
 
 def generate_with_smart_filters(
-    gen_func,
+    pick_mode,
+    hot: List[int],
+    cold: List[int],
+    mix_hot_count: int,
     n_tickets: int,
     max_attempts_per_ticket: int,
-    smart_kwargs: Dict
+    smart_kwargs: Dict,
+    rejected: Optional[Counter] = None
 ) -> List[Dict]:
+    """
+    pick_mode() -> "hot" / "cold" / "mix" (wybór trybu jak w gen_one_record).
+    Kupony budowane od razu zgodne z filtrami (ConstrainedSampler): w obrębie trybu rozkład jak przy losowaniu
+    gen_ticket i odrzucaniu, ale czas nie zależy od ostrości filtrów. Udziały trybów zostają takie, jak daje
+    pick_mode (odrzucanie przeważało je wg odsetka kuponów przechodzących filtry). Tryb bez żadnego kuponu
+    spełniającego filtry jest pomijany i liczony w rejected pod nazwą filtrów, które go wykluczają;
+    max_attempts_per_ticket ogranicza tylko takie puste wybory trybu.
+    """
+    rules = smart_ticket_rules(**smart_kwargs)
+    labels = smart_rule_labels(**smart_kwargs)
+    samplers: Dict[str, ConstrainedSampler] = {}
     out: List[Dict] = []
     attempts = 0
-    while len(out) < n_tickets:
+    max_attempts = n_tickets * max_attempts_per_ticket
+    while len(out) < n_tickets and attempts < max_attempts:
         attempts += 1
-        if attempts > n_tickets * max_attempts_per_ticket: break
-        rec = gen_func()
-        if smart_ok(rec["Kupon"], **smart_kwargs):
-            out.append(rec)
+        chosen = pick_mode()
+        if chosen not in samplers:
+            samplers[chosen] = ConstrainedSampler(ticket_stages(chosen, hot, cold, mix_hot_count), rules)
+        sampler = samplers[chosen]
+        if not sampler.feasible:
+            if rejected is not None:
+                blocking = " + ".join(labels[name] for name in sampler.blocking_rules())
+                rejected[f"tryb {chosen}: {blocking}"] += 1
+            continue
+        out.append({"Typ": chosen, "Kupon": sampler.sample(random)})
     return out
 
 # =========================================================
@@ -844,46 +886,36 @@ def build_positional_difference_set(draws: List[List[int]], window: int) -> Dict
 # =========================================================
 # ZŁOTY STRZAŁ (MOMENTUM AI) - WERSJA STOCHASTYCZNA
 # =========================================================
-def build_zloty_strzal_momentum(draws: List[List[int]]) -> Dict:
+def build_zloty_strzal_momentum(draws: Union[List[List[int]], DrawHistory]) -> Dict:
     """
     Algorytm obliczający Momentum (trend) w wersji STOCHASTYCZNEJ.
     Zamiast ślepo brać zawsze "TOP 6", oblicza szanse na wylosowanie 
     proporcjonalnie do siły Momentum każdej z liczb. Pozwala to na
     uzyskiwanie unikalnych kuponów przy każdym kliknięciu.
     """
-    if not draws:
+    history = draws if isinstance(draws, DrawHistory) else DrawHistory.from_draws(draws)
+    if len(history) == 0:
         return {"kupon": list(range(1, 7)), "sredni_score": 0.0, "details": []}
 
     short_window = 30
     long_window = 999
     
-    draws_short = draws[:min(short_window, len(draws))]
-    draws_long = draws[:min(long_window, len(draws))]
+    history_short = history.window(short_window)
+    history_long = history.window(long_window)
 
-    short_counts = Counter()
-    for d in draws_short:
-        for n in set(d): short_counts[n] += 1
-            
-    long_counts = Counter()
-    for d in draws_long:
-        for n in set(d): long_counts[n] += 1
-
-    last_seen = {}
-    for n in range(NUM_MIN, NUM_MAX + 1):
-        last_seen[n] = 9999
-        for idx, d in enumerate(draws):
-            if n in d:
-                last_seen[n] = idx
-                break
+    # obecności liczone wektorowo na macierzy incydencji
+    short_counts = history_short.frequency()
+    long_counts = history_long.frequency()
+    last_seen = history.last_seen(missing=9999)
 
     scores = []
     for n in range(NUM_MIN, NUM_MAX + 1):
         # 1. Obliczenie wartości bazowych
-        short_rate = short_counts.get(n, 0) / max(1, len(draws_short))
-        long_rate = long_counts.get(n, 0) / max(1, len(draws_long))
+        short_rate = int(short_counts[n]) / max(1, len(history_short))
+        long_rate = int(long_counts[n]) / max(1, len(history_long))
         
         # 2. Obliczenie premii uśpienia
-        delay = last_seen[n]
+        delay = int(last_seen[n])
         delay_score = 0.0
         if 4 <= delay <= 15:
             delay_score = 1.0
@@ -935,23 +967,20 @@ def build_zloty_strzal_momentum(draws: List[List[int]]) -> Dict:
 # =========================================================
 # SCORE TICKET (SHARED BY TURBO & NEW ENGINE)
 # =========================================================
-def similarity_to_recent(ticket: List[int], recent_draws: List[List[int]]) -> int:
-    tset = set(ticket)
-    if not recent_draws: return 0
-    return max(len(tset.intersection(set(d))) for d in recent_draws)
+def similarity_to_recent(ticket: List[int], recent_masks: List[int]) -> int:
+    return max_overlap(ticket_mask(ticket), recent_masks)
 
 def score_ticket(
     ticket: List[int],
     percent_map: Dict[int, float],
-    pair_counter: Counter,
-    triple_counter: Counter,
+    cooccurrence: CoOccurrence,
     target_profile: Dict,
-    recent_draws: List[List[int]]
+    recent_masks: List[int]
 ) -> Dict:
     sticket = sorted(ticket)
     number_score = sum(percent_map.get(n, 0.0) for n in sticket)
-    pair_score_raw = sum(pair_counter.get(tuple(pair), 0) for pair in combinations(sticket, 2))
-    triple_score_raw = sum(triple_counter.get(tuple(triple), 0) for triple in combinations(sticket, 3))
+    pair_score_raw = cooccurrence.combo_sum(sticket, 2)
+    triple_score_raw = cooccurrence.combo_sum(sticket, 3)
 
     ev, od = even_odd_split(sticket)
     target_ev, target_od = target_profile["target_even_odd"]
@@ -968,7 +997,7 @@ def score_ticket(
     adj_pairs = count_adjacent_pairs(sticket)
     pair_shape_penalty = abs(adj_pairs - target_profile["target_pairs"])
 
-    recent_similarity = similarity_to_recent(sticket, recent_draws)
+    recent_similarity = similarity_to_recent(sticket, recent_masks)
 
     final_score = (
         number_score * 3.0
@@ -999,40 +1028,74 @@ def score_ticket(
 # =========================================================
 # NEW STRONGER ENGINE LOGIC
 # =========================================================
-def run_new_stronger_engine(
-    draws: List[List[int]],
-    n_tickets: int,
+def _new_engine_scored(
+    rng,
     candidate_count: int,
-    hot_size: int,
-    hot_count: int
+    hot_pool: List[int],
+    hot_count: int,
+    percent_map: Dict[int, float],
+    cooccurrence: CoOccurrence,
+    target_profile: Dict,
+    recent_masks: List[int]
 ) -> List[Dict]:
-    percent_df = compute_presence_percent_df_cached(draws)
-    percent_map = dict(zip(percent_df["Liczba"], percent_df["Procent_losowan"]))
-    pair_counter, triple_counter = compute_pair_triple_stats_cached(draws)
-    target_profile = build_target_profile(draws)
-    recent_draws = draws[:10]
-
+    """
+    Losowanie unikalnych kandydatów (rng: moduł random albo random.Random) i ocena — malejąco wg final_score.
+    """
     full_pool = list(range(NUM_MIN, NUM_MAX + 1))
-    hot_pool = sorted(percent_df.head(hot_size)["Liczba"].tolist())
 
-    candidates = set()
+    # unikalne kandydaty jako rangi uint32 w kolejności wylosowania
+    seen = SeenSet()
+    ranks: List[int] = []
     attempts = 0
     max_attempts = candidate_count * 3
 
-    while len(candidates) < candidate_count and attempts < max_attempts:
+    while len(ranks) < candidate_count and attempts < max_attempts:
         attempts += 1
-        hot_part = random.sample(hot_pool, min(hot_count, len(hot_pool)))
+        hot_part = rng.sample(hot_pool, min(hot_count, len(hot_pool)))
         rem_pool = [x for x in full_pool if x not in hot_part]
-        other_part = random.sample(rem_pool, PICK_COUNT - len(hot_part))
-        ticket = tuple(sorted(hot_part + other_part))
-        candidates.add(ticket)
+        other_part = rng.sample(rem_pool, PICK_COUNT - len(hot_part))
+        rank = ticket_rank(hot_part + other_part)
+        if seen.add(rank):
+            ranks.append(rank)
 
     scored = []
-    for t in candidates:
-        scored.append(score_ticket(list(t), percent_map, pair_counter, triple_counter, target_profile, recent_draws))
+    for t in unrank_tickets(np.array(ranks, dtype=np.uint32)).tolist():
+        scored.append(score_ticket(t, percent_map, cooccurrence, target_profile, recent_masks))
 
     scored.sort(key=lambda x: x["final_score"], reverse=True)
-    best = scored[:n_tickets]
+    return scored
+
+
+def new_engine_shard(budget: int, seed: SeedLike, keep: int, *args) -> List[Dict]:
+    """
+    Shard nowego silnika dla map_shards: własny random.Random, zwraca keep najlepszych.
+    """
+    return _new_engine_scored(random.Random(python_seed(seed)), budget, *args)[:keep]
+
+
+def run_new_stronger_engine(
+    draws: List[List[int]],
+    n_tickets: int,
+    candidate_count: int,
+    hot_size: int,
+    hot_count: int,
+    workers: Optional[int] = CANDIDATE_WORKERS
+) -> List[Dict]:
+    percent_df = compute_presence_percent_df_cached(draws)
+    percent_map = dict(zip(percent_df["Liczba"], percent_df["Procent_losowan"]))
+    cooccurrence = compute_cooccurrence_cached(draws)
+    target_profile = build_target_profile(draws)
+    recent_masks = [ticket_mask(d) for d in draws[:10]]
+
+    hot_pool = sorted(percent_df.head(hot_size)["Liczba"].tolist())
+    tables = (hot_pool, hot_count, percent_map, cooccurrence, target_profile, recent_masks)
+
+    if workers == 1:
+        best = _new_engine_scored(random, candidate_count, *tables)[:n_tickets]
+    else:
+        # seed shardów z globalnego random — random.seed(...) przed wywołaniem daje powtarzalny wynik na każdej maszynie
+        parts = map_shards(new_engine_shard, candidate_count, random.getrandbits(63), workers=workers, args=(n_tickets,) + tables)
+        best = merge_ranked(parts, key=lambda x: x["final_score"], top_k=n_tickets, unique_key=lambda x: tuple(x["ticket"]))
 
     out = []
     for item in best:
@@ -1045,32 +1108,38 @@ def run_new_stronger_engine(
 # =========================================================
 # TURBO SCORE
 # =========================================================
-def generate_candidate_tickets(
+def iter_candidate_tickets(
     count_candidates: int,
     base_mode_kind: str,
     hot: List[int],
     cold: List[int],
     mix_hot_count: int
-) -> List[List[int]]:
-    candidates = []
+) -> Iterator[List[int]]:
+    """
+    Unikalne kupony kandydatów po kolei (te same co generate_candidate_tickets), bez trzymania listy.
+    """
+    seen = SeenSet()
     for _ in range(count_candidates):
         if base_mode_kind == "hybrid":
             chosen = random.choices(["hot", "cold", "mix"], weights=[HYBRID_HOT_P, HYBRID_COLD_P, HYBRID_MIX_P], k=1)[0]
-            candidates.append(gen_ticket(chosen, hot, cold, mix_hot_count))
+            ticket = gen_ticket(chosen, hot, cold, mix_hot_count)
         elif base_mode_kind == "hot":
-            candidates.append(gen_ticket("hot", hot, cold, mix_hot_count))
+            ticket = gen_ticket("hot", hot, cold, mix_hot_count)
         elif base_mode_kind == "cold":
-            candidates.append(gen_ticket("cold", hot, cold, mix_hot_count))
+            ticket = gen_ticket("cold", hot, cold, mix_hot_count)
         else:
-            candidates.append(gen_ticket("mix", hot, cold, mix_hot_count))
-    uniq = []
-    seen = set()
-    for t in candidates:
-        key = tuple(sorted(t))
-        if key not in seen:
-            seen.add(key)
-            uniq.append(sorted(t))
-    return uniq
+            ticket = gen_ticket("mix", hot, cold, mix_hot_count)
+        if seen.add(ticket_rank(ticket)):
+            yield sorted(ticket)
+
+def generate_candidate_tickets(
+    count_candidates: int,
+    base_mode_kind: str,
+    hot: List[int],
+    cold: List[int],
+    mix_hot_count: int
+) -> List[List[int]]:
+    return list(iter_candidate_tickets(count_candidates, base_mode_kind, hot, cold, mix_hot_count))
 
 def build_turbo_score_ranking(
     draws_for_window: List[List[int]], hot: List[int], cold: List[int],
@@ -1078,17 +1147,18 @@ def build_turbo_score_ranking(
 ) -> Dict:
     percent_df = compute_presence_percent_df_cached(draws_for_window)
     percent_map = dict(zip(percent_df["Liczba"], percent_df["Procent_losowan"]))
-    pair_counter, triple_counter = compute_pair_triple_stats_cached(draws_for_window)
+    cooccurrence = compute_cooccurrence_cached(draws_for_window)
     target_profile = build_target_profile(draws_for_window)
-    recent_draws = draws_for_window[:10]
-
-    candidates = generate_candidate_tickets(candidate_count, base_mode_kind, hot, cold, mix_hot_count)
-    scored = []
-    for ticket in candidates:
-        scored.append(score_ticket(ticket, percent_map, pair_counter, triple_counter, target_profile, recent_draws))
-
-    scored.sort(key=lambda x: x["final_score"], reverse=True)
-    best = scored[:top_n]
+    recent_masks = [ticket_mask(d) for d in draws_for_window[:10]]
+
+    # ranking trzyma tylko wynik i rangę kuponu — pełne metryki liczone ponownie tylko dla top_n
+    top = TopK(top_n)
+    for ticket in iter_candidate_tickets(candidate_count, base_mode_kind, hot, cold, mix_hot_count):
+        top.push_ticket(score_ticket(ticket, percent_map, cooccurrence, target_profile, recent_masks)["final_score"], ticket)
+    best = [
+        score_ticket(ticket, percent_map, cooccurrence, target_profile, recent_masks)
+        for ticket in top.tickets().astype(int).tolist()
+    ]
 
     rows = []
     for i, item in enumerate(best, start=1):
@@ -1106,7 +1176,7 @@ def build_turbo_score_ranking(
             "Podobieństwo do ostatnich": item["recent_similarity"],
         })
 
-    return {"rows": rows, "target_profile": target_profile, "candidate_count_used": len(candidates)}
+    return {"rows": rows, "target_profile": target_profile, "candidate_count_used": top.pushed}
 
 # =========================================================
 # PREMIUM MODE
@@ -1129,9 +1199,9 @@ def build_premium_ranking(
 ) -> Dict:
     percent_df = compute_presence_percent_df_cached(draws_for_window)
     percent_map = dict(zip(percent_df["Liczba"], percent_df["Procent_losowan"]))
-    pair_counter, triple_counter = compute_pair_triple_stats_cached(draws_for_window)
+    cooccurrence = compute_cooccurrence_cached(draws_for_window)
     target_profile = build_target_profile(draws_for_window)
-    recent_draws = draws_for_window[:10]
+    recent_masks = [ticket_mask(d) for d in draws_for_window[:10]]
 
     hot_max_set, hot_max_table = gen_ticket_hot_max_percent(draws_for_window)
     diff_data = build_positional_difference_set(draws_for_window, min(999, len(draws_for_window)))
@@ -1151,45 +1221,45 @@ def build_premium_ranking(
     ordinary_candidates = generate_candidate_tickets(max(candidate_count, 200), "hybrid", hot, cold, mix_hot_count)
     seed_candidates.extend(ordinary_candidates)
 
-    source_pool = list(dict.fromkeys(hot + hot_max_set + diff_set + list(range(NUM_MIN, NUM_MAX + 1))))
-    mutated = []
-    for cand in seed_candidates[:min(len(seed_candidates), candidate_count)]:
-        mutated.append(sorted(cand))
-        mutated.append(mutate_ticket(cand, source_pool, 1))
-        mutated.append(mutate_ticket(cand, source_pool, 2))
-
-    all_candidates = seed_candidates + mutated
-    uniq = []
-    seen = set()
-    for t in all_candidates:
-        key = tuple(sorted(t))
-        if len(key) == PICK_COUNT and key not in seen:
-            seen.add(key)
-            uniq.append(sorted(t))
-
     hot_max_set_ref = set(hot_max_set)
     diff_set_ref = set(diff_set)
     hot_ref = set(hot)
 
-    premium_scored = []
-    for ticket in uniq:
-        base = score_ticket(ticket, percent_map, pair_counter, triple_counter, target_profile, recent_draws)
+    def premium_item(ticket: List[int]) -> Dict:
+        base = score_ticket(ticket, percent_map, cooccurrence, target_profile, recent_masks)
         overlap_hot_max = len(set(ticket).intersection(hot_max_set_ref))
         overlap_diff = len(set(ticket).intersection(diff_set_ref))
         overlap_hot = len(set(ticket).intersection(hot_ref))
         premium_bonus = (overlap_hot_max * 5.0 + overlap_diff * 3.0 + overlap_hot * 1.2)
         final_premium_score = base["final_score"] + premium_bonus
-        premium_scored.append({
+        return {
             **base,
             "premium_bonus": premium_bonus,
             "overlap_hot_max": overlap_hot_max,
             "overlap_diff": overlap_diff,
             "overlap_hot": overlap_hot,
             "premium_final_score": final_premium_score,
-        })
+        }
+
+    # kandydaci oceniani w locie (najpierw bazowe, potem ich mutacje — kolejność jak dawniej w liście uniq),
+    # ranking trzyma tylko wynik i rangę; pełne metryki liczone ponownie tylko dla top_n
+    seen = SeenSet()
+    top = TopK(top_n)
 
-    premium_scored.sort(key=lambda x: x["premium_final_score"], reverse=True)
-    best = premium_scored[:top_n]
+    def consider(ticket: List[int]) -> None:
+        if len(set(ticket)) == PICK_COUNT and seen.add(ticket_rank(ticket)):
+            top.push_ticket(premium_item(sorted(ticket))["premium_final_score"], ticket)
+
+    for t in seed_candidates:
+        consider(t)
+
+    source_pool = list(dict.fromkeys(hot + hot_max_set + diff_set + list(range(NUM_MIN, NUM_MAX + 1))))
+    for cand in seed_candidates[:min(len(seed_candidates), candidate_count)]:
+        consider(sorted(cand))
+        consider(mutate_ticket(cand, source_pool, 1))
+        consider(mutate_ticket(cand, source_pool, 2))
+
+    best = [premium_item(ticket) for ticket in top.tickets().astype(int).tolist()]
 
     rows = []
     for i, item in enumerate(best, start=1):
@@ -1210,7 +1280,7 @@ def build_premium_ranking(
         })
 
     return {
-        "rows": rows, "candidate_count_used": len(uniq),
+        "rows": rows, "candidate_count_used": top.pushed,
         "hot_max_set": hot_max_set, "hot_max_table": hot_max_table,
         "diff_set": diff_set, "diff_details": diff_data["details"],
         "target_profile": target_profile,
@@ -1219,23 +1289,20 @@ def build_premium_ranking(
 # =========================================================
 # AI SIMULATION
 # =========================================================
-def weighted_sample_without_replacement(population: np.ndarray, weights: np.ndarray, k: int, rng: np.random.Generator) -> List[int]:
-    probs = weights / weights.sum()
-    chosen = rng.choice(population, size=k, replace=False, p=probs)
-    return sorted(chosen.tolist())
-
 @st.cache_data(show_spinner=False)
 def run_ai_simulation_cached(percent_df: pd.DataFrame, n_sims: int) -> Dict:
     rng = np.random.default_rng(12345)
     population = np.array(percent_df["Liczba"].tolist(), dtype=int)
     weights = np.array(percent_df["Procent_losowan"].tolist(), dtype=float) + 0.01
-    number_occ = Counter()
-    pair_occ = Counter()
-
-    for _ in range(n_sims):
-        draw = weighted_sample_without_replacement(population, weights, PICK_COUNT, rng)
-        for n in draw: number_occ[n] += 1
-        for pair in combinations(draw, 2): pair_occ[pair] += 1
+    # wszystkie symulacje naraz (Gumbel-top-k), zliczanie liczb i par wektorowo
+    sims = sample_tickets(rng, weight_vector(weights, population), n_sims)
+    number_occ = Counter(dict(zip(range(NUM_MIN, NUM_MAX + 1), np.bincount(sims.ravel(), minlength=NUM_MAX + 1)[NUM_MIN:].tolist())))
+    first, second = np.triu_indices(PICK_COUNT, k=1)
+    pair_codes = sims[:, first] * (NUM_MAX + 1) + sims[:, second]
+    codes, counts = np.unique(pair_codes, return_counts=True)
+    # kolejność (malejąco wg liczby, potem para) — most_common nie zależy od kolejności wstawiania
+    order = np.lexsort((codes, -counts))
+    pair_occ = Counter({divmod(int(c), NUM_MAX + 1): int(n) for c, n in zip(codes[order], counts[order])})
 
     sim_df = pd.DataFrame(
         [{"Liczba": n, "Symulacje_wystapien": number_occ.get(n, 0)} for n in range(NUM_MIN, NUM_MAX + 1)]
@@ -1615,7 +1682,10 @@ def settings_panel(defaults: Dict) -> Dict:
         if limit_pairs_on:
             max_adj_pairs = st.slider("Maks. liczba par kolejnych", 0, 5, defaults.get("max_adj_pairs", 2), 1)
         even_odd_choice = st.radio("Parzyste / Nieparzyste (6 liczb)", ["Dowolnie", "3/3", "4/2", "2/4", "5/1", "1/5", "6/0", "0/6"], index=defaults.get("even_odd_idx", 0))
-        max_attempts_per_ticket = st.slider("Limit prób na kupon", 10, 500, defaults.get("max_attempts", 120), 10)
+        max_attempts_per_ticket = st.slider(
+            "Limit wyborów trybu na kupon (gdy filtry wykluczają tryb)", 10, 500, defaults.get("max_attempts", 120), 10,
+            help="Kupony powstają od razu zgodne z filtrami; limit dotyczy tylko losowań trybu, w którym żaden kupon nie spełnia filtrów."
+        )
     else:
         block_run_2 = False
         block_run_3 = False
@@ -1690,8 +1760,8 @@ def main():
         st.stop()
 
     try:
-        pdf_bytes = pdf_path.read_bytes()
-        result_records_all = load_records_cached(pdf_bytes)
+        pdf_stat = pdf_path.stat()
+        result_records_all = load_records_cached(str(pdf_path), (pdf_stat.st_size, pdf_stat.st_mtime_ns))
     except Exception as e:
         st.error("❌ Aplikacja nie mogła wczytać PDF albo wyciągnąć wyników.")
         st.code(str(e))
@@ -1828,6 +1898,13 @@ def main():
     if build_heatmap:
         st.session_state["heatmap_df"] = build_heatmap_df(percent_df, columns_per_row=7)
 
+    def pick_mode() -> str:
+        if base_mode_kind == "hybrid":
+            return random.choices(["hot", "cold", "mix"], weights=[HYBRID_HOT_P, HYBRID_COLD_P, HYBRID_MIX_P], k=1)[0]
+        if base_mode_kind in ("hot", "cold"):
+            return base_mode_kind
+        return "mix"
+
     def gen_one_record() -> Dict:
         if base_mode_kind == "premium":
             premium_result_local = build_premium_ranking(
@@ -1839,18 +1916,13 @@ def main():
         if hot_max_mode_active:
             hot_max_set, hot_max_table = gen_ticket_hot_max_percent(draws)
             return {"Typ": "hot_max_6", "Kupon": hot_max_set, "HotMaxTable": hot_max_table}
-        if base_mode_kind == "hybrid":
-            chosen = random.choices(["hot", "cold", "mix"], weights=[HYBRID_HOT_P, HYBRID_COLD_P, HYBRID_MIX_P], k=1)[0]
-            return {"Typ": chosen, "Kupon": gen_ticket(chosen, hot, cold, cfg["mix_hot_count"])}
-        if base_mode_kind == "hot":
-            return {"Typ": "hot", "Kupon": gen_ticket("hot", hot, cold, cfg["mix_hot_count"])}
-        if base_mode_kind == "cold":
-            return {"Typ": "cold", "Kupon": gen_ticket("cold", hot, cold, cfg["mix_hot_count"])}
-        return {"Typ": "mix", "Kupon": gen_ticket("mix", hot, cold, cfg["mix_hot_count"])}
+        chosen = pick_mode()
+        return {"Typ": chosen, "Kupon": gen_ticket(chosen, hot, cold, cfg["mix_hot_count"])}
 
     if generate:
         progress = st.progress(0)
         status = st.empty()
+        smart_rejected = Counter()
 
         if cfg["engine_choice"] == "Nowy mocniejszy silnik (rankingowy)":
             with st.spinner("Nowy silnik losuje i ocenia kandydatów..."):
@@ -1903,14 +1975,20 @@ def main():
                             "max_adjacent_pairs": cfg["max_adj_pairs"], "even_odd_choice": cfg["even_odd_choice"]
                         }
                         recs = generate_with_smart_filters(
-                            gen_func=gen_one_record, n_tickets=int(cfg["n_tickets"]),
-                            max_attempts_per_ticket=int(cfg["max_attempts_per_ticket"]), smart_kwargs=smart_kwargs
+                            pick_mode=pick_mode, hot=hot, cold=cold, mix_hot_count=int(cfg["mix_hot_count"]),
+                            n_tickets=int(cfg["n_tickets"]),
+                            max_attempts_per_ticket=int(cfg["max_attempts_per_ticket"]), smart_kwargs=smart_kwargs,
+                            rejected=smart_rejected
                         )
                         progress.progress(100)
                         status.write(f"Postęp: {len(recs)}/{int(cfg['n_tickets'])}")
 
             if cfg["engine_choice"] != "Nowy mocniejszy silnik (rankingowy)" and cfg["smart_enabled"] and (not hot_max_mode_active) and base_mode_kind != "premium" and len(recs) < int(cfg["n_tickets"]):
-                st.warning(f"⚠️ Filtry są ostre: wygenerowano **{len(recs)}** / {int(cfg['n_tickets'])} kuponów. Poluzuj filtry albo zwiększ limit prób.")
+                worst = ", ".join(f"{name}: {count}" for name, count in smart_rejected.most_common() if count)
+                st.warning(
+                    f"⚠️ Filtry są ostre: wygenerowano **{len(recs)}** / {int(cfg['n_tickets'])} kuponów. W części trybów żaden kupon nie spełnia filtrów — większy limit prób nie pomoże, poluzuj wskazane filtry."
+                    + (f" Wykluczające filtry: {worst}." if worst else "")
+                )
 
         progress.empty()
         status.empty()
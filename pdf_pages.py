@@ -0,0 +1,187 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import fitz  # PyMuPDF
+    HAS_PYMUPDF = True
+except Exception:
+    fitz = None
+    HAS_PYMUPDF = False
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+PAGE_MODES = ("text", "blocks", "words")
+# start procesu spawn (import aplikacji: streamlit, pandas, fitz) to ok. 1,5 s, a strona szeregowo ok. 20 ms —
+# poniżej tej liczby stron procesy kosztują więcej niż sama ekstrakcja
+PARALLEL_MIN_PAGES = 200
+MAX_PAGE_WORKERS = 8
+
+
+def _check_mode(mode: str) -> None:
+    if mode not in PAGE_MODES:
+        raise ValueError(f"Nieznany tryb ekstrakcji '{mode}' (dozwolone: {', '.join(PAGE_MODES)})")
+    if not HAS_PYMUPDF:
+        raise RuntimeError("PyMuPDF not available")
+
+
+def _mode_flags(mode: str) -> int:
+    """
+    Domyślne flagi page.get_text(mode) — TextPage z tymi flagami daje to samo co osobne wywołanie trybu.
+    """
+    return {"text": fitz.TEXTFLAGS_TEXT, "blocks": fitz.TEXTFLAGS_BLOCKS, "words": fitz.TEXTFLAGS_WORDS}[mode]
+
+
+def _page_output(page, mode: str, textpage=None) -> Any:
+    out = page.get_text(mode, textpage=textpage)
+    if mode == "text":
+        return out or ""
+    return list(out or [])
+
+
+def _extract_range(doc, start: int, stop: int, mode: str) -> List[Any]:
+    return [_page_output(doc[i], mode) for i in range(start, stop)]
+
+
+def page_ranges(page_count: int, shards: int) -> List[Tuple[int, int]]:
+    """
+    Podział stron 0..page_count-1 na shards ciągłych zakresów [start, stop) o prawie równej długości.
+    """
+    shards = max(1, min(int(shards), page_count))
+    base, extra = divmod(page_count, shards)
+    ranges = []
+    start = 0
+    for i in range(shards):
+        stop = start + base + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+# =========================================================
+# WORKERS
+# =========================================================
+_WORKER_DOC = None
+
+
+def _init_worker(pdf_bytes: bytes) -> None:
+    # każdy proces otwiera dokument raz i obsługuje kolejne zakresy stron
+    global _WORKER_DOC
+    _WORKER_DOC = fitz.open(stream=pdf_bytes, filetype="pdf")
+
+
+def _extract_range_worker(start: int, stop: int, mode: str) -> List[Any]:
+    return _extract_range(_WORKER_DOC, start, stop, mode)
+
+
+def _extract_mode_worker(pdf_bytes: bytes, mode: str) -> List[Any]:
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return _extract_range(doc, 0, len(doc), mode)
+
+
+# =========================================================
+# PUBLIC API
+# =========================================================
+def extract_pages(
+    pdf_bytes: bytes,
+    mode: str = "text",
+    workers: Optional[int] = None,
+    min_pages: int = PARALLEL_MIN_PAGES
+) -> List[Any]:
+    """
+    Ekstrakcja wszystkich stron PDF w kolejności: "text" → str, "blocks"/"words" → lista krotek fitz.
+    Przy min_pages stronach lub więcej strony są dzielone na ciągłe zakresy przetwarzane
+    przez workers procesów (None = liczba CPU, max MAX_PAGE_WORKERS); małe pliki i workers=1 → szeregowo.
+    Wynik jest identyczny niezależnie od liczby procesów.
+    """
+    _check_mode(mode)
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page_count = len(doc)
+
+        if workers is None:
+            workers = min(os.cpu_count() or 1, MAX_PAGE_WORKERS)
+        workers = max(1, min(int(workers), page_count))
+
+        if workers == 1 or page_count < max(2, int(min_pages)):
+            return _extract_range(doc, 0, page_count, mode)
+
+    ranges = page_ranges(page_count, workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(pdf_bytes,)
+    ) as pool:
+        parts = list(pool.map(
+            _extract_range_worker,
+            [start for start, _ in ranges],
+            [stop for _, stop in ranges],
+            [mode] * len(ranges)
+        ))
+
+    return [page for part in parts for page in part]
+
+
+def iter_pages(pdf_bytes: bytes, mode: str = "text") -> Iterator[Any]:
+    """
+    Strony po kolei, jedna w pamięci naraz — do strumieniowego parsowania dużych archiwów.
+    """
+    _check_mode(mode)
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for page in doc:
+            yield _page_output(page, mode)
+
+
+def iter_page_modes(pdf_bytes: bytes, modes: Sequence[str]) -> Iterator[Tuple[str, List[Any]]]:
+    """
+    Jeden fitz.open i jeden TextPage na stronę dla trybów o tych samych domyślnych flagach
+    (text / blocks / words mają wspólne): zwraca kolejno (tryb, strony). Kolejne tryby czytają gotowy
+    TextPage, więc są kilkukrotnie tańsze od pierwszego; przerwanie pętli u wywołującego pomija pozostałe tryby.
+    """
+    for mode in modes:
+        _check_mode(mode)
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        # strony muszą żyć razem z TextPage (TextPage trzyma słabą referencję do strony)
+        pages = list(doc)
+        textpages: Dict[int, List[Any]] = {}
+        for mode in modes:
+            flags = _mode_flags(mode)
+            if flags not in textpages:
+                textpages[flags] = [page.get_textpage(flags=flags) for page in pages]
+            yield mode, [_page_output(page, mode, tp) for page, tp in zip(pages, textpages[flags])]
+
+
+def extract_page_modes(
+    pdf_bytes: bytes,
+    modes: Sequence[str],
+    workers: Optional[int] = None,
+    min_pages: int = PARALLEL_MIN_PAGES
+) -> Dict[str, List[Any]]:
+    """
+    Tryby ekstrakcji współbieżnie — jeden proces na tryb; workers=1 lub mniej niż min_pages stron
+    → iter_page_modes w bieżącym procesie.
+    """
+    for mode in modes:
+        _check_mode(mode)
+
+    if workers is None:
+        workers = min(os.cpu_count() or 1, MAX_PAGE_WORKERS)
+    workers = max(1, min(int(workers), len(modes)))
+
+    if workers > 1:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            if len(doc) < max(2, int(min_pages)):
+                workers = 1
+
+    if workers == 1:
+        return dict(iter_page_modes(pdf_bytes, modes))
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        parts = list(pool.map(_extract_mode_worker, [pdf_bytes] * len(modes), list(modes)))
+
+    return dict(zip(modes, parts))
@@ -0,0 +1,185 @@
+import atexit
+import heapq
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+# stała liczba shardów (poza workers=1) — ten sam seed daje ten sam wynik na każdej maszynie,
+# niezależnie od liczby CPU i procesów, które je wykonują
+SHARD_COUNT = 8
+MAX_SHARD_WORKERS = SHARD_COUNT
+
+SeedLike = Union[int, np.random.SeedSequence]
+
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """
+    None = liczba CPU (max MAX_SHARD_WORKERS); zawsze co najmniej 1.
+    """
+    if workers is None:
+        workers = min(os.cpu_count() or 1, MAX_SHARD_WORKERS)
+    return max(1, int(workers))
+
+
+def resolve_shards(workers: Optional[int], total: int) -> int:
+    """
+    workers=1 → jeden shard (wynik wersji szeregowej); każda inna wartość, także None → SHARD_COUNT shardów.
+    """
+    shards = 1 if workers == 1 else SHARD_COUNT
+    return max(1, min(shards, int(total)))
+
+
+def shard_processes(workers: Optional[int], total: int) -> int:
+    """
+    Liczba procesów wykonujących shardy: nie więcej niż shardów.
+    """
+    return min(resolve_workers(workers), resolve_shards(workers, total))
+
+
+def shard_sizes(total: int, shards: int) -> List[int]:
+    """
+    Podział budżetu total na shards prawie równych części (większe najpierw).
+    """
+    shards = max(1, int(shards))
+    base, extra = divmod(max(0, int(total)), shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+def shard_seeds(seed: int, shards: int) -> List[SeedLike]:
+    """
+    Jeden shard dostaje sam seed — wynik jak w wersji szeregowej; więcej shardów —
+    niezależne strumienie z SeedSequence(seed).spawn(shards).
+    """
+    if shards == 1:
+        return [seed]
+    return list(np.random.SeedSequence(seed).spawn(shards))
+
+
+def python_seed(seed: SeedLike) -> int:
+    """
+    Seed dla random.Random / random.seed: int bez zmian, SeedSequence → 64-bitowy int.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return int(seed.generate_state(1, dtype=np.uint64)[0])
+    return int(seed)
+
+
+# =========================================================
+# POOL
+# =========================================================
+# pule żyją między wywołaniami (i rerunami Streamlit) — start procesu spawn z importem aplikacji
+# kosztuje więcej niż typowy shard
+_POOLS: Dict[int, ProcessPoolExecutor] = {}
+_WARMUPS: Dict[int, List[Future]] = {}
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    pool = _POOLS.get(workers)
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        _POOLS[workers] = pool
+    return pool
+
+
+def _noop() -> None:
+    return None
+
+
+def warm_pool(processes: int) -> bool:
+    """
+    Uruchamia w tle procesy puli (bez czekania) i zwraca True, gdy wszystkie są już gotowe —
+    pozwala ominąć koszt startu puli w wywołaniach z limitem czasu.
+    """
+    if processes <= 1:
+        return True
+    futures = _WARMUPS.get(processes)
+    if futures is None:
+        pool = _get_pool(processes)
+        futures = [pool.submit(_noop) for _ in range(processes)]
+        _WARMUPS[processes] = futures
+    return all(f.done() for f in futures)
+
+
+@atexit.register
+def shutdown_pools() -> None:
+    for pool in _POOLS.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _POOLS.clear()
+    _WARMUPS.clear()
+
+
+# =========================================================
+# PUBLIC API
+# =========================================================
+def map_shards(
+    fn: Callable[..., Any],
+    total: int,
+    seed: int,
+    workers: Optional[int] = None,
+    args: Sequence[Any] = (),
+    on_done: Optional[Callable[[int, int], None]] = None
+) -> List[Any]:
+    """
+    Wywołuje fn(budżet_shardu, seed_shardu, *args) dla każdego shardu i zwraca wyniki w kolejności shardów.
+    Liczba shardów nie zależy od liczby CPU (resolve_shards), więc wynik zależy tylko od seeda
+    (i od tego, czy workers=1), nie od maszyny ani kolejności kończenia procesów.
+    fn musi być funkcją modułu (picklowalną); jeden proces → shardy po kolei w bieżącym procesie.
+    on_done(gotowe, wszystkie) wywoływane po każdym ukończonym shardzie (np. pasek postępu).
+    """
+    shards = resolve_shards(workers, total)
+    processes = shard_processes(workers, total)
+    sizes = shard_sizes(total, shards)
+    seeds = shard_seeds(seed, shards)
+
+    if processes == 1:
+        parts = []
+        for done, (size, s) in enumerate(zip(sizes, seeds), start=1):
+            parts.append(fn(size, s, *args))
+            if on_done is not None:
+                on_done(done, shards)
+        return parts
+
+    pool = _get_pool(processes)
+    try:
+        futures = [pool.submit(fn, size, s, *args) for size, s in zip(sizes, seeds)]
+        if on_done is not None:
+            for done, future in enumerate(futures, start=1):
+                future.result()
+                on_done(done, shards)
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        _POOLS.pop(processes, None)
+        _WARMUPS.pop(processes, None)
+        raise
+
+
+def merge_ranked(
+    parts: Iterable[List[Any]],
+    key: Callable[[Any], Any],
+    top_k: Optional[int] = None,
+    unique_key: Optional[Callable[[Any], Any]] = None
+) -> List[Any]:
+    """
+    Scalanie list posortowanych malejąco wg key (per-shard top-K) w jeden ranking.
+    Remisy: wcześniejszy shard, potem kolejność w shardzie; unique_key usuwa powtórki między shardami.
+    """
+    out: List[Any] = []
+    seen = set()
+    for item in heapq.merge(*parts, key=key, reverse=True):
+        if unique_key is not None:
+            k = unique_key(item)
+            if k in seen:
+                continue
+            seen.add(k)
+        out.append(item)
+        if top_k is not None and len(out) >= top_k:
+            break
+    return out
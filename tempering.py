@@ -0,0 +1,182 @@
+import heapq
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ticket_codec import ticket_rank
+from ticket_masks import greedy_diverse, masks_array
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+NUM_MIN = 1
+NUM_MAX = 49
+PICK_COUNT = 6
+
+DEFAULT_REPLICAS = 8
+DEFAULT_T_MIN = 0.005
+DEFAULT_T_MAX = 0.30
+DEFAULT_TIME_BUDGET_S = 2.0
+# co ile kroków każdej repliki próbujemy zamiany sąsiednich temperatur
+DEFAULT_EXCHANGE_EVERY = 10
+# archiwum najlepszych odwiedzonych kuponów, z którego wybierany jest zróżnicowany top-N
+ARCHIVE_PER_TICKET = 40
+
+
+# =========================================================
+# PARALLEL TEMPERING
+# =========================================================
+@dataclass
+class TemperingResult:
+    tickets: List[List[int]]
+    scores: List[float]
+    temperatures: List[float]
+    steps: int
+    exchanges_tried: int
+    exchanges_accepted: int
+    elapsed_s: float
+    # True, gdy budżet czasu uciął przebieg przed max_steps — wynik zależy wtedy od obciążenia maszyny
+    truncated: bool = False
+
+    @property
+    def steps_per_second(self) -> float:
+        return self.steps / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+
+def temperature_ladder(t_min: float, t_max: float, replicas: int) -> List[float]:
+    """
+    Geometryczna drabina temperatur od t_min (replika "chciwa") do t_max (replika eksplorująca).
+    """
+    if replicas < 1:
+        raise ValueError("Liczba replik musi być dodatnia.")
+    if not (0 < t_min <= t_max):
+        raise ValueError("Temperatury muszą spełniać 0 < t_min <= t_max.")
+    if replicas == 1:
+        return [float(t_min)]
+    ratio = (t_max / t_min) ** (1.0 / (replicas - 1))
+    return [float(t_min * ratio ** i) for i in range(replicas)]
+
+
+def parallel_tempering(
+    states,
+    top_n: int,
+    seed: int,
+    replicas: int = DEFAULT_REPLICAS,
+    t_min: float = DEFAULT_T_MIN,
+    t_max: float = DEFAULT_T_MAX,
+    time_budget_s: Optional[float] = DEFAULT_TIME_BUDGET_S,
+    max_steps: Optional[int] = None,
+    exchange_every: int = DEFAULT_EXCHANGE_EVERY,
+    max_common: int = 3,
+    pool: Optional[Sequence[int]] = None,
+    initial: Optional[Sequence[Sequence[int]]] = None
+) -> TemperingResult:
+    """
+    Parallel tempering po przestrzeni kuponów 6/49, ruch = zamiana jednej liczby (x → y z puli).
+    - states: obiekt z .state(ticket) zgodny z TicketState z lotus_scoring (ticket, score, swap_score, swap),
+    - każda replika wykonuje kroki Metropolisa w swojej temperaturze, co exchange_every kroków
+      sąsiednie repliki wymieniają się stanami z prawd. min(1, exp((s_i - s_j)(1/T_i - 1/T_j))),
+    - wynik: top_n kuponów z archiwum najlepszych odwiedzonych, o części wspólnej najwyżej max_common.
+    Stop po max_steps krokach (łącznie dla wszystkich replik, sprawdzane co pełną rundę) albo po time_budget_s sekundach.
+    Dla danego seeda trajektoria jest zawsze ta sama — budżet czasu jedynie ją ucina,
+    więc pełną powtarzalność daje max_steps bez limitu czasu.
+    """
+    if time_budget_s is None and max_steps is None:
+        raise ValueError("Podaj time_budget_s albo max_steps.")
+    top_n = max(1, int(top_n))
+    exchange_every = max(1, int(exchange_every))
+
+    pool = sorted(set(int(n) for n in (pool if pool is not None else range(NUM_MIN, NUM_MAX + 1))))
+    if len(pool) <= PICK_COUNT or pool[0] < NUM_MIN or pool[-1] > NUM_MAX:
+        raise ValueError(f"Pula musi mieć więcej niż {PICK_COUNT} liczb z zakresu {NUM_MIN}..{NUM_MAX}.")
+
+    rng = random.Random(seed)
+    temperatures = temperature_ladder(t_min, t_max, replicas)
+
+    current = []
+    for i in range(replicas):
+        if initial is not None and i < len(initial):
+            current.append(states.state(initial[i]))
+        else:
+            current.append(states.state(rng.sample(pool, PICK_COUNT)))
+
+    # archiwum: kopiec minimalny (score, rank) + słownik rank → kupon; rangi z ticket_codec jako klucz
+    archive_size = top_n * ARCHIVE_PER_TICKET
+    heap: List[Tuple[float, int]] = []
+    archived: Dict[int, List[int]] = {}
+
+    def remember(ticket: List[int], score: float) -> None:
+        if len(heap) >= archive_size and score <= heap[0][0]:
+            return
+        rank = ticket_rank(ticket)
+        if rank in archived:
+            return
+        archived[rank] = ticket
+        if len(heap) < archive_size:
+            heapq.heappush(heap, (score, rank))
+        else:
+            _, dropped = heapq.heapreplace(heap, (score, rank))
+            del archived[dropped]
+
+    for s in current:
+        remember(s.ticket, s.score)
+
+    t0 = time.perf_counter()
+    deadline = t0 + time_budget_s if time_budget_s is not None else None
+    steps = 0
+    exchanges_tried = exchanges_accepted = 0
+    sweep = 0
+
+    while True:
+        if max_steps is not None and steps >= max_steps:
+            break
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+
+        for i, temp in enumerate(temperatures):
+            s = current[i]
+            x = s.ticket[rng.randrange(PICK_COUNT)]
+            y = pool[rng.randrange(len(pool))]
+            while y in s.ticket:
+                y = pool[rng.randrange(len(pool))]
+
+            new_score = s.swap_score(x, y)
+            delta = new_score - s.score
+            if delta >= 0 or rng.random() < math.exp(delta / temp):
+                current[i] = s = s.swap(x, y)
+                remember(s.ticket, s.score)
+            elif len(heap) < archive_size or new_score > heap[0][0]:
+                # odrzucony ruch też może trafić do archiwum, jeśli jest dość dobry
+                remember(sorted([n for n in s.ticket if n != x] + [y]), new_score)
+            steps += 1
+
+        sweep += 1
+        if sweep % exchange_every == 0:
+            # naprzemiennie pary (0,1),(2,3)... i (1,2),(3,4)...
+            for i in range((sweep // exchange_every) % 2, replicas - 1, 2):
+                exchanges_tried += 1
+                a, b = current[i], current[i + 1]
+                log_p = (a.score - b.score) * (1.0 / temperatures[i] - 1.0 / temperatures[i + 1])
+                if log_p >= 0 or rng.random() < math.exp(log_p):
+                    current[i], current[i + 1] = b, a
+                    exchanges_accepted += 1
+
+    elapsed = time.perf_counter() - t0
+
+    ranked = sorted(heap, key=lambda item: (-item[0], item[1]))
+    tickets = [archived[rank] for _, rank in ranked]
+    chosen = greedy_diverse(masks_array(tickets), top_n, max_common) if tickets else []
+
+    return TemperingResult(
+        tickets=[tickets[i] for i in chosen],
+        scores=[ranked[i][0] for i in chosen],
+        temperatures=temperatures,
+        steps=steps,
+        exchanges_tried=exchanges_tried,
+        exchanges_accepted=exchanges_accepted,
+        elapsed_s=elapsed,
+        truncated=max_steps is not None and steps < max_steps,
+    )
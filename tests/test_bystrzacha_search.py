@@ -0,0 +1,71 @@
+import random
+from itertools import product
+
+import pytest
+
+import LotWinApp as app
+
+
+FLAG_SETS = [
+    dict(rule_force_even_odd=True, rule_force_spread=True, rule_force_sum_range=True, rule_avoid_last_draw_clone=True),
+    dict(rule_force_even_odd=False, rule_force_spread=False, rule_force_sum_range=False, rule_avoid_last_draw_clone=False),
+    dict(rule_force_even_odd=True, rule_force_spread=False, rule_force_sum_range=True, rule_avoid_last_draw_clone=False),
+]
+
+
+def make_analyzer(flags):
+    rng = random.Random(4)
+    draws = [app.Draw(500 - i, sorted(rng.sample(range(1, 50), 6))) for i in range(60)]
+    config = app.AnalyzerConfig(
+        weight_freq=1.0, weight_recency=1.0, weight_rhythm=1.0, weight_pair=1.0, weight_triple=1.0,
+        weight_overdue=1.0, hot_pool=20, generation_attempts=50, seed=7, enable_bystrzacha=True,
+        bystrzacha_top_deltas=6, **flags
+    )
+    return app.LottoAnalyzer(draws, config)
+
+
+def random_options(rng):
+    # opcje pozycji wokół rosnących "bazowych" liczb, score z remisami (wielokrotności 0.5)
+    options = []
+    for pos in range(app.NUMBERS_IN_DRAW):
+        center = 4 + pos * 8
+        values = rng.sample(range(max(1, center - 7), min(49, center + 7) + 1), rng.randint(2, 8))
+        scored = [(n, rng.randint(0, 8) * 0.5, n - center) for n in values]
+        options.append(sorted(scored, key=lambda x: (-x[1], x[0])))
+    return options
+
+
+def brute_force(analyzer, options, top_n):
+    """
+    Pełne przeszukiwanie w kolejności DFS: score malejąco, remis — wcześniejszy ciąg.
+    """
+    options = [opts[:app.BYSTRZACHA_MAX_OPTIONS] for opts in options]
+    found = []
+    for combo in product(*options):
+        nums = [n for n, _, _ in combo]
+        if any(b <= a for a, b in zip(nums, nums[1:])) or not analyzer.validate_ticket(nums):
+            continue
+        found.append((sum(s for _, s, _ in combo), len(found), nums, [d for _, _, d in combo]))
+    found.sort(key=lambda x: (-x[0], x[1]))
+    return [(nums, deltas, score) for score, _, nums, deltas in found[:top_n]]
+
+
+@pytest.mark.parametrize("flags", FLAG_SETS)
+@pytest.mark.parametrize("top_n", [1, 10])
+def test_branch_and_bound_matches_exhaustive(flags, top_n):
+    analyzer = make_analyzer(flags)
+    rng = random.Random(top_n)
+    for _ in range(40):
+        options = random_options(rng)
+        got = analyzer._search_bystrzacha_sequences(options, top_n=top_n)
+        expected = brute_force(analyzer, options, top_n)
+        assert [(n, d) for n, d, _ in got] == [(n, d) for n, d, _ in expected]
+        assert [s for _, _, s in got] == pytest.approx([s for _, _, s in expected])
+
+
+def test_real_position_options():
+    analyzer = make_analyzer(FLAG_SETS[0])
+    options = analyzer._build_bystrzacha_position_options()
+    expected = brute_force(analyzer, options, 5)
+    got = analyzer._search_bystrzacha_sequences(options, top_n=5)
+    assert [n for n, _, _ in got] == [n for n, _, _ in expected]
@@ -0,0 +1,100 @@
+import random
+from collections import defaultdict
+from itertools import combinations
+from math import comb
+
+import pytest
+
+from constrained_sampler import NUM_MAX, NUM_MIN, ConstrainedSampler, TicketRules
+
+
+HOT = [3, 4, 5, 11, 12, 20, 21, 22, 35, 48]
+COLD = [5, 6, 7, 12, 13, 30, 31, 40, 41, 49]   # 5 i 12 w obu pulach — zajętość między etapami
+
+MODES = {
+    "hot": [(HOT, 6)],
+    "cold": [(COLD, 6)],
+    "mix": [(HOT, 3), (COLD, 3)],
+}
+
+RULES = [
+    TicketRules(),
+    TicketRules(even_counts=(3,)),
+    TicketRules(even_counts=(2, 3, 4), max_adjacent_pairs=1, max_run=2),
+    TicketRules(max_run=1, max_decade_pairs=3),
+]
+
+
+def rejection_distribution(stages, rules):
+    """
+    Dokładny rozkład "losuj etapami pick_unique, odrzucaj kupony łamiące reguły" + prawd. akceptacji.
+    """
+    dist = defaultdict(float)
+
+    def walk(stage, taken, prob):
+        if stage == len(stages):
+            dist[tuple(sorted(taken))] += prob
+            return
+        pool, k = stages[stage]
+        free = [n for n in pool if n not in taken]
+        for picked in combinations(free, k):
+            walk(stage + 1, taken | set(picked), prob / comb(len(free), k))
+
+    walk(0, frozenset(), 1.0)
+    accepted = {t: p for t, p in dist.items() if rules.ok(t)}
+    total = sum(accepted.values())
+    return {t: p / total for t, p in accepted.items()}, total
+
+
+def sampler_distribution(sampler):
+    """
+    Dokładny rozkład sample(): suma po ścieżkach DP prawdopodobieństw kolejnych wyborów.
+    """
+    dist = defaultdict(float)
+
+    def walk(n, state, ticket, prob):
+        if n > NUM_MAX:
+            dist[tuple(ticket)] += prob
+            return
+        options, weights = sampler._choices(n, state)
+        prev = 0.0
+        for (g, nxt), acc in zip(options, weights):
+            walk(n + 1, nxt, ticket + [n] if g >= 0 else ticket, prob * (acc - prev) / weights[-1])
+            prev = acc
+
+    walk(NUM_MIN, sampler._start, [], 1.0)
+    return dist
+
+
+@pytest.mark.parametrize("mode", list(MODES))
+@pytest.mark.parametrize("rules", RULES)
+def test_sampler_matches_rejection_per_mode(mode, rules):
+    stages = MODES[mode]
+    expected, acceptance = rejection_distribution(stages, rules)
+    sampler = ConstrainedSampler(stages, rules)
+
+    assert sampler.total == pytest.approx(acceptance, rel=1e-9)
+    got = sampler_distribution(sampler)
+    assert set(got) == set(expected)
+    for ticket, p in expected.items():
+        assert got[ticket] == pytest.approx(p, rel=1e-9, abs=1e-15), ticket
+
+
+def test_samples_satisfy_rules():
+    rules = TicketRules(even_counts=(2, 3, 4), max_adjacent_pairs=1, max_run=2)
+    sampler = ConstrainedSampler(MODES["mix"], rules)
+    support, _ = rejection_distribution(MODES["mix"], rules)
+    rng = random.Random(5)
+    for ticket in sampler.sample_many(500, rng):
+        assert rules.ok(ticket)
+        assert tuple(ticket) in support
+
+
+def test_infeasible_mode_reports_blocking_rule():
+    # gorąca pula bez liczb parzystych: 3 parzyste są niemożliwe, reguła ciągów sama nie blokuje
+    stages = [([1, 3, 5, 7, 9, 11, 13], 6)]
+    sampler = ConstrainedSampler(stages, TicketRules(even_counts=(3,), max_run=2))
+    assert not sampler.feasible
+    assert sampler.blocking_rules() == ("even_counts",)
+    with pytest.raises(ValueError):
+        sampler.sample(random.Random(0))
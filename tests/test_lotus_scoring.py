@@ -0,0 +1,61 @@
+from dataclasses import asdict
+
+import numpy as np
+import pytest
+
+import LotusWygranus as lw
+from lotus_scoring import build_score_tables
+
+
+def random_draws(count: int, seed: int):
+    rng = np.random.default_rng(seed)
+    return [sorted(rng.choice(np.arange(1, 50), 6, replace=False).tolist()) for _ in range(count)]
+
+
+@pytest.fixture(scope="module")
+def model():
+    draws = random_draws(300, seed=7)
+    feature_df = lw.build_number_feature_table(draws)
+    pair_counter, triple_counter = lw.compute_pair_triple_counters_cached(draws)
+    pair_map, triple_map = lw.build_pair_triple_strength_maps(pair_counter, triple_counter)
+    profile = lw.build_shape_profile(draws)
+    return draws, feature_df, pair_map, triple_map, profile
+
+
+EDGE_TICKETS = [
+    [1, 2, 3, 4, 5, 6],          # ciąg 6 kolejnych, same niskie
+    [44, 45, 46, 47, 48, 49],    # ciąg 6 kolejnych, same wysokie
+    [1, 2, 3, 20, 30, 40],       # ciąg 3
+    [10, 11, 12, 13, 30, 40],    # ciąg 4
+    [5, 6, 15, 16, 25, 26],      # 3 pary sąsiednie bez ciągu 3
+    [2, 4, 6, 8, 10, 12],        # same parzyste
+    [1, 3, 5, 7, 9, 11],         # same nieparzyste
+    [24, 25, 30, 35, 40, 49],    # granica niskie/wysokie (24)
+]
+
+
+@pytest.mark.parametrize("max_recent_overlap", [0, 2, 3])
+def test_batch_matches_scalar(model, max_recent_overlap):
+    draws, feature_df, pair_map, triple_map, profile = model
+    recent = draws[:10]
+    tables = build_score_tables(feature_df, pair_map, triple_map, profile, recent, max_recent_overlap)
+
+    rng = np.random.default_rng(11)
+    tickets = [sorted(rng.choice(np.arange(1, 50), 6, replace=False).tolist()) for _ in range(1500)]
+    # klony ostatnich losowań (pełne pokrycie) i kupony z 5 liczbami z losowania
+    tickets += [list(d) for d in recent]
+    tickets += [sorted(d[:5] + [n]) for d in recent[:5] for n in range(1, 50) if n not in d][:40]
+    tickets += EDGE_TICKETS
+    # kolejność liczb w wierszu nie może mieć znaczenia
+    tickets += [list(reversed(t)) for t in EDGE_TICKETS]
+
+    batch = lw.score_tickets_metrics(tickets, tables, ["test"] * len(tickets))
+    for ticket, got in zip(tickets, batch):
+        expected = lw.score_ticket(ticket, feature_df, pair_map, triple_map, profile, recent, max_recent_overlap, "test")
+        assert asdict(got) == asdict(expected), ticket
+
+
+def test_empty_batch(model):
+    draws, feature_df, pair_map, triple_map, profile = model
+    tables = build_score_tables(feature_df, pair_map, triple_map, profile, draws[:10], 3)
+    assert lw.score_tickets_metrics([], tables, []) == []
@@ -0,0 +1,75 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from ticket_codec import (
+    TOTAL_TICKETS,
+    SeenSet,
+    rank_tickets,
+    ticket_rank,
+    ticket_unrank,
+    unique_ranks,
+    unrank_tickets,
+)
+
+
+def test_edge_ranks():
+    assert TOTAL_TICKETS == 13983816
+    assert ticket_rank([1, 2, 3, 4, 5, 6]) == 0
+    assert ticket_rank([44, 45, 46, 47, 48, 49]) == TOTAL_TICKETS - 1 == 13983815
+    assert ticket_unrank(0) == [1, 2, 3, 4, 5, 6]
+    assert ticket_unrank(13983815) == [44, 45, 46, 47, 48, 49]
+
+
+def test_round_trip_random_and_order_free():
+    rng = np.random.default_rng(3)
+    tickets = np.array([rng.choice(np.arange(1, 50), 6, replace=False) for _ in range(5000)])
+    ranks = rank_tickets(tickets)
+    assert ranks.dtype == np.uint32
+    assert (unrank_tickets(ranks) == np.sort(tickets, axis=1)).all()
+    # kolejność liczb w wierszu bez znaczenia, skalarny wariant zgodny z wektorowym
+    assert (rank_tickets(tickets[:, ::-1]) == ranks).all()
+    assert [ticket_rank(t) for t in tickets[:200].tolist()] == ranks[:200].tolist()
+
+
+def test_ranks_are_colex_bijection_on_small_prefix():
+    # wszystkie kupony z liczb 1..12 to dokładnie rangi 0..C(12, 6)-1, w porządku colex
+    tickets = sorted(combinations(range(1, 13), 6), key=lambda t: t[::-1])
+    assert rank_tickets(np.array(tickets)).tolist() == list(range(len(tickets)))
+
+
+def test_uint32_boundary():
+    ranks = np.array([0, TOTAL_TICKETS - 1], dtype=np.uint32)
+    assert unrank_tickets(ranks).tolist() == [[1, 2, 3, 4, 5, 6], [44, 45, 46, 47, 48, 49]]
+    with pytest.raises(ValueError):
+        unrank_tickets(np.array([TOTAL_TICKETS]))
+    with pytest.raises(ValueError):
+        unrank_tickets(np.array([-1]))
+
+
+@pytest.mark.parametrize("ticket", [[0, 2, 3, 4, 5, 6], [1, 2, 3, 4, 5, 50], [1, 1, 2, 3, 4, 5]])
+def test_invalid_tickets_rejected(ticket):
+    with pytest.raises(ValueError):
+        rank_tickets(np.array([ticket]))
+    with pytest.raises(ValueError):
+        ticket_rank(ticket)
+
+
+def test_unique_ranks_keeps_first_occurrence_order():
+    assert unique_ranks(np.array([5, 3, 5, 9, 3, 1])).tolist() == [5, 3, 9, 1]
+
+
+def test_seen_set_scalar_and_batch():
+    seen = SeenSet()
+    assert seen.add(0) and seen.add(TOTAL_TICKETS - 1)
+    assert not seen.add(0)
+    assert 0 in seen and TOTAL_TICKETS - 1 in seen and 1 not in seen
+    assert len(seen) == 2
+
+    # powtórki w partii i rangi już widziane: True tylko dla pierwszego nowego wystąpienia
+    new = seen.add_many(np.array([7, 0, 7, 8, TOTAL_TICKETS - 1, 8, 9], dtype=np.uint32))
+    assert new.tolist() == [True, False, False, True, False, False, True]
+    assert len(seen) == 5
+    assert all(r in seen for r in (7, 8, 9))
+    assert seen.bits.nbytes == (TOTAL_TICKETS + 7) // 8
@@ -0,0 +1,123 @@
+from math import comb
+from typing import List, Sequence
+
+import numpy as np
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+NUM_MIN = 1
+NUM_MAX = 49
+PICK_COUNT = 6
+TOTAL_TICKETS = comb(NUM_MAX, PICK_COUNT)
+
+# BINOM[x, k] = C(x, k) dla x = 0..49, k = 0..6
+BINOM = np.array([[comb(x, k) for k in range(PICK_COUNT + 1)] for x in range(NUM_MAX + 1)], dtype=np.int64)
+_BINOM_ROWS = BINOM.tolist()
+
+
+# =========================================================
+# RANK / UNRANK (combinatorial number system, colex)
+# =========================================================
+def rank_tickets(tickets: np.ndarray) -> np.ndarray:
+    """
+    Kupony (M, 6) z liczbami 1..49 → rangi uint32 w [0, C(49, 6)); kolejność liczb w wierszu dowolna.
+    """
+    t = np.sort(np.asarray(tickets, dtype=np.int64).reshape(-1, PICK_COUNT), axis=1) - NUM_MIN
+    if t.size and (t.min() < 0 or t.max() > NUM_MAX - NUM_MIN):
+        raise ValueError(f"Liczby kuponu muszą być z zakresu {NUM_MIN}..{NUM_MAX}.")
+    if t.size and (np.diff(t, axis=1) == 0).any():
+        raise ValueError("Kupon zawiera powtórzone liczby.")
+    ranks = np.zeros(len(t), dtype=np.int64)
+    for i in range(PICK_COUNT):
+        ranks += BINOM[t[:, i], i + 1]
+    return ranks.astype(np.uint32)
+
+
+def unrank_tickets(ranks: np.ndarray) -> np.ndarray:
+    """
+    Rangi → posortowane kupony (M, 6) uint8; odwrotność rank_tickets.
+    """
+    r = np.asarray(ranks, dtype=np.int64).ravel().copy()
+    if r.size and (r.min() < 0 or r.max() >= TOTAL_TICKETS):
+        raise ValueError(f"Ranga kuponu musi być z zakresu 0..{TOTAL_TICKETS - 1}.")
+    out = np.empty((len(r), PICK_COUNT), dtype=np.uint8)
+    for i in reversed(range(PICK_COUNT)):
+        # największe x z C(x, i+1) <= r — kolumna BINOM jest niemalejąca
+        x = np.searchsorted(BINOM[:, i + 1], r, side="right") - 1
+        r -= BINOM[x, i + 1]
+        out[:, i] = x + NUM_MIN
+    return out
+
+
+def ticket_rank(ticket: Sequence[int]) -> int:
+    """
+    Skalarny rank_tickets w czystym Pythonie — do pętli generatorów, bez narzutu numpy.
+    """
+    s = sorted(ticket)
+    if len(s) != PICK_COUNT or len(set(s)) != PICK_COUNT or s[0] < NUM_MIN or s[-1] > NUM_MAX:
+        raise ValueError(f"Kupon musi mieć {PICK_COUNT} różnych liczb z zakresu {NUM_MIN}..{NUM_MAX}.")
+    return sum(_BINOM_ROWS[x - NUM_MIN][i + 1] for i, x in enumerate(s))
+
+
+def ticket_unrank(rank: int) -> List[int]:
+    return unrank_tickets(np.asarray([rank]))[0].astype(int).tolist()
+
+
+def unique_ranks(ranks: np.ndarray) -> np.ndarray:
+    """
+    Rangi bez powtórzeń, w kolejności pierwszego wystąpienia.
+    """
+    ranks = np.asarray(ranks, dtype=np.uint32)
+    _, first = np.unique(ranks, return_index=True)
+    return ranks[np.sort(first)]
+
+
+# =========================================================
+# SEEN SET
+# =========================================================
+class SeenSet:
+    """
+    Zbiór kuponów jako bitset C(49, 6) bitów (~1.75 MB, stały rozmiar) indeksowany rangą.
+    Zastępuje set(tuple(ticket)) przy deduplikacji kandydatów.
+    """
+
+    def __init__(self):
+        self.bits = np.zeros((TOTAL_TICKETS + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, rank: int) -> bool:
+        rank = int(rank)
+        return bool(self.bits[rank >> 3] & (1 << (rank & 7)))
+
+    def add(self, rank: int) -> bool:
+        """
+        Dodaje rangę; True gdy kupon był nowy.
+        """
+        rank = int(rank)
+        byte, bit = rank >> 3, 1 << (rank & 7)
+        if self.bits[byte] & bit:
+            return False
+        self.bits[byte] |= bit
+        self.count += 1
+        return True
+
+    def add_many(self, ranks: np.ndarray) -> np.ndarray:
+        """
+        Dodaje rangi wektorowo; maska bool: True dla pierwszego wystąpienia kuponu wcześniej niewidzianego.
+        """
+        ranks = np.asarray(ranks, dtype=np.int64).ravel()
+        new = ~((self.bits[ranks >> 3] >> (ranks & 7)) & 1).astype(bool)
+        _, first = np.unique(ranks, return_index=True)
+        first_mask = np.zeros(len(ranks), dtype=bool)
+        first_mask[first] = True
+        new &= first_mask
+
+        fresh = ranks[new]
+        np.bitwise_or.at(self.bits, fresh >> 3, (1 << (fresh & 7)).astype(np.uint8))
+        self.count += int(new.sum())
+        return new
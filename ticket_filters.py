@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, Sequence, Tuple
+
+import numpy as np
+
+from draw_history import numbers_to_masks
+from ticket_masks import overlap_with, ticket_mask
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+NUM_MIN = 1
+NUM_MAX = 49
+PICK_COUNT = 6
+
+
+# =========================================================
+# RULE PRIMITIVES — kupony (M, 6) → wartości (M,)
+# =========================================================
+def sorted_tickets(tickets) -> np.ndarray:
+    """
+    Kupony → (M, 6) int64, liczby w wierszu posortowane (wszystkie prymitywy niżej tego wymagają).
+    """
+    t = np.asarray(tickets, dtype=np.int64)
+    if t.ndim == 1:
+        t = t.reshape(-1, PICK_COUNT) if t.size else np.empty((0, PICK_COUNT), dtype=np.int64)
+    return np.sort(t, axis=1)
+
+
+def valid_rows(t: np.ndarray) -> np.ndarray:
+    """
+    Różne liczby z zakresu 1..49.
+    """
+    in_range = ((t >= NUM_MIN) & (t <= NUM_MAX)).all(axis=1)
+    distinct = (np.diff(t, axis=1) > 0).all(axis=1)
+    return in_range & distinct
+
+
+def even_counts(t: np.ndarray) -> np.ndarray:
+    return (t % 2 == 0).sum(axis=1)
+
+
+def band_counts(t: np.ndarray, edges: Sequence[int]) -> np.ndarray:
+    """
+    Liczby w przedziałach wyznaczonych przez edges (początki kolejnych przedziałów) → (M, len(edges) + 1),
+    np. edges=(17, 34) → niskie 1..16, średnie 17..33, wysokie 34..49.
+    """
+    idx = np.searchsorted(np.asarray(edges), t, side="right")
+    return (idx[:, :, None] == np.arange(len(edges) + 1)).sum(axis=1)
+
+
+def spans(t: np.ndarray) -> np.ndarray:
+    return t[:, -1] - t[:, 0]
+
+
+def sums(t: np.ndarray) -> np.ndarray:
+    return t.sum(axis=1)
+
+
+def adjacent_pairs(t: np.ndarray) -> np.ndarray:
+    """
+    Liczba par sąsiednich (różnica 1).
+    """
+    return (np.diff(t, axis=1) == 1).sum(axis=1)
+
+
+def longest_runs(t: np.ndarray) -> np.ndarray:
+    """
+    Długość najdłuższego ciągu kolejnych liczb (1 gdy brak par sąsiednich).
+    """
+    step = np.diff(t, axis=1) == 1
+    current = np.zeros(len(t), dtype=np.int64)
+    longest = np.zeros(len(t), dtype=np.int64)
+    for col in step.T:
+        current = (current + 1) * col
+        np.maximum(longest, current, out=longest)
+    return longest + 1
+
+
+def overlaps(t: np.ndarray, ticket: Sequence[int]) -> np.ndarray:
+    """
+    Część wspólna każdego kuponu z jednym kuponem / losowaniem.
+    """
+    return overlap_with(numbers_to_masks(t), ticket_mask(ticket))
+
+
+# =========================================================
+# SCREEN
+# =========================================================
+@dataclass
+class ScreenResult:
+    mask: np.ndarray
+    # odrzucenia przypisane pierwszej niespełnionej regule (kolejność jak w wersji skalarnej)
+    rejected: Dict[str, int]
+
+    @property
+    def passed(self) -> int:
+        return int(self.mask.sum())
+
+
+def screen(count: int, rules: Iterable[Tuple[str, np.ndarray]]) -> ScreenResult:
+    """
+    Reguły (nazwa, maska True = spełnia) → maska kuponów spełniających wszystkie + liczby odrzuceń per reguła.
+    """
+    alive = np.ones(count, dtype=bool)
+    rejected: Dict[str, int] = {}
+    for name, ok in rules:
+        failed = alive & ~np.asarray(ok, dtype=bool)
+        rejected[name] = rejected.get(name, 0) + int(failed.sum())
+        alive &= ~failed
+    return ScreenResult(mask=alive, rejected=rejected)
@@ -0,0 +1,144 @@
+import heapq
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+from draw_history import numbers_to_masks
+
+
+# =========================================================
+# SCALAR MASKS
+# =========================================================
+def ticket_mask(ticket: Sequence[int]) -> int:
+    """
+    Kupon / losowanie → maska bitowa (bit n ustawiony dla liczby n); duplikaty liczone raz.
+    """
+    mask = 0
+    for n in ticket:
+        mask |= 1 << int(n)
+    return mask
+
+
+def mask_overlap(a: int, b: int) -> int:
+    return (a & b).bit_count()
+
+
+def max_overlap(mask: int, masks: Sequence[int]) -> int:
+    """
+    Największa część wspólna maski z którąkolwiek z masks (0 dla pustej listy).
+    """
+    return max(((mask & m).bit_count() for m in masks), default=0)
+
+
+# =========================================================
+# VECTORIZED MASKS
+# =========================================================
+def masks_array(tickets: Sequence[Sequence[int]]) -> np.ndarray:
+    """
+    Lista kuponów → (M,) uint64; kupony równej długości liczone wektorowo.
+    """
+    if len(tickets) and len({len(t) for t in tickets}) == 1:
+        return numbers_to_masks(np.asarray(tickets, dtype=np.uint64))
+    return np.fromiter((ticket_mask(t) for t in tickets), dtype=np.uint64, count=len(tickets))
+
+
+if hasattr(np, "bitwise_count"):
+    def popcount64(x: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(np.asarray(x, dtype=np.uint64)).astype(np.uint8)
+else:
+    _POPCOUNT_LUT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount64(x: np.ndarray) -> np.ndarray:
+        x = np.ascontiguousarray(x, dtype=np.uint64)
+        return _POPCOUNT_LUT[x.view(np.uint8).reshape(x.shape + (8,))].sum(axis=-1, dtype=np.uint8)
+
+
+def overlap_with(masks: np.ndarray, mask: int) -> np.ndarray:
+    """
+    Część wspólna każdej z (M,) masek z jedną maską → (M,) uint8.
+    """
+    return popcount64(np.asarray(masks, dtype=np.uint64) & np.uint64(mask))
+
+
+def overlap_matrix(candidate_masks: np.ndarray, ticket_masks: np.ndarray) -> np.ndarray:
+    """
+    Część wspólna M kandydatów z K kuponami → macierz (M, K) uint8.
+    """
+    a = np.asarray(candidate_masks, dtype=np.uint64)
+    b = np.asarray(ticket_masks, dtype=np.uint64)
+    return popcount64(a[:, None] & b[None, :])
+
+
+def greedy_diverse(masks: np.ndarray, limit: int, max_common: int) -> List[int]:
+    """
+    Zachłanny wybór w kolejności masks (np. od najlepszego wyniku): indeksy kuponów,
+    których część wspólna z każdym wcześniej wybranym wynosi najwyżej max_common.
+    Po każdym wyborze jedna operacja wektorowa aktualizuje najgorszy overlap wszystkich kandydatów.
+    """
+    masks = np.asarray(masks, dtype=np.uint64)
+    worst = np.zeros(len(masks), dtype=np.uint8)
+    chosen: List[int] = []
+    i = 0
+
+    while len(chosen) < limit and i < len(masks):
+        ok = np.flatnonzero(worst[i:] <= max_common)
+        if not len(ok):
+            break
+        i += int(ok[0])
+        chosen.append(i)
+        np.maximum(worst, overlap_with(masks, int(masks[i])), out=worst)
+        i += 1
+
+    return chosen
+
+
+def select_diverse(
+    masks: np.ndarray,
+    scores: Sequence[float],
+    limit: int,
+    max_common: int,
+    coverage_weight: float = 0.0,
+    groups: Optional[Sequence[Hashable]] = None,
+    group_limit: Optional[int] = None
+) -> List[int]:
+    """
+    Wybór do limit kuponów z dużej puli (dowolna kolejność, np. 100k kandydatów): maksymalizuje sumę
+    score + coverage_weight * (liczby jeszcze niepokryte przez wybrane kupony), przy części wspólnej każdej
+    pary wybranych najwyżej max_common i (opcjonalnie) najwyżej group_limit kuponach z jednej grupy groups[i].
+    Leniwy greedy na kopcu: zysk kandydata może tylko maleć, więc przeliczany jest dopiero wtedy,
+    gdy nieaktualny wypłynie na wierzch. Bez coverage_weight = greedy_diverse w kolejności malejącego score
+    (remisy: niższy indeks). Zwraca indeksy w kolejności wyboru.
+    """
+    masks = np.asarray(masks, dtype=np.uint64)
+    scores = np.asarray(scores, dtype=float)
+    chosen: List[int] = []
+    if limit <= 0 or not len(masks):
+        return chosen
+
+    gains = scores + coverage_weight * popcount64(masks) if coverage_weight else scores
+    # (-zysk, indeks, liczba wybranych w chwili liczenia zysku)
+    heap = [(-g, i, 0) for i, g in enumerate(gains.tolist())]
+    heapq.heapify(heap)
+
+    worst = np.zeros(len(masks), dtype=np.uint8)
+    per_group: Dict[Hashable, int] = {}
+    covered = 0
+
+    while heap and len(chosen) < limit:
+        _, i, version = heapq.heappop(heap)
+        if worst[i] > max_common:
+            continue
+        if group_limit is not None and groups is not None and per_group.get(groups[i], 0) >= group_limit:
+            continue
+        if coverage_weight and version != len(chosen):
+            gain = scores[i] + coverage_weight * (int(masks[i]) & ~covered).bit_count()
+            heapq.heappush(heap, (-gain, i, len(chosen)))
+            continue
+
+        chosen.append(i)
+        covered |= int(masks[i])
+        if groups is not None:
+            per_group[groups[i]] = per_group.get(groups[i], 0) + 1
+        np.maximum(worst, overlap_with(masks, int(masks[i])), out=worst)
+
+    return chosen
@@ -0,0 +1,103 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ticket_codec import ticket_rank, unrank_tickets
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+# dopisane wpisy czekają w listach Pythona; kompaktowanie do k najlepszych co tyle wpisów (lub co k, gdy k większe)
+FLUSH_EVERY = 4096
+
+
+# =========================================================
+# BOUNDED TOP-K
+# =========================================================
+class TopK:
+    """
+    Strumieniowy ranking k najlepszych kuponów. Trzymane są tylko wynik (float64), ranga kuponu
+    (ticket_codec, uint32) i mały znacznik int (np. indeks źródła/trybu) — pamięć O(k + FLUSH_EVERY)
+    niezależnie od liczby ocenionych kandydatów; pełne obiekty metryk buduje się potem tylko dla zwycięzców.
+    Remisy: wcześniej dodany jest wyżej (jak stabilne sortowanie malejące całej listy).
+    """
+
+    def __init__(self, k: int):
+        self.k = max(0, int(k))
+        self.pushed = 0
+        self._scores = np.empty(0, dtype=np.float64)
+        self._ranks = np.empty(0, dtype=np.uint32)
+        self._tags = np.empty(0, dtype=np.int64)
+        self._order = np.empty(0, dtype=np.int64)
+        self._pending: Tuple[List[float], List[int], List[int]] = ([], [], [])
+
+    def __len__(self) -> int:
+        return min(self.k, self.pushed)
+
+    def push(self, score: float, rank: int, tag: int = 0) -> None:
+        scores, ranks, tags = self._pending
+        scores.append(score)
+        ranks.append(rank)
+        tags.append(tag)
+        self.pushed += 1
+        if len(scores) >= max(self.k, FLUSH_EVERY):
+            self._flush()
+
+    def push_ticket(self, score: float, ticket: Sequence[int], tag: int = 0) -> None:
+        self.push(score, ticket_rank(ticket), tag)
+
+    def push_many(self, scores: np.ndarray, ranks: np.ndarray, tags: Optional[np.ndarray] = None) -> None:
+        """
+        Partia wpisów naraz (np. wynik wektorowego scoringu); kolejność w partii = kolejność dodania.
+        """
+        self._flush()
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        ranks = np.asarray(ranks, dtype=np.uint32).ravel()
+        tags = np.zeros(len(scores), dtype=np.int64) if tags is None else np.asarray(tags, dtype=np.int64).ravel()
+        order = np.arange(self.pushed, self.pushed + len(scores), dtype=np.int64)
+        self.pushed += len(scores)
+        self._merge(scores, ranks, tags, order)
+
+    def _flush(self) -> None:
+        scores, ranks, tags = self._pending
+        if not scores:
+            return
+        start = self.pushed - len(scores)
+        self._merge(
+            np.asarray(scores, dtype=np.float64),
+            np.asarray(ranks, dtype=np.uint32),
+            np.asarray(tags, dtype=np.int64),
+            np.arange(start, self.pushed, dtype=np.int64)
+        )
+        self._pending = ([], [], [])
+
+    def _merge(self, scores: np.ndarray, ranks: np.ndarray, tags: np.ndarray, order: np.ndarray) -> None:
+        scores = np.concatenate([self._scores, scores])
+        ranks = np.concatenate([self._ranks, ranks])
+        tags = np.concatenate([self._tags, tags])
+        order = np.concatenate([self._order, order])
+        if len(scores) > self.k:
+            if self.k == 0:
+                keep = np.empty(0, dtype=np.int64)
+            else:
+                # próg k-tego wyniku przez np.partition, sortowanie tylko kandydatów >= progu
+                kth = np.partition(scores, len(scores) - self.k)[len(scores) - self.k]
+                keep = np.flatnonzero(scores >= kth)
+                keep = keep[np.lexsort((order[keep], -scores[keep]))[:self.k]]
+            scores, ranks, tags, order = scores[keep], ranks[keep], tags[keep], order[keep]
+        self._scores, self._ranks, self._tags, self._order = scores, ranks, tags, order
+
+    def result(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (wyniki, rangi, znaczniki) malejąco wg wyniku, najwyżej k wpisów.
+        """
+        self._flush()
+        idx = np.lexsort((self._order, -self._scores))
+        return self._scores[idx], self._ranks[idx], self._tags[idx]
+
+    def tickets(self) -> np.ndarray:
+        """
+        Kupony zwycięzców (M, 6) w kolejności rankingu.
+        """
+        return unrank_tickets(self.result()[1])
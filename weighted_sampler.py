@@ -0,0 +1,210 @@
+import random
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+NUM_MIN = 1
+NUM_MAX = 49
+NUM_COUNT = NUM_MAX - NUM_MIN + 1
+PICK_COUNT = 6
+
+# klucz dla wagi 0: taka liczba przegrywa z każdą o dodatniej wadze, ale pozostaje w puli
+_ZERO_WEIGHT = 1e-300
+
+RandomLike = Union[np.random.Generator, random.Random]
+
+
+# =========================================================
+# HELPERS
+# =========================================================
+def weight_vector(weights: Union[Dict[int, float], Sequence[float]], population: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    Wagi → wektor (49,) indeksowany liczba - 1; liczby spoza population / słownika mają wagę 0.
+    """
+    out = np.zeros(NUM_COUNT, dtype=float)
+    if isinstance(weights, dict):
+        for n, w in weights.items():
+            out[int(n) - NUM_MIN] = float(w)
+        return out
+    if population is None:
+        population = range(NUM_MIN, NUM_MAX + 1)
+    out[np.asarray(population, dtype=np.int64) - NUM_MIN] = np.asarray(weights, dtype=float)
+    return out
+
+
+def pool_mask(numbers: Iterable[int]) -> np.ndarray:
+    """
+    Pula liczb → maska bool (49,).
+    """
+    mask = np.zeros(NUM_COUNT, dtype=bool)
+    mask[np.asarray(list(numbers), dtype=np.int64) - NUM_MIN] = True
+    return mask
+
+
+# =========================================================
+# GUMBEL-TOP-K
+# =========================================================
+def _sample_keys(
+    rng: np.random.Generator,
+    weights: np.ndarray,
+    k: int,
+    m: int,
+    allowed: Optional[np.ndarray]
+) -> np.ndarray:
+    """
+    Klucze (M, 49): E / w, E ~ Exp(1); poza pulą inf. Najmniejsze k kluczy = top-k log(w) + Gumbel.
+    """
+    w = np.asarray(weights, dtype=float)
+    mask = np.ones(NUM_COUNT, dtype=bool) if allowed is None else np.asarray(allowed, dtype=bool)
+    if (mask.sum(axis=-1) < k).any():
+        raise ValueError("Pula mniejsza niż k.")
+
+    if w.ndim == 1 and mask.ndim == 1:
+        # typowy przypadek: wspólne wagi i pula — czyszczenie wag na wektorze (49,), nie na (M, 49)
+        w = np.where(mask & (w > 0), w, 0.0)
+        if w.sum() <= 0:
+            w = mask.astype(float)
+        keys = rng.standard_exponential((m, NUM_COUNT))
+        keys /= np.maximum(w, _ZERO_WEIGHT)
+        if not mask.all():
+            keys[:, ~mask] = np.inf
+        return keys
+
+    w = np.broadcast_to(w, (m, NUM_COUNT))
+    mask = np.broadcast_to(mask, (m, NUM_COUNT))
+    w = np.where(mask & (w > 0), w, 0.0)
+    empty = w.sum(axis=1) <= 0
+    if empty.any():
+        w[empty] = mask[empty]
+
+    keys = rng.standard_exponential((m, NUM_COUNT))
+    keys /= np.maximum(w, _ZERO_WEIGHT)
+    keys[~mask] = np.inf
+    return keys
+
+
+def _rows_count(weights: np.ndarray, allowed: Optional[np.ndarray], m: Optional[int]) -> int:
+    if m is not None:
+        return int(m)
+    if np.ndim(weights) == 2:
+        return np.shape(weights)[0]
+    if allowed is not None and np.ndim(allowed) == 2:
+        return np.shape(allowed)[0]
+    return 1
+
+
+def gumbel_top_k(
+    rng: np.random.Generator,
+    weights: np.ndarray,
+    k: int,
+    m: Optional[int] = None,
+    allowed: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    M losowań k liczb bez zwracania naraz, z prawd. proporcjonalnym do wag (jak kolejne rng.choice(p=...)).
+    - weights: (49,) albo (M, 49), nieujemne; allowed: maska puli (49,) albo (M, 49),
+    - wiersz bez dodatniej wagi w puli → losowanie równomierne z puli,
+    - wynik (M, k) w kolejności losowania — pierwsze j kolumn to poprawna próbka j liczb.
+    Top-k kluczy log(w) + Gumbel liczone jako bottom-k E / w, E ~ Exp(1) (ta sama kolejność, bez logarytmów).
+    """
+    m = _rows_count(weights, allowed, m)
+    if k < 0 or k > NUM_COUNT:
+        raise ValueError(f"k musi być z zakresu 0..{NUM_COUNT}.")
+    if k == 0 or m == 0:
+        return np.empty((m, k), dtype=np.int64)
+
+    keys = _sample_keys(rng, weights, k, m, allowed)
+    top = np.argpartition(keys, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(keys, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1) + NUM_MIN
+
+
+def sample_tickets(
+    rng: np.random.Generator,
+    weights: np.ndarray,
+    m: int,
+    k: int = PICK_COUNT,
+    allowed: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    M kuponów (M, k) ważonych bez zwracania, liczby w wierszu posortowane.
+    """
+    if k < 0 or k > NUM_COUNT:
+        raise ValueError(f"k musi być z zakresu 0..{NUM_COUNT}.")
+    if k == 0 or m == 0:
+        return np.empty((m, k), dtype=np.int64)
+    # kolejność losowania nie jest potrzebna — samo argpartition
+    keys = _sample_keys(rng, weights, k, m, allowed)
+    top = np.argpartition(keys, k - 1, axis=1)[:, :k]
+    top.sort(axis=1)
+    return top + NUM_MIN
+
+
+def sample_two_stage(
+    rng: np.random.Generator,
+    weights: np.ndarray,
+    core_take: np.ndarray,
+    core_pool: np.ndarray,
+    rest_pool: np.ndarray,
+    k: int = PICK_COUNT
+) -> np.ndarray:
+    """
+    Kupony "elite + reszta": core_take[i] liczb z core_pool, dopełnienie do k z rest_pool bez już wybranych
+    (gdy rest_pool nie wystarcza — z całego 1..49). Zwraca (M, k), wiersze posortowane.
+    """
+    core_take = np.asarray(core_take, dtype=np.int64)
+    m = len(core_take)
+    if m == 0:
+        return np.empty((0, k), dtype=np.int64)
+    rows = np.arange(m)[:, None]
+    max_core = int(core_take.max())
+
+    core = gumbel_top_k(rng, weights, max_core, m=m, allowed=core_pool)
+    taken = np.zeros((m, NUM_COUNT), dtype=bool)
+    keep_core = np.arange(max_core)[None, :] < core_take[:, None]
+    taken[np.broadcast_to(rows, core.shape)[keep_core], core[keep_core] - NUM_MIN] = True
+
+    rest_need = k - core_take
+    allowed = np.asarray(rest_pool, dtype=bool)[None, :] & ~taken
+    short = allowed.sum(axis=1) < rest_need
+    allowed[short] = ~taken[short]
+
+    max_rest = int(rest_need.max())
+    rest = gumbel_top_k(rng, weights, max_rest, m=m, allowed=allowed)
+    keep_rest = np.arange(max_rest)[None, :] < rest_need[:, None]
+
+    # niewybrane pozycje → wartownik > 49, po sortowaniu wypadają poza pierwsze k kolumn
+    picked = np.concatenate([np.where(keep_core, core, NUM_MAX + 1), np.where(keep_rest, rest, NUM_MAX + 1)], axis=1)
+    picked.sort(axis=1)
+    return picked[:, :k]
+
+
+# =========================================================
+# SINGLE SAMPLE
+# =========================================================
+def weighted_sample(rng: RandomLike, population: Sequence[int], weights: Sequence[float], k: int) -> List[int]:
+    """
+    Jedno losowanie k elementów z population bez zwracania (posortowane), ten sam schemat kluczy co gumbel_top_k.
+    rng: np.random.Generator albo random.Random / moduł random. Suma wag <= 0 → losowanie równomierne.
+    """
+    if k > len(population):
+        raise ValueError("Populacja mniejsza niż k.")
+    if k <= 0:
+        return []
+    # na jeden kupon listy Pythona są szybsze niż numpy (narzut wywołań przy 49 elementach)
+    w = [float(x) if x > 0 else 0.0 for x in weights]
+    if sum(w) <= 0:
+        w = [1.0] * len(w)
+
+    if isinstance(rng, np.random.Generator):
+        e = rng.standard_exponential(len(w)).tolist()
+    else:
+        e = [rng.expovariate(1.0) for _ in range(len(w))]
+
+    keys = [ei / (wi if wi > 0 else _ZERO_WEIGHT) for ei, wi in zip(e, w)]
+    idx = sorted(range(len(keys)), key=keys.__getitem__)[:k]
+    return sorted(int(population[i]) for i in idx)